@@ -16,6 +16,7 @@ import traceback
 from .models import Category, Comment, Tag, PasswordResetCode,Profile, DeletionCode
 from post.models import Post
 from messaging.models import Block
+from messaging.block_utils import BlockManager
 #Serializer 
 from .serializers import CategorySerializer, PostSerializer, CommentSerializer, TagSerializer, ProfileSerializer, ProfileUpdateSerializer,  UserUpdateSerializer, RegisterSerializer
 from post.serializers import PostDetailSerializer, PostSerializer
@@ -281,69 +282,38 @@ def profile_detail_public(request, profile_id):
         profile_user = profile.user
         
         # VÉRIFICATION DES BLOCAGES si l'utilisateur est authentifié
+        # Graphe de blocage chargé une seule fois pour toute la requête
+        # (deux sens, blocages expirés exclus)
+        block_graph = None
+        block = None
+        user_has_blocked = False
+        is_blocked_by_user = False
         if request.user.is_authenticated:
             current_user = request.user
+            block_graph = BlockManager.get_graph(current_user.id)
             
-            # Vérifier les blocages actifs dans les deux sens avec votre modèle
-            # 1. Vérifier si l'utilisateur courant a bloqué ce profil
-            user_has_blocked = Block.objects.filter(
-                blocker=current_user,
-                blocked=profile_user,
-                is_active=True
-            ).exists()
-            
-            # 2. Vérifier si ce profil a bloqué l'utilisateur courant
-            is_blocked_by_user = Block.objects.filter(
-                blocker=profile_user,
-                blocked=current_user,
-                is_active=True
-            ).exists()
-            
-            # 3. Vérifier les blocages expirés
-            if user_has_blocked:
-                # Vérifier si le blocage a expiré
-                active_blocks = Block.objects.filter(
-                    blocker=current_user,
-                    blocked=profile_user,
-                    is_active=True
-                )
-                for block in active_blocks:
-                    if block.is_expired:
-                        block.is_active = False
-                        block.save()
-                        user_has_blocked = False
-            
-            if is_blocked_by_user:
-                # Vérifier si le blocage a expiré
-                active_blocks = Block.objects.filter(
-                    blocker=profile_user,
-                    blocked=current_user,
-                    is_active=True
-                )
-                for block in active_blocks:
-                    if block.is_expired:
-                        block.is_active = False
-                        block.save()
-                        is_blocked_by_user = False
+            # 1. L'utilisateur courant a-t-il bloqué ce profil ?
+            user_has_blocked = block_graph.has_blocked(profile_user.id)
+            # 2. Ce profil a-t-il bloqué l'utilisateur courant ?
+            is_blocked_by_user = block_graph.is_blocked_by(profile_user.id)
             
             # Si l'utilisateur a bloqué ce profil OU est bloqué par ce profil
             if user_has_blocked or is_blocked_by_user:
                 # Déterminer le type de blocage
-                block_type = None
                 if user_has_blocked:
+                    block_type = block_graph.blocked[profile_user.id]
                     block = Block.objects.filter(
                         blocker=current_user,
                         blocked=profile_user,
                         is_active=True
-                    ).first()
-                    block_type = block.block_type if block else 'both'
-                elif is_blocked_by_user:
+                    ).only('reason').first()
+                else:
+                    block_type = block_graph.blocked_by[profile_user.id]
                     block = Block.objects.filter(
                         blocker=profile_user,
                         blocked=current_user,
                         is_active=True
-                    ).first()
-                    block_type = block.block_type if block else 'both'
+                    ).only('reason').first()
                 
                 # Selon le type de blocage, déterminer ce qui est accessible
                 if block_type == 'both' or block_type == 'profile':
@@ -407,24 +377,8 @@ def profile_detail_public(request, profile_id):
             ).select_related('user')
             
             # Si l'utilisateur est authentifié, filtrer les feedbacks des utilisateurs bloqués
-            if request.user.is_authenticated:
-                current_user = request.user
-                
-                # Récupérer les IDs des utilisateurs que j'ai bloqués
-                blocked_users_ids = Block.objects.filter(
-                    blocker=current_user,
-                    is_active=True
-                ).values_list('blocked', flat=True)
-                
-                # Récupérer les IDs des utilisateurs qui m'ont bloqué
-                blocking_users_ids = Block.objects.filter(
-                    blocked=current_user,
-                    is_active=True
-                ).values_list('blocker', flat=True)
-                
-                # Combiner les deux listes
-                all_blocked_ids = set(blocked_users_ids) | set(blocking_users_ids)
-                
+            all_blocked_ids = set(block_graph.hidden_ids) if block_graph else set()
+            if all_blocked_ids:
                 # Exclure les feedbacks des utilisateurs bloqués/bloquants
                 feedbacks_query = feedbacks_query.exclude(user__in=all_blocked_ids)
             
@@ -461,20 +415,9 @@ def profile_detail_public(request, profile_id):
             # Compter les followers (avec filtrage des blocages)
             followers_query = profile.followers.all()
             
-            if request.user.is_authenticated:
-                current_user = request.user
-                # Récupérer les IDs des utilisateurs bloqués dans les deux sens
-                blocked_ids = Block.objects.filter(
-                    blocker=current_user,
-                    is_active=True
-                ).values_list('blocked', flat=True)
-                
-                blocking_ids = Block.objects.filter(
-                    blocked=current_user,
-                    is_active=True
-                ).values_list('blocker', flat=True)
-                
-                all_blocked_ids = set(blocked_ids) | set(blocking_ids)
+            # Utilisateurs bloqués dans les deux sens (graphe déjà chargé)
+            all_blocked_ids = set(block_graph.hidden_ids) if block_graph else set()
+            if all_blocked_ids:
                 followers_query = followers_query.exclude(id__in=all_blocked_ids)
             
             followers_count = followers_query.count()
@@ -482,7 +425,7 @@ def profile_detail_public(request, profile_id):
             # Compter les following
             following_query = profile.following.all()
             
-            if request.user.is_authenticated:
+            if all_blocked_ids:
                 following_query = following_query.exclude(id__in=all_blocked_ids)
             
             following_count = following_query.count()
@@ -493,17 +436,7 @@ def profile_detail_public(request, profile_id):
             following_count = profile.following.count()
         
         # Déterminer si l'email doit être masqué
-        show_email = True
-        if request.user.is_authenticated:
-            current_user = request.user
-            
-            # Vérifier s'il y a un blocage actif
-            has_block_relationship = Block.objects.filter(
-                Q(blocker=current_user, blocked=profile_user, is_active=True) |
-                Q(blocker=profile_user, blocked=current_user, is_active=True)
-            ).exists()
-            
-            show_email = not has_block_relationship
+        show_email = not (user_has_blocked or is_blocked_by_user)
         
         # Construction des données du profil
         profile_data = {
@@ -541,33 +474,17 @@ def profile_detail_public(request, profile_id):
         }
         
         # Ajouter les informations de blocage si l'utilisateur est authentifié
-        if request.user.is_authenticated:
-            current_user = request.user
-            
-            # Vérifier les blocages
-            user_blocked_profile = Block.objects.filter(
-                blocker=current_user,
-                blocked=profile_user,
-                is_active=True
-            ).first()
-            
-            profile_blocked_user = Block.objects.filter(
-                blocker=profile_user,
-                blocked=current_user,
-                is_active=True
-            ).first()
-            
-            is_blocked = user_blocked_profile or profile_blocked_user
+        if block_graph is not None:
+            is_blocked = user_has_blocked or is_blocked_by_user
             
             profile_data['block_status'] = {
-                'is_blocked': bool(is_blocked),
-                'can_interact': not bool(is_blocked),
-                'block_type': user_blocked_profile.block_type if user_blocked_profile else 
-                             profile_blocked_user.block_type if profile_blocked_user else None,
-                'user_blocked_profile': bool(user_blocked_profile),
-                'profile_blocked_user': bool(profile_blocked_user),
-                'block_reason': user_blocked_profile.reason if user_blocked_profile else 
-                              profile_blocked_user.reason if profile_blocked_user else None
+                'is_blocked': is_blocked,
+                'can_interact': not is_blocked,
+                'block_type': block_graph.blocked.get(profile_user.id) or
+                             block_graph.blocked_by.get(profile_user.id),
+                'user_blocked_profile': user_has_blocked,
+                'profile_blocked_user': is_blocked_by_user,
+                'block_reason': block.reason if block else None
             }
         
         print(f"✅ Profile data successfully built for profile {profile_id}")
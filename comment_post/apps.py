@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CommentPostConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'comment_post'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,25 @@
+# comment_post/management/commands/rebuild_comment_tree.py
+from django.core.management.base import BaseCommand
+
+from comment_post.models import Comment
+
+
+class Command(BaseCommand):
+    help = "Recalcule path, depth et descendant_count des commentaires (reprise / réconciliation)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--post',
+            type=int,
+            action='append',
+            help="ID de post dont les commentaires sont à recalculer (répétable). Par défaut: tous."
+        )
+
+    def handle(self, *args, **options):
+        comments = Comment.objects.all()
+        if options['post']:
+            comments = comments.filter(post_id__in=options['post'])
+
+        total = Comment.rebuild_tree(comments)
+
+        self.stdout.write(self.style.SUCCESS(f"{total} commentaire(s) corrigé(s)"))
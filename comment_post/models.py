@@ -1,11 +1,15 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.utils import timezone
 from post.models import Post
+from post.mention_utils import ContentTrackingMixin, extract_usernames, resolve_user_ids, sync_m2m
+from post.media_utils import refresh_media_metadata
 User = get_user_model()
 
-class Comment(models.Model):
+class Comment(ContentTrackingMixin, models.Model):
     # Relations principales
     user = models.ForeignKey(
         User, 
@@ -35,6 +39,9 @@ class Comment(models.Model):
     image = models.ImageField(upload_to='comments/images/', null=True, blank=True)
     video = models.FileField(upload_to='comments/videos/', null=True, blank=True)
     file = models.FileField(upload_to='comments/files/', null=True, blank=True)
+    # {'image' | 'video' | 'file': {'size', 'mime_type', 'checksum', 'width', 'height'}}
+    # relevé à l'envoi (post.media_utils.refresh_media_metadata)
+    media_metadata = models.JSONField(default=dict, blank=True)
     
     # Mentions
     mentions = models.ManyToManyField(
@@ -53,6 +60,9 @@ class Comment(models.Model):
     # Compteurs
     likes_count = models.IntegerField(default=0)
     reply_count = models.IntegerField(default=0)
+    # Taille du sous-arbre (réponses des réponses comprises), tenue à jour
+    # à l'insertion / suppression
+    descendant_count = models.PositiveIntegerField(default=0)
     
     # États
     is_edited = models.BooleanField(default=False)
@@ -86,7 +96,11 @@ class Comment(models.Model):
     def __str__(self):
         return f"{self.user.username}: {self.content[:50]}"
     
+    MEDIA_FIELDS = ('image', 'video', 'file')
+    
     def save(self, *args, **kwargs):
+        is_new = self._state.adding
+        
         # Gestion du path et depth
         if self.parent_comment:
             self.depth = self.parent_comment.depth + 1
@@ -102,8 +116,18 @@ class Comment(models.Model):
         if self.is_edited and not self.edited_at:
             self.edited_at = timezone.now()
         
+        kwargs['update_fields'] = refresh_media_metadata(self, self.MEDIA_FIELDS, kwargs.get('update_fields'))
+        
         super().save(*args, **kwargs)
         self.update_path_after_save()
+        
+        if is_new and self.parent_comment_id:
+            self.update_ancestor_counts(1)
+        
+        # Mentions @username du contenu, seulement s'il a changé
+        if self.content_has_changed(is_new, kwargs.get('update_fields')):
+            sync_m2m(self.mentions, resolve_user_ids(extract_usernames(self.content)), is_new)
+            self.mark_content_clean()
     
     def update_path_after_save(self):
         """Mettre à jour le path après la sauvegarde pour inclure l'ID réel"""
@@ -115,6 +139,31 @@ class Comment(models.Model):
             # Sauvegarder sans déclencher save() à nouveau
             Comment.objects.filter(id=self.id).update(path=self.path)
     
+    def get_ancestor_ids(self):
+        """IDs des ancêtres, lus dans le path (remontée des parents si le path est incomplet)"""
+        parts = self.path.split('.')[:-1] if self.path else []
+        if all(part.isdigit() for part in parts) and len(parts) == self.depth:
+            return [int(part) for part in parts]
+        
+        ancestor_ids = []
+        parent_id = self.parent_comment_id
+        while parent_id:
+            ancestor_ids.append(parent_id)
+            parent_id = Comment.objects.filter(id=parent_id).values_list(
+                'parent_comment_id', flat=True
+            ).first()
+        return ancestor_ids[::-1]
+    
+    def update_ancestor_counts(self, delta):
+        """Répercuter l'ajout / la suppression de ce commentaire sur tous ses ancêtres"""
+        ancestor_ids = self.get_ancestor_ids()
+        if ancestor_ids:
+            # Plancher à 0: le champ est positif, un compteur pas encore
+            # recalculé (rebuild_tree) ne doit pas faire échouer la suppression
+            Comment.objects.filter(id__in=ancestor_ids).update(
+                descendant_count=Greatest(F('descendant_count') + delta, 0)
+            )
+    
     def get_replies(self):
         """Récupérer les réponses"""
         return self.comment_replies.all().select_related('user')
@@ -139,30 +188,59 @@ class Comment(models.Model):
     # Dans models.py, dans la classe Comment
     def get_total_comments_count(self):
         """Retourne le nombre TOTAL de commentaires (ce commentaire + toutes ses réponses)"""
-        def count_all(comment):
-            total = 1  # Ce commentaire
-            # Pour chaque réponse
-            for reply in comment.comment_replies.all():
-                total += count_all(reply)  # La réponse + ses propres réponses
-            return total
-        return count_all(self)
+        return 1 + self.descendant_count
 
-    # Option optimisée avec cache
+    # Conservée pour compatibilité: le compteur est maintenant stocké
     def get_total_comments_count_optimized(self):
-        """Version optimisée avec mise en cache"""
-        cache_key = f'comment_total_count_{self.id}'
+        """Version sans requête, lue sur descendant_count"""
+        return self.get_total_comments_count()
+
+    @classmethod
+    def rebuild_tree(cls, queryset=None):
+        """
+        Recalculer path, depth et descendant_count à partir de parent_comment
+        (données existantes, réparation). Une lecture + un bulk_update.
+        Retourne le nombre de commentaires mis à jour.
+        """
+        queryset = cls.objects.all() if queryset is None else queryset
+        parents = dict(queryset.values_list('id', 'parent_comment_id'))
+
+        paths = {}
 
+        def build_path(comment_id):
+            if comment_id not in paths:
+                chain = []
+                current = comment_id
+                while current is not None and current not in paths:
+                    chain.append(current)
+                    current = parents.get(current)
+                prefix = paths.get(current, '') if current is not None else ''
+                for node_id in reversed(chain):
+                    prefix = f"{prefix}.{node_id}" if prefix else str(node_id)
+                    paths[node_id] = prefix
+            return paths[comment_id]
 
+        descendant_counts = dict.fromkeys(parents, 0)
+        for comment_id in parents:
+            for ancestor_id in build_path(comment_id).split('.')[:-1]:
+                ancestor_id = int(ancestor_id)
+                if ancestor_id in descendant_counts:
+                    descendant_counts[ancestor_id] += 1
 
-        def count_all(comment):
-            total = 1
-            replies = comment.comment_replies.all()
-            for reply in replies:
-                total += count_all(reply)
-            return total
+        to_update = []
+        for comment in queryset.only('id', 'path', 'depth', 'descendant_count'):
+            path = paths[comment.id]
+            depth = path.count('.')
+            if (comment.path, comment.depth, comment.descendant_count) != (
+                path, depth, descendant_counts[comment.id]
+            ):
+                comment.path = path
+                comment.depth = depth
+                comment.descendant_count = descendant_counts[comment.id]
+                to_update.append(comment)
 
-        result = count_all(self)
-        return result
+        cls.objects.bulk_update(to_update, ['path', 'depth', 'descendant_count'], batch_size=500)
+        return len(to_update)
 
 @property
 def is_root(self):
@@ -32,6 +32,31 @@ class CommentUserSerializer(serializers.ModelSerializer):
             return obj.profile.id
         return None  # ou return obj.id si vous n'avez pas de modèle Profile séparé
 
+class CommentListSerializer(serializers.ListSerializer):
+    """
+    Charge en une requête les likes de l'utilisateur courant pour tous les
+    commentaires sérialisés (réponses chargées par le fil comprises)
+    """
+
+    def to_representation(self, data):
+        request = self.context.get('request')
+        if 'liked_comment_ids' not in self.context and request and request.user.is_authenticated:
+            from .thread_utils import iter_thread
+
+            comment_ids = [comment.id for comment in iter_thread(_as_list(data))]
+            self.context['liked_comment_ids'] = set(
+                Comment.likes.through.objects.filter(
+                    user_id=request.user.id,
+                    comment_id__in=comment_ids
+                ).values_list('comment_id', flat=True)
+            )
+        return super().to_representation(data)
+
+
+def _as_list(data):
+    return list(data.all() if hasattr(data, 'all') else data)
+
+
 class CommentSerializer(serializers.ModelSerializer):
     """Serializer principal pour les commentaires"""
     user = CommentUserSerializer(read_only=True)
@@ -60,6 +85,7 @@ class CommentSerializer(serializers.ModelSerializer):
             'replies','total_comments_count','user_id',
             'created_at', 'updated_at', 'edited_at', 'depth'
         ]
+        list_serializer_class = CommentListSerializer
         read_only_fields = [
             'id', 'user', 'is_edited', 'is_pinned', 'likes_count', 'total_comments_count',
             'reply_count', 'created_at', 'updated_at', 'edited_at', 'depth'
@@ -69,7 +95,7 @@ class CommentSerializer(serializers.ModelSerializer):
         """Check if current user is the comment author"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.user.id == request.user.id
+            return obj.user_id == request.user.id
         return False
     
     def get_is_post_owner(self, obj):
@@ -77,24 +103,18 @@ class CommentSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             # 🔥 CORRECTION: Use obj.post.user (not obj.post.author)
-            return obj.post.user == request.user
+            return obj.post.user_id == request.user.id
         return False
     def get_total_replies_count(self, obj):
         """Retourne le nombre TOTAL de réponses (incluant les réponses des réponses)"""
-        # Méthode simple: compter récursivement
-        def count_all_replies(comment):
-            total = comment.comment_replies.count()  # Réponses directes
-            for reply in comment.comment_replies.all():
-                total += count_all_replies(reply)  # Réponses des réponses
-            return total
-        
-        return count_all_replies(obj)
+        # Compteur du sous-arbre maintenu par Comment.save / post_delete
+        return obj.descendant_count
     def get_user_can_pin(self, obj):
         """Check if current user can pin this comment"""
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             # 🔥 CORRECTION: Post authors can pin (using post.user)
-            if obj.post.user == request.user:
+            if obj.post.user_id == request.user.id:
                 return True
             # Staff and superusers can pin
             if request.user.is_staff or request.user.is_superuser:
@@ -107,13 +127,20 @@ class CommentSerializer(serializers.ModelSerializer):
     def get_has_liked(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            liked_comment_ids = self.context.get('liked_comment_ids')
+            if liked_comment_ids is not None:
+                return obj.id in liked_comment_ids
             return obj.user_has_liked(request.user)
         return False
     def get_post_id(self, obj):
         """Get post ID"""
-        return obj.post.id
+        return obj.post_id
     def get_replies(self, obj):
         """Récupérer les réponses de manière récursive si demandé"""
+        # Fil chargé en une fois (thread_utils.load_comment_thread)
+        if hasattr(obj, 'thread_replies'):
+            return CommentSerializer(obj.thread_replies, many=True, context=self.context).data
+        
         request = self.context.get('request')
         if request and request.query_params.get('include_replies') == 'true':
             replies = obj.get_replies()[:5]  # Limiter pour éviter la surcharge
@@ -121,14 +148,8 @@ class CommentSerializer(serializers.ModelSerializer):
         return []
     def get_total_comments_count(self, obj):
         """Retourne le nombre TOTAL de commentaires + réponses pour CE commentaire"""
-        # Cette méthode compte: ce commentaire + toutes ses réponses récursivement
-        def count_all(comment):
-            total = 1  # Ce commentaire
-            # Ajouter toutes les réponses
-            for reply in comment.comment_replies.all():
-                total += count_all(reply)
-            return total
-        return count_all(obj)
+        # Ce commentaire + toutes ses réponses, sans parcourir l'arbre
+        return obj.get_total_comments_count()
     def validate_content(self, value):
         """Valider le contenu du commentaire"""
         if len(value) > 5000:
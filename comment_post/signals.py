@@ -0,0 +1,33 @@
+# comment_post/signals.py
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_migrate
+from django.dispatch import receiver
+from post.models import Post
+from .models import Comment
+
+
+@receiver(post_delete, sender=Comment)
+def update_ancestor_counts_on_delete(sender, instance, origin=None, **kwargs):
+    """
+    Décrémenter descendant_count des ancêtres pour chaque commentaire supprimé
+    (suppression directe, en masse ou en cascade)
+    """
+    # Suppression d'un post: tous les ancêtres partent avec lui
+    if isinstance(origin, Post) or (isinstance(origin, QuerySet) and origin.model is Post):
+        return
+    if instance.parent_comment_id:
+        instance.update_ancestor_counts(-1)
+
+
+@receiver(post_migrate)
+def backfill_comment_tree(sender, **kwargs):
+    """
+    Reprise après l'ajout de descendant_count: si des réponses existent mais
+    qu'aucun compteur n'est renseigné, recalculer l'arbre (rebuild_tree).
+    Ensuite sans effet; rebuild_comment_tree reste disponible pour réconcilier.
+    """
+    if sender.name != 'comment_post':
+        return
+    comments = Comment.objects.all()
+    if comments.filter(parent_comment__isnull=False).exists() and not comments.filter(descendant_count__gt=0).exists():
+        Comment.rebuild_tree(comments)
@@ -0,0 +1,52 @@
+# comment_post/thread_utils.py
+"""
+Chargement d'un fil de commentaires complet: une requête ordonnée par path
+pour tous les commentaires visibles du post, arbre assemblé en mémoire.
+Chaque commentaire reçoit ses réponses dans `thread_replies` (limitées par
+niveau), lues par CommentSerializer.get_replies.
+"""
+from .models import Comment
+
+THREAD_REPLIES_LIMIT = 5
+THREAD_REPLIES_LIMIT_MAX = 50
+
+
+def get_visible_comments(post, include_spam=False):
+    queryset = Comment.objects.filter(post=post, is_hidden=False)
+    if not include_spam:
+        queryset = queryset.filter(is_spam=False)
+    return queryset
+
+
+def load_comment_thread(post, include_spam=False, replies_limit=THREAD_REPLIES_LIMIT):
+    """
+    Retourne les commentaires racines visibles (plus récents d'abord), chacun
+    portant `thread_replies`. Les réponses d'un commentaire masqué ne sont
+    pas rattachées.
+    """
+    comments = list(
+        get_visible_comments(post, include_spam)
+        .select_related('user', 'user__profile')
+        .prefetch_related('mentions')
+        .order_by('path')
+    )
+
+    children = {}
+    for comment in comments:
+        comment.post = post  # Évite un accès à la base par commentaire
+        children.setdefault(comment.parent_comment_id, []).append(comment)
+
+    for siblings in children.values():
+        siblings.sort(key=lambda c: (c.created_at, c.id), reverse=True)
+
+    for comment in comments:
+        comment.thread_replies = children.get(comment.id, [])[:replies_limit]
+
+    return children.get(None, [])
+
+
+def iter_thread(comments):
+    """Parcourir les commentaires et leurs réponses chargées"""
+    for comment in comments:
+        yield comment
+        yield from iter_thread(getattr(comment, 'thread_replies', []))
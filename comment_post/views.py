@@ -13,6 +13,7 @@ from .serializers import (
     CommentCreateSerializer,
     CommentUpdateSerializer
 )
+from .thread_utils import THREAD_REPLIES_LIMIT, THREAD_REPLIES_LIMIT_MAX, load_comment_thread
 from post.models import Post
 import json
 from app.models import Profile
@@ -27,6 +28,32 @@ def post_comments_list_create(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     
     if request.method == 'GET':
+        # Fil complet: une requête pour tous les commentaires visibles,
+        # réponses imbriquées assemblées en mémoire
+        if request.query_params.get('include_replies') == 'true':
+            try:
+                replies_limit = min(
+                    int(request.query_params.get('replies_limit', THREAD_REPLIES_LIMIT)),
+                    THREAD_REPLIES_LIMIT_MAX
+                )
+            except ValueError:
+                return Response(
+                    {"error": "replies_limit must be an integer"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            root_comments = load_comment_thread(
+                post,
+                include_spam=request.user.is_staff,
+                replies_limit=max(replies_limit, 0)
+            )
+            serializer = CommentSerializer(
+                root_comments,
+                many=True,
+                context={'request': request, 'include_replies': True}
+            )
+            return Response(serializer.data)
+        
            # Filter comments based on user permissions
         queryset = Comment.objects.filter(
             post=post,
@@ -38,7 +65,7 @@ def post_comments_list_create(request, post_id):
         if not request.user.is_staff:
             queryset = queryset.filter(is_spam=False)
         
-        queryset = queryset.select_related('user').prefetch_related('likes', 'mentions')
+        queryset = queryset.select_related('user', 'user__profile', 'post').prefetch_related('mentions')
         serializer = CommentSerializer(
             queryset, 
             many=True,
@@ -206,7 +233,9 @@ def comment_detail(request, pk):
         )
         
         if serializer.is_valid():
-            # Handle mentions update
+            comment = serializer.save()
+            
+            # Handle mentions update (après save(): prioritaire sur les @mentions du contenu)
             mentions = request.data.get('mentions')
             if mentions is not None:
                 try:
@@ -215,7 +244,6 @@ def comment_detail(request, pk):
                 except:
                     pass
             
-            comment = serializer.save()
             comment.is_edited = True
             comment.save()
             
@@ -1,8 +1,9 @@
 from django.contrib import admin
-from .models import Message, Conversation,GroupCategory,Block,BlockHistory
+from .models import Message, Conversation,GroupCategory,Block,BlockHistory,ConversationReadState
 
 admin.site.register(Message)
 admin.site.register(Conversation)
 admin.site.register(GroupCategory)
 admin.site.register(Block)
-admin.site.register(BlockHistory)
\ No newline at end of file
+admin.site.register(BlockHistory)
+admin.site.register(ConversationReadState)
\ No newline at end of file
@@ -1,39 +1,203 @@
 # messaging/block_utils.py
+import contextvars
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
-from .models import Block, BlockSettings
+from .models import Block, BlockSettings, GroupBlock, GroupMember, active_block_q
+
+
+def get_block_graph_cache_timeout():
+    """
+    Durée de vie (secondes) du graphe de blocage en cache. 0 = désactivé.
+    """
+    return getattr(settings, 'BLOCK_GRAPH_CACHE_TIMEOUT', 300)
+
+
+def _user_id(user):
+    return getattr(user, 'pk', user)
+
+
+class BlockGraph:
+    """
+    Blocages actifs d'un utilisateur, dans les deux sens:
+    - blocked: {user_id: block_type} des utilisateurs qu'il a bloqués
+    - blocked_by: {user_id: block_type} des utilisateurs qui l'ont bloqué
+    - expires_at: timestamp du prochain blocage à expirer (None si aucun)
+    """
+
+    def __init__(self, user_id, blocked=None, blocked_by=None, expires_at=None):
+        self.user_id = user_id
+        self.blocked = blocked or {}
+        self.blocked_by = blocked_by or {}
+        self.expires_at = expires_at
+
+    @classmethod
+    def load(cls, user_id):
+        """Une seule requête pour les deux sens"""
+        rows = Block.objects.filter(
+            Q(blocker_id=user_id) | Q(blocked_id=user_id),
+            active_block_q(),
+        ).values_list('blocker_id', 'blocked_id', 'block_type', 'expires_at')
+
+        graph = cls(user_id)
+        for blocker_id, blocked_id, block_type, expires_at in rows:
+            if blocker_id == user_id:
+                graph.blocked[blocked_id] = block_type
+            else:
+                graph.blocked_by[blocker_id] = block_type
+            if expires_at:
+                ts = expires_at.timestamp()
+                if graph.expires_at is None or ts < graph.expires_at:
+                    graph.expires_at = ts
+        return graph
+
+    @property
+    def is_stale(self):
+        return self.expires_at is not None and self.expires_at <= time.time()
+
+    @property
+    def hidden_ids(self):
+        """Utilisateurs bloqués ou bloquants"""
+        return self.blocked.keys() | self.blocked_by.keys()
+
+    def has_blocked(self, other_id):
+        return other_id in self.blocked
+
+    def is_blocked_by(self, other_id):
+        return other_id in self.blocked_by
+
+
+# Graphes déjà chargés pendant la requête en cours (BlockGraphMiddleware)
+_request_graphs = contextvars.ContextVar('block_graphs', default=None)
+
+
+class BlockGraphMiddleware:
+    """
+    Limite le chargement du graphe de blocage à une fois par utilisateur et
+    par requête, quel que soit le nombre de vérifications.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _request_graphs.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            _request_graphs.reset(token)
+
+
+def _version_key(user_id):
+    return f"block_graph_version_{user_id}"
+
+
+def _get_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Horodatage: une version perdue (éviction) ne retombe pas sur une
+        # ancienne entrée encore en cache
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_block_graph(user_id):
+    """
+    Graphe de blocage de user_id: mémoire de la requête, puis cache
+    versionné, puis base.
+    """
+    scope = _request_graphs.get()
+    graph = scope.get(user_id) if scope is not None else None
+    if graph is not None and not graph.is_stale:
+        return graph
+
+    timeout = get_block_graph_cache_timeout()
+    graph = None
+    if timeout:
+        version = _get_version(user_id)
+        cache_key = f"block_graph_{user_id}_{version}"
+        graph = cache.get(cache_key)
+        if graph is not None and graph.is_stale:
+            graph = None
+
+    if graph is None:
+        graph = BlockGraph.load(user_id)
+        if timeout:
+            if graph.expires_at is not None:
+                # Ne pas servir un blocage au-delà de son expiration
+                timeout = max(1, min(timeout, int(graph.expires_at - time.time())))
+            cache.set(cache_key, graph, timeout)
+
+    if scope is not None:
+        scope[user_id] = graph
+    return graph
+
+
+def invalidate_block_graph(user_ids):
+    """
+    Invalider le graphe des deux côtés d'un blocage (après commit, pour ne
+    pas laisser un lecteur remettre en cache l'état précédent)
+    """
+    user_ids = [user_id for user_id in user_ids if user_id]
+
+    scope = _request_graphs.get()
+    if scope is not None:
+        for user_id in user_ids:
+            scope.pop(user_id, None)
+
+    def bump():
+        for user_id in user_ids:
+            key = _version_key(user_id)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
 
 class BlockManager:
     """
     Centralized manager for blocking functionalities
     """
     
+    @staticmethod
+    def get_graph(user_id):
+        """
+        Blocked / blocked-by id sets of a user, loaded once per request
+        """
+        return get_block_graph(_user_id(user_id))
+    
     @staticmethod
     def is_blocked(blocker_id, blocked_id):
         """
         Check if blocker has blocked blocked
         """
-        try:
-            block = Block.objects.get(
-                blocker_id=blocker_id,
-                blocked_id=blocked_id,
-                is_active=True
-            )
-            if block.expires_at and block.expires_at < timezone.now():
-                block.is_active = False
-                block.save()
-                return False
-            return True
-        except Block.DoesNotExist:
-            return False
+        return BlockManager.get_graph(blocker_id).has_blocked(_user_id(blocked_id))
+    
+    @staticmethod
+    def get_hidden_user_ids(user):
+        """
+        Ids of users blocked by or blocking user, for queryset exclusions
+        """
+        if user is None or not getattr(user, 'is_authenticated', True):
+            return set()
+        return set(BlockManager.get_graph(user).hidden_ids)
     
     @staticmethod
     def get_block_status(user1_id, user2_id):
         """
         Return blocking status between two users
         """
-        user1_blocks_user2 = BlockManager.is_blocked(user1_id, user2_id)
-        user2_blocks_user1 = BlockManager.is_blocked(user2_id, user1_id)
+        graph = BlockManager.get_graph(user1_id)
+        user1_blocks_user2 = graph.has_blocked(user2_id)
+        user2_blocks_user1 = graph.is_blocked_by(user2_id)
         
         return {
             'user1_blocks_user2': user1_blocks_user2,
@@ -47,12 +211,14 @@ class BlockManager:
         """
         Check if sender can send a message to receiver
         """
+        graph = BlockManager.get_graph(sender_id)
+        
         # Has the sender blocked the receiver?
-        if BlockManager.is_blocked(sender_id, receiver_id):
+        if graph.has_blocked(receiver_id):
             return False, "You have blocked this user"
         
         # Has the receiver blocked the sender?
-        if BlockManager.is_blocked(receiver_id, sender_id):
+        if graph.is_blocked_by(receiver_id):
             return False, "This user has blocked you"
         
         return True, "OK"
@@ -66,8 +232,10 @@ class BlockManager:
         if viewer_id == profile_owner_id:
             return True, "Own profile"
         
+        graph = BlockManager.get_graph(viewer_id)
+        
         # Has the viewer blocked the profile_owner?
-        if BlockManager.is_blocked(viewer_id, profile_owner_id):
+        if graph.has_blocked(profile_owner_id):
             try:
                 settings = BlockSettings.objects.get(user_id=viewer_id)
                 if settings.hide_profile_from_blocked:
@@ -76,7 +244,7 @@ class BlockManager:
                 return False, "You have blocked this user"
         
         # Has the profile_owner blocked the viewer?
-        if BlockManager.is_blocked(profile_owner_id, viewer_id):
+        if graph.is_blocked_by(profile_owner_id):
             return False, "This user has blocked you"
         
         return True, "OK"
@@ -121,6 +289,8 @@ class BlockManager:
                 expires_at=expires_at
             )
         
+        invalidate_block_graph([blocker_id, blocked_id])
+        
         # Record in history
         BlockHistory.objects.create(
             user_id=blocker_id,
@@ -147,6 +317,7 @@ class BlockManager:
             )
             block.is_active = False
             block.save()
+            invalidate_block_graph([blocker_id, blocked_id])
             
             # Record in history
             BlockHistory.objects.create(
@@ -164,39 +335,48 @@ class BlockManager:
         """
         Return list of users blocked by a user
         """
-        blocks = Block.objects.filter(
-            blocker_id=user_id,
-            is_active=True
-        ).select_related('blocked')
-        
-        # Filter expired blocks
-        active_blocks = []
-        for block in blocks:
-            if not block.is_expired:
-                active_blocks.append(block)
-            else:
-                block.is_active = False
-                block.save()
-        
-        return active_blocks
+        # Expired blocks are filtered out here and deactivated by expire_blocks()
+        return list(Block.objects.filter(
+            active_block_q(),
+            blocker_id=user_id
+        ).select_related('blocked'))
     
     @staticmethod
     def get_users_who_blocked(user_id):
         """
         Return list of users who have blocked a user
         """
-        blocks = Block.objects.filter(
-            blocked_id=user_id,
-            is_active=True
-        ).select_related('blocker')
-        
-        # Filter expired blocks
-        active_blocks = []
-        for block in blocks:
-            if not block.is_expired:
-                active_blocks.append(block)
-            else:
-                block.is_active = False
-                block.save()
-        
-        return active_blocks
\ No newline at end of file
+        # Expired blocks are filtered out here and deactivated by expire_blocks()
+        return list(Block.objects.filter(
+            active_block_q(),
+            blocked_id=user_id
+        ).select_related('blocker'))
+
+
+def expire_blocks(now=None):
+    """
+    Désactiver en masse les blocages et bannissements expirés: un UPDATE
+    par table au lieu d'écritures au fil des lectures.
+    Retourne le nombre de lignes mises à jour par type.
+    """
+    now = now or timezone.now()
+
+    # Les graphes en cache n'ont pas besoin d'être invalidés: ils expirent
+    # d'eux-mêmes à la première échéance qu'ils contiennent
+    blocks = Block.objects.filter(
+        is_active=True,
+        expires_at__lte=now
+    ).update(is_active=False)
+
+    group_blocks = GroupBlock.objects.filter(
+        is_active=True,
+        expires_at__lte=now
+    ).update(is_active=False)
+
+    # Même effet que GroupMember.unban()
+    bans = GroupMember.objects.filter(
+        is_banned=True,
+        ban_expires__lte=now
+    ).update(is_banned=False, ban_reason=None, ban_expires=None)
+
+    return {'blocks': blocks, 'group_blocks': group_blocks, 'bans': bans}
@@ -0,0 +1,101 @@
+# messaging/consumers.py
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Conversation
+from .realtime_utils import conversation_group_name
+
+
+class ConversationConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Flux temps réel d'une conversation: nouveaux messages, éditions,
+    accusés de lecture et suppressions. Remplace le polling de
+    msg/conversations/<id>/messages/.
+    
+    L'appartenance est vérifiée à la connexion, puis suivie par les
+    événements member.removed (signals.py): un membre retiré ou banni est
+    sorti du groupe et déconnecté.
+    """
+
+    async def connect(self):
+        self.group_name = None
+        user = self.scope.get('user')
+
+        if not user or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        self.user_id = user.id
+        self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
+
+        if not await self.is_participant(user, self.conversation_id):
+            await self.close(code=4403)
+            return
+
+        self.group_name = conversation_group_name(self.conversation_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        # Les écritures passent par l'API REST; le socket ne sert qu'au keep-alive
+        if content.get('type') == 'ping':
+            await self.send_json({'type': 'pong'})
+
+    @database_sync_to_async
+    def is_participant(self, user, conversation_id):
+        # Participant, et pas banni (bannissement sans échéance ou pas encore échu)
+        return Conversation.objects.filter(
+            id=conversation_id,
+            participants=user
+        ).exclude(
+            Q(member_info__user=user, member_info__is_banned=True)
+            & (Q(member_info__ban_expires__isnull=True) | Q(member_info__ban_expires__gt=timezone.now()))
+        ).exists()
+
+    # ==================== ÉVÉNEMENTS DU GROUPE ====================
+
+    async def message_new(self, event):
+        await self.send_json({
+            'type': 'message.new',
+            'message': event['message'],
+        })
+
+    async def message_updated(self, event):
+        await self.send_json({
+            'type': 'message.updated',
+            'message': event['message'],
+        })
+
+    async def message_read(self, event):
+        await self.send_json({
+            'type': 'message.read',
+            'conversation_id': event['conversation_id'],
+            'reader_id': event['reader_id'],
+            'message_ids': event['message_ids'],
+            'read_at': event['read_at'],
+        })
+
+    async def message_deleted(self, event):
+        await self.send_json({
+            'type': 'message.deleted',
+            'conversation_id': event['conversation_id'],
+            'message_id': event['message_id'],
+            'deleted_by': event['deleted_by'],
+        })
+
+    async def member_removed(self, event):
+        if self.user_id not in event['user_ids']:
+            return
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        self.group_name = None
+        await self.send_json({
+            'type': 'member.removed',
+            'conversation_id': event['conversation_id'],
+        })
+        await self.close(code=4403)
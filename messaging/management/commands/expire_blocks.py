@@ -0,0 +1,15 @@
+# messaging/management/commands/expire_blocks.py
+from django.core.management.base import BaseCommand
+
+from messaging.block_utils import expire_blocks
+
+
+class Command(BaseCommand):
+    help = "Désactive les blocages (Block, GroupBlock) et bannissements de groupe expirés"
+
+    def handle(self, *args, **options):
+        counts = expire_blocks()
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['blocks']} blocage(s), {counts['group_blocks']} blocage(s) de groupe "
+            f"et {counts['bans']} bannissement(s) expiré(s)"
+        ))
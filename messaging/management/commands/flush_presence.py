@@ -0,0 +1,12 @@
+# messaging/management/commands/flush_presence.py
+from django.core.management.base import BaseCommand
+
+from messaging.presence_utils import flush_presence
+
+
+class Command(BaseCommand):
+    help = "Reporte en base (UserOnlineStatus) la présence accumulée dans le backend de présence"
+
+    def handle(self, *args, **options):
+        total = flush_presence()
+        self.stdout.write(self.style.SUCCESS(f"{total} statut(s) de présence reporté(s)"))
@@ -0,0 +1,28 @@
+# messaging/management/commands/rebuild_conversation_state.py
+from django.core.management.base import BaseCommand
+
+from messaging.models import Conversation, ConversationReadState
+
+
+class Command(BaseCommand):
+    help = "Recalcule Conversation.last_message et les ConversationReadState (reprise / réconciliation)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--conversation',
+            type=int,
+            action='append',
+            help="ID de conversation à recalculer (répétable). Par défaut: toutes."
+        )
+
+    def handle(self, *args, **options):
+        conversations = Conversation.objects.all()
+        if options['conversation']:
+            conversations = conversations.filter(id__in=options['conversation'])
+
+        total = 0
+        for conversation in conversations.iterator():
+            ConversationReadState.rebuild_for_conversation(conversation)
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(f"{total} conversation(s) recalculée(s)"))
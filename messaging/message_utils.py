@@ -1,4 +1,5 @@
 # utils/message_utils.py
+from django.db.models import Q
 from django.utils import timezone
 from .models import Message
 def create_system_message(conversation, user, message_type, extra_data=None):
@@ -51,4 +52,39 @@ def create_system_message(conversation, user, message_type, extra_data=None):
         )
         return message
     
-    return None
\ No newline at end of file
+    return None
+
+# ==================== PAGINATION PAR CURSEUR ====================
+
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_PAGE_SIZE_MAX = 200
+
+
+def get_message_cursor_page(messages, cursor=None, direction='before', limit=MESSAGE_PAGE_SIZE):
+    """
+    Pagination keyset sur (timestamp, id) - utilise l'index (conversation, timestamp).
+    - direction='before': les `limit` messages plus anciens que le curseur
+      (sans curseur: les plus récents)
+    - direction='after': les `limit` messages plus récents que le curseur
+    Retourne (messages en ordre chronologique, has_more)
+    """
+    if direction == 'after':
+        if cursor is not None:
+            messages = messages.filter(
+                Q(timestamp__gt=cursor.timestamp) |
+                Q(timestamp=cursor.timestamp, id__gt=cursor.id)
+            )
+        page = list(messages.order_by('timestamp', 'id')[:limit + 1])
+        has_more = len(page) > limit
+        return page[:limit], has_more
+
+    if cursor is not None:
+        messages = messages.filter(
+            Q(timestamp__lt=cursor.timestamp) |
+            Q(timestamp=cursor.timestamp, id__lt=cursor.id)
+        )
+    page = list(messages.order_by('-timestamp', '-id')[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+    page.reverse()
+    return page, has_more
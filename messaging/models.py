@@ -4,6 +4,8 @@ from django.conf import settings
 from django.utils import timezone
 # profile/models.py (ou messaging/models.py)
 from django.contrib.auth import get_user_model
+from .stats_utils import invalidate_messaging_stats
+from post.media_utils import refresh_media_metadata
 
 
 
@@ -78,6 +80,15 @@ class Conversation(models.Model):
     total_members_joined = models.IntegerField(default=0)
     total_members_left = models.IntegerField(default=0)
     
+    # Dénormalisé: maintenu par Message.save / Message.delete
+    last_message = models.ForeignKey(
+        'Message',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    
     def __str__(self):
         if self.is_group:
             return f"{self.get_group_type_display()}: {self.name or f'Groupe {self.id}'}"
@@ -110,13 +121,25 @@ class Conversation(models.Model):
     def is_full(self):
         """Vérifier si le groupe est plein"""
         return self.current_members_count >= self.max_participants
+    def _prefetched_participants(self):
+        """Participants déjà préchargés (prefetch_related), sinon None"""
+        cache = getattr(self, '_prefetched_objects_cache', {})
+        if 'participants' in cache:
+            return list(cache['participants'])
+        return None
+    
     def get_display_name(self, current_user):
         """Retourne le nom à afficher pour la conversation"""
         if self.is_group and self.name:
             return self.name
         
+        participants = self._prefetched_participants()
+        if participants is not None:
+            other_users = [user for user in participants if user.id != current_user.id]
+        else:
+            other_users = list(self.participants.exclude(id=current_user.id))
+        
         if self.is_group:
-            other_users = self.participants.exclude(id=current_user.id)
             names = [user.username for user in other_users]
             if len(names) > 2:
                 return f"{', '.join(names[:2])} et {len(names)-2} autres"
@@ -127,14 +150,18 @@ class Conversation(models.Model):
             return "Groupe"
         
         # Conversation privée
-        other_user = self.participants.exclude(id=current_user.id).first()
+        other_user = other_users[0] if other_users else None
         if other_user:
             return other_user.username
         return "Conversation"
     def is_user_member(self, user):
         """Vérifier si un utilisateur est membre du groupe"""
         # Vérifier dans participants
-        if self.participants.filter(id=user.id).exists():
+        participants = self._prefetched_participants()
+        if participants is not None:
+            if any(participant.id == user.id for participant in participants):
+                return True
+        elif self.participants.filter(id=user.id).exists():
             return True
         
         # Vérifier aussi dans GroupMember si le modèle existe
@@ -159,6 +186,9 @@ class Conversation(models.Model):
     
     def get_members_count(self):
         """Retourne le nombre de membres"""
+        participants = self._prefetched_participants()
+        if participants is not None:
+            return len(participants)
         return self.participants.count()
 
 class GroupJoinRequest(models.Model):
@@ -223,7 +253,7 @@ class GroupJoinRequest(models.Model):
         )
         # Mettre à jour les statistiques
         self.group.total_members_joined += 1
-        self.group.save()
+        self.group.save(update_fields=['total_members_joined', 'updated_at'])
     
     def reject(self, reviewed_by=None, notes=None):
         """Rejeter la demande"""
@@ -387,6 +417,10 @@ class Message(models.Model):
     deleted_for_sender = models.BooleanField(default=False)
     deleted_for_receiver = models.BooleanField(default=False)
     deleted_for_everyone = models.BooleanField(default=False)
+    # {'image' | 'file': {'size', 'mime_type', 'checksum', 'width', 'height'}}
+    # relevé à l'envoi (post.media_utils.refresh_media_metadata)
+    media_metadata = models.JSONField(default=dict, blank=True)
+    
     def __str__(self):
         if self.content:
             return f"{self.sender.username}: {self.content[:30]}"
@@ -402,12 +436,172 @@ class Message(models.Model):
             models.Index(fields=['sender', 'timestamp']),
         ]
     
+    MEDIA_FIELDS = ('image', 'file')
+    
     def save(self, *args, **kwargs):
-        # Mettre à jour updated_at de la conversation
-        if self.conversation:
-            self.conversation.updated_at = timezone.now()
-            self.conversation.save()
+        is_new = self._state.adding
+        kwargs['update_fields'] = refresh_media_metadata(self, self.MEDIA_FIELDS, kwargs.get('update_fields'))
         super().save(*args, **kwargs)
+        
+        # Mettre à jour updated_at (et le dernier message) de la conversation
+        if self.conversation_id:
+            update_fields = ['updated_at']
+            self.conversation.updated_at = timezone.now()
+            if is_new:
+                self.conversation.last_message = self
+                update_fields.append('last_message')
+            self.conversation.save(update_fields=update_fields)
+        
+        if is_new:
+            ConversationReadState.register_new_message(self)
+    
+    def delete(self, *args, **kwargs):
+        conversation = self.conversation
+        was_last_message = Conversation.objects.filter(
+            id=self.conversation_id,
+            last_message_id=self.id
+        ).exists()
+        ConversationReadState.unregister_message(self)
+        result = super().delete(*args, **kwargs)
+        
+        # Repointer last_message sur le message précédent
+        if was_last_message:
+            conversation.last_message = conversation.messages.order_by('-timestamp', '-id').first()
+            conversation.save(update_fields=['last_message'])
+        return result
+
+
+class ConversationReadState(models.Model):
+    """
+    État de lecture par (conversation, utilisateur): dernier message lu et
+    compteur de non-lus maintenu à l'écriture, pour que la liste des
+    conversations n'ait pas à compter les messages.
+    """
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='read_states'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='conversation_read_states'
+    )
+    # Pas une ForeignKey: la position de lecture survit à la suppression du message
+    last_read_message_id = models.BigIntegerField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['conversation', 'user']
+        indexes = [
+            models.Index(fields=['user', 'conversation']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} in conversation {self.conversation_id}: {self.unread_count} unread"
+    
+    @classmethod
+    def register_new_message(cls, message):
+        """+1 non-lu pour chaque participant sauf l'expéditeur"""
+        recipient_ids = list(
+            message.conversation.participants.exclude(
+                id=message.sender_id
+            ).values_list('id', flat=True)
+        )
+        invalidate_messaging_stats(recipient_ids + [message.sender_id])
+        if not recipient_ids:
+            return
+        
+        updated = cls.objects.filter(
+            conversation_id=message.conversation_id,
+            user_id__in=recipient_ids
+        ).update(unread_count=models.F('unread_count') + 1)
+        
+        if updated < len(recipient_ids):
+            # Premiers messages reçus dans cette conversation
+            existing_ids = set(cls.objects.filter(
+                conversation_id=message.conversation_id,
+                user_id__in=recipient_ids
+            ).values_list('user_id', flat=True))
+            cls.objects.bulk_create([
+                cls(conversation_id=message.conversation_id, user_id=user_id, unread_count=1)
+                for user_id in recipient_ids
+                if user_id not in existing_ids
+            ], ignore_conflicts=True)
+    
+    @classmethod
+    def unregister_message(cls, message):
+        """-1 non-lu pour ceux qui n'avaient pas encore lu ce message"""
+        invalidate_messaging_stats(
+            message.conversation.participants.values_list('id', flat=True)
+        )
+        cls.objects.filter(
+            conversation_id=message.conversation_id,
+            unread_count__gt=0
+        ).exclude(
+            user_id=message.sender_id
+        ).filter(
+            models.Q(last_read_message_id__isnull=True) |
+            models.Q(last_read_message_id__lt=message.id)
+        ).update(unread_count=models.F('unread_count') - 1)
+    
+    @classmethod
+    def mark_read(cls, conversation, user, up_to_message_id=None):
+        """
+        Marquer la conversation lue jusqu'à up_to_message_id
+        (None = jusqu'au dernier message)
+        """
+        last_message_id = conversation.last_message_id
+        if up_to_message_id is None:
+            up_to_message_id = last_message_id
+        
+        state, created = cls.objects.get_or_create(conversation=conversation, user=user)
+        if state.last_read_message_id and up_to_message_id and state.last_read_message_id > up_to_message_id:
+            up_to_message_id = state.last_read_message_id
+        
+        if up_to_message_id is None or (last_message_id and up_to_message_id >= last_message_id):
+            unread_count = 0
+        else:
+            unread_count = conversation.messages.filter(
+                id__gt=up_to_message_id
+            ).exclude(sender=user).count()
+        
+        if state.last_read_message_id != up_to_message_id or state.unread_count != unread_count:
+            state.last_read_message_id = up_to_message_id
+            state.unread_count = unread_count
+            state.save(update_fields=['last_read_message_id', 'unread_count', 'updated_at'])
+            invalidate_messaging_stats([user.id])
+        return state
+    
+    @classmethod
+    def rebuild_for_conversation(cls, conversation):
+        """
+        Recalculer last_message et les compteurs à partir de is_read
+        (reprise des données existantes / réconciliation)
+        """
+        conversation.last_message = conversation.messages.order_by('-timestamp', '-id').first()
+        conversation.save(update_fields=['last_message'])
+        
+        for user_id in conversation.participants.values_list('id', flat=True):
+            unread = conversation.messages.filter(is_read=False).exclude(sender_id=user_id)
+            first_unread = unread.order_by('timestamp', 'id').values_list('id', flat=True).first()
+            if first_unread is not None:
+                last_read = conversation.messages.filter(
+                    id__lt=first_unread
+                ).order_by('-id').values_list('id', flat=True).first()
+            else:
+                last_read = conversation.last_message_id
+            cls.objects.update_or_create(
+                conversation=conversation,
+                user_id=user_id,
+                defaults={
+                    'last_read_message_id': last_read,
+                    'unread_count': unread.count(),
+                }
+            )
+
+
 User = get_user_model()
 
 class UserOnlineStatus(models.Model):
@@ -485,6 +679,17 @@ class GroupBlock(models.Model):
 
 # models.py (ajoutez ces classes à la fin du fichier)
 
+def active_block_q(now=None, prefix=''):
+    """
+    Blocages actifs et non expirés, sans attendre le passage de expire_blocks
+    """
+    now = now or timezone.now()
+    return (
+        models.Q(**{f'{prefix}is_active': True}) &
+        (models.Q(**{f'{prefix}expires_at__isnull': True}) | models.Q(**{f'{prefix}expires_at__gt': now}))
+    )
+
+
 class Block(models.Model):
     """
     Modèle pour bloquer un utilisateur
@@ -577,11 +782,11 @@ class BlockSettings(models.Model):
     
     @property
     def blocks_count(self):
-        return self.user.blocked_users.filter(is_active=True).count()
+        return self.user.blocked_users.filter(active_block_q()).count()
     
     @property
     def blocked_by_count(self):
-        return self.user.blocked_by_users.filter(is_active=True).count()
+        return self.user.blocked_by_users.filter(active_block_q()).count()
     
     def can_block_more(self):
         return self.blocks_count < self.max_blocks_allowed
@@ -0,0 +1,311 @@
+# messaging/presence_utils.py
+"""
+Service de présence (en ligne / vu pour la dernière fois).
+
+Les pings n'écrivent plus dans UserOnlineStatus: ils posent une clé à TTL
+dans un backend (mémoire locale en dev / tests, Redis en production) et
+marquent l'utilisateur "sale". flush_presence() reporte périodiquement les
+last_activity / last_seen en base, par lots.
+
+Settings:
+- PRESENCE_BACKEND: chemin de la classe backend
+- PRESENCE_REDIS_URL: URL Redis pour RedisPresenceBackend
+- PRESENCE_TTL: fenêtre "en ligne" en secondes (120 = 2 minutes)
+- PRESENCE_FLUSH_INTERVAL: intervalle minimal entre deux flush (secondes)
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+def get_presence_ttl():
+    return getattr(settings, 'PRESENCE_TTL', 120)
+
+
+def get_presence_flush_interval():
+    return getattr(settings, 'PRESENCE_FLUSH_INTERVAL', 60)
+
+
+def _to_timestamp(dt):
+    return dt.timestamp()
+
+
+def _from_timestamp(ts):
+    return datetime.fromtimestamp(float(ts), tz=dt_timezone.utc)
+
+
+# ==================== BACKENDS ====================
+
+class BasePresenceBackend:
+    """
+    Interface commune. Les horodatages sont des timestamps Unix (float).
+    """
+
+    def touch(self, user_id, ts):
+        """Activité de l'utilisateur à l'instant ts"""
+        raise NotImplementedError
+
+    def set_offline(self, user_id, ts):
+        """Déconnexion explicite"""
+        raise NotImplementedError
+
+    def get_many(self, user_ids):
+        """
+        {user_id: (ts, is_online)} pour les utilisateurs dont la clé n'a pas
+        expiré (une déconnexion explicite reste visible pendant le TTL)
+        """
+        raise NotImplementedError
+
+    def pop_dirty(self):
+        """{user_id: (ts, is_online)} modifiés depuis le dernier flush"""
+        raise NotImplementedError
+
+    def acquire_flush_slot(self, interval):
+        """True si ce process doit lancer le flush maintenant"""
+        raise NotImplementedError
+
+
+class LocMemPresenceBackend(BasePresenceBackend):
+    """
+    Backend en mémoire du process (dev / tests). Non partagé entre workers.
+    """
+
+    def __init__(self, ttl=None, **kwargs):
+        self.ttl = ttl or get_presence_ttl()
+        self._lock = threading.Lock()
+        self._activity = {}
+        self._dirty = {}
+        self._last_flush = 0.0
+
+    def touch(self, user_id, ts):
+        with self._lock:
+            self._activity[user_id] = (ts, True)
+            self._dirty[user_id] = (ts, True)
+
+    def set_offline(self, user_id, ts):
+        with self._lock:
+            self._activity[user_id] = (ts, False)
+            self._dirty[user_id] = (ts, False)
+
+    def get_many(self, user_ids):
+        min_ts = time.time() - self.ttl
+        with self._lock:
+            return {
+                user_id: self._activity[user_id]
+                for user_id in user_ids
+                if self._activity.get(user_id, (0, False))[0] > min_ts
+            }
+
+    def pop_dirty(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    def acquire_flush_slot(self, interval):
+        now = time.time()
+        with self._lock:
+            if now - self._last_flush < interval:
+                return False
+            self._last_flush = now
+            return True
+
+
+class RedisPresenceBackend(BasePresenceBackend):
+    """
+    Backend Redis partagé entre workers: une clé à TTL par utilisateur et
+    un hash des utilisateurs à reporter en base.
+    """
+    KEY_PREFIX = 'presence:user:'
+    DIRTY_KEY = 'presence:dirty'
+    FLUSH_LOCK_KEY = 'presence:flush-lock'
+
+    def __init__(self, url=None, ttl=None, **kwargs):
+        import redis
+
+        self.ttl = ttl or get_presence_ttl()
+        self.client = redis.Redis.from_url(
+            url or getattr(settings, 'PRESENCE_REDIS_URL', 'redis://localhost:6379/0')
+        )
+
+    def _key(self, user_id):
+        return f"{self.KEY_PREFIX}{user_id}"
+
+    def _set(self, user_id, ts, is_online):
+        value = f"{ts}:{int(is_online)}"
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(self._key(user_id), value, ex=self.ttl)
+        pipe.hset(self.DIRTY_KEY, user_id, value)
+        pipe.execute()
+
+    @staticmethod
+    def _parse(value):
+        ts, is_online = value.decode().rsplit(':', 1)
+        return float(ts), is_online == '1'
+
+    def touch(self, user_id, ts):
+        self._set(user_id, ts, True)
+
+    def set_offline(self, user_id, ts):
+        self._set(user_id, ts, False)
+
+    def get_many(self, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        values = self.client.mget([self._key(user_id) for user_id in user_ids])
+        return {
+            user_id: self._parse(value)
+            for user_id, value in zip(user_ids, values)
+            if value is not None
+        }
+
+    def pop_dirty(self):
+        import redis
+
+        # RENAME est atomique: les pings suivants repartent dans un hash neuf
+        flushing_key = f"{self.DIRTY_KEY}:flushing:{time.time()}"
+        try:
+            self.client.rename(self.DIRTY_KEY, flushing_key)
+        except redis.ResponseError:
+            return {}  # Rien à reporter
+
+        raw = self.client.hgetall(flushing_key)
+        self.client.delete(flushing_key)
+
+        return {int(user_id): self._parse(value) for user_id, value in raw.items()}
+
+    def acquire_flush_slot(self, interval):
+        return bool(self.client.set(self.FLUSH_LOCK_KEY, 1, nx=True, ex=max(1, int(interval))))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_presence_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_path = getattr(
+                    settings, 'PRESENCE_BACKEND', 'messaging.presence_utils.LocMemPresenceBackend'
+                )
+                _backend = import_string(backend_path)()
+    return _backend
+
+
+# ==================== SERVICE ====================
+
+def record_activity(user_id):
+    """
+    Ping: marque l'utilisateur en ligne, sans écriture en base
+    """
+    now = timezone.now()
+    get_presence_backend().touch(user_id, _to_timestamp(now))
+    maybe_flush_presence()
+    return now
+
+
+def mark_offline(user_id):
+    now = timezone.now()
+    get_presence_backend().set_offline(user_id, _to_timestamp(now))
+    maybe_flush_presence()
+    return now
+
+
+def get_presence_many(user_ids):
+    """
+    {user_id: {'is_online', 'last_activity'}} pour une liste d'utilisateurs:
+    un MGET dans le backend + une seule requête en base pour ceux dont la
+    clé a expiré (dernière activité connue).
+    """
+    from .models import UserOnlineStatus
+
+    user_ids = {int(user_id) for user_id in user_ids}
+    live = get_presence_backend().get_many(user_ids)
+
+    presence = {
+        user_id: {'is_online': is_online, 'last_activity': _from_timestamp(ts)}
+        for user_id, (ts, is_online) in live.items()
+    }
+
+    missing_ids = user_ids - set(presence)
+    if missing_ids:
+        online_since = timezone.now() - timedelta(seconds=get_presence_ttl())
+        for user_id, is_online, last_activity in UserOnlineStatus.objects.filter(
+            user_id__in=missing_ids
+        ).values_list('user_id', 'is_online', 'last_activity'):
+            presence[user_id] = {
+                # Données pas encore expirées côté base (ex: backend redémarré)
+                'is_online': bool(is_online and last_activity and last_activity > online_since),
+                'last_activity': last_activity,
+            }
+        for user_id in missing_ids - set(presence):
+            presence[user_id] = {'is_online': False, 'last_activity': None}
+
+    return presence
+
+
+def get_presence(user_id):
+    return get_presence_many([user_id])[int(user_id)]
+
+
+def flush_presence():
+    """
+    Reporter en base les changements de présence accumulés.
+    Retourne le nombre d'utilisateurs mis à jour.
+    """
+    from .models import UserOnlineStatus
+
+    dirty = get_presence_backend().pop_dirty()
+    if not dirty:
+        return 0
+
+    existing = {
+        status.user_id: status
+        for status in UserOnlineStatus.objects.filter(user_id__in=dirty.keys())
+    }
+    to_update = []
+    to_create = []
+    for user_id, (ts, is_online) in dirty.items():
+        when = _from_timestamp(ts)
+        status = existing.get(user_id)
+        if status is None:
+            to_create.append(UserOnlineStatus(
+                user_id=user_id,
+                is_online=is_online,
+                last_activity=when,
+                last_seen=when,
+            ))
+            continue
+        status.is_online = is_online
+        status.last_activity = when
+        status.last_seen = when
+        to_update.append(status)
+
+    if to_update:
+        UserOnlineStatus.objects.bulk_update(
+            to_update, ['is_online', 'last_activity', 'last_seen'], batch_size=500
+        )
+    if to_create:
+        UserOnlineStatus.objects.bulk_create(to_create, batch_size=500, ignore_conflicts=True)
+
+    return len(dirty)
+
+
+def maybe_flush_presence():
+    """
+    Flush opportuniste, au plus une fois par PRESENCE_FLUSH_INTERVAL
+    (tous workers confondus avec Redis)
+    """
+    backend = get_presence_backend()
+    if backend.acquire_flush_slot(get_presence_flush_interval()):
+        try:
+            flush_presence()
+        except Exception as e:
+            print(f"Error flushing presence: {e}")
+
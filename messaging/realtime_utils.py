@@ -0,0 +1,106 @@
+# messaging/realtime_utils.py
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+
+
+def conversation_group_name(conversation_id):
+    """
+    Nom du groupe Channels d'une conversation
+    """
+    return f"conversation_{conversation_id}"
+
+
+def _group_send(conversation_id, event):
+    """
+    Envoyer un événement au groupe d'une conversation, après le commit
+    (les clients ne doivent jamais recevoir une ligne qui n'existe pas encore)
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    def send():
+        try:
+            async_to_sync(channel_layer.group_send)(
+                conversation_group_name(conversation_id),
+                event
+            )
+        except Exception as e:
+            # Le temps réel ne doit jamais casser l'API REST
+            print(f"Error broadcasting {event.get('type')} to conversation {conversation_id}: {e}")
+
+    transaction.on_commit(send)
+
+
+def _serialize_message(message, request):
+    """
+    Sérialisé avec la requête de l'auteur de l'écriture: URLs de fichiers
+    et d'avatars absolues, comme dans les réponses REST (relatives sans
+    request)
+    """
+    from .serializers import MessageSerializer
+
+    context = {'request': request} if request is not None else {}
+    return MessageSerializer(message, context=context).data
+
+
+def broadcast_new_message(message, request=None):
+    """
+    Pousser un nouveau message à tous les membres connectés de la conversation.
+    Le message est sérialisé une seule fois, quel que soit le nombre d'abonnés.
+    """
+    _group_send(message.conversation_id, {
+        'type': 'message.new',
+        'message': _serialize_message(message, request),
+    })
+
+
+def broadcast_message_updated(message, request=None):
+    """
+    Pousser la nouvelle version d'un message édité
+    """
+    _group_send(message.conversation_id, {
+        'type': 'message.updated',
+        'message': _serialize_message(message, request),
+    })
+
+
+def broadcast_messages_read(conversation_id, reader, message_ids=None):
+    """
+    Accusé de lecture. message_ids=None signifie "toute la conversation".
+    """
+    _group_send(conversation_id, {
+        'type': 'message.read',
+        'conversation_id': conversation_id,
+        'reader_id': reader.id,
+        'message_ids': list(message_ids) if message_ids is not None else None,
+        'read_at': timezone.now().isoformat(),
+    })
+
+
+def broadcast_message_deleted(conversation_id, message_id, deleted_by):
+    """
+    Signaler la suppression d'un message pour tout le monde
+    """
+    _group_send(conversation_id, {
+        'type': 'message.deleted',
+        'conversation_id': conversation_id,
+        'message_id': message_id,
+        'deleted_by': deleted_by.id,
+    })
+
+
+def broadcast_member_removed(conversation_id, user_ids):
+    """
+    Retirer du groupe les sockets de membres sortis, retirés ou bannis (le
+    consumer ne vérifie l'appartenance qu'à la connexion)
+    """
+    user_ids = [user_id for user_id in user_ids if user_id]
+    if user_ids:
+        _group_send(conversation_id, {
+            'type': 'member.removed',
+            'conversation_id': conversation_id,
+            'user_ids': user_ids,
+        })
@@ -0,0 +1,9 @@
+# messaging/routing.py
+from django.urls import path
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/msg/conversations/<int:conversation_id>/',
+         consumers.ConversationConsumer.as_asgi(),
+         name='ws-conversation'),
+]
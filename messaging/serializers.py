@@ -1,13 +1,39 @@
 # messaging/serializers.py
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Conversation, Message, GroupCategory, GroupFeedback, GroupJoinRequest, GroupMember
+from .models import Conversation, ConversationReadState, Message, GroupCategory, GroupFeedback, GroupJoinRequest, GroupMember
 from datetime import timedelta
 from django.utils import timezone
 from django.db.models import Avg, Count, Q
+from django.db.models.manager import BaseManager
+from .presence_utils import get_presence_many
 
 User = get_user_model()
 
+
+def preload_presence(context, user_ids):
+    """
+    Charger la présence d'un lot d'utilisateurs dans le contexte du serializer
+    (partagé par tous les serializers imbriqués d'une même réponse)
+    """
+    presence_map = context.setdefault('presence', {})
+    missing_ids = {user_id for user_id in user_ids if user_id not in presence_map}
+    if missing_ids:
+        presence_map.update(get_presence_many(missing_ids))
+    return presence_map
+
+
+def _as_list(data):
+    return list(data.all() if isinstance(data, BaseManager) else data)
+
+
+class PresenceUserListSerializer(serializers.ListSerializer):
+    """Précharge la présence de toute la liste d'utilisateurs"""
+    def to_representation(self, data):
+        users = _as_list(data)
+        preload_presence(self.context, [user.id for user in users])
+        return super().to_representation(users)
+
 # ==================== SERIALIZERS UTILISATEUR ====================
 
 class BasicUserSerializer(serializers.ModelSerializer):
@@ -42,6 +68,7 @@ class UserWithProfileSerializer(serializers.ModelSerializer):
             'is_active', 'is_account_active'
         ]
         read_only_fields = fields
+        list_serializer_class = PresenceUserListSerializer
     
     def get_profile_id(self, obj):
         if hasattr(obj, 'profile'):
@@ -56,27 +83,22 @@ class UserWithProfileSerializer(serializers.ModelSerializer):
             return obj.profile.image.url
         return None
     
+    def _get_presence(self, obj):
+        """Présence depuis le service (préchargée par lot quand c'est possible)"""
+        return preload_presence(self.context, [obj.id])[obj.id]
+    
     def get_is_online(self, obj):
         """Déterminer si l'utilisateur est en ligne"""
-        if hasattr(obj, 'online_status'):
-            online_status = obj.online_status
-            two_minutes_ago = timezone.now() - timedelta(minutes=2)
-            return online_status.last_activity > two_minutes_ago
-        return False
+        return self._get_presence(obj)['is_online']
     
     def get_last_seen(self, obj):
         """Récupérer la dernière fois vu (timestamp)"""
-        if hasattr(obj, 'online_status'):
-            return obj.online_status.last_activity
-        return None
+        return self._get_presence(obj)['last_activity']
     
     def get_formatted_last_seen(self, obj):
         """Formater la dernière fois vu en texte"""
-        if hasattr(obj, 'online_status'):
-            dt = obj.online_status.last_activity
-            if not dt:
-                return "Never"
-            
+        dt = self._get_presence(obj)['last_activity']
+        if dt:
             now = timezone.now()
             diff = now - dt
             
@@ -125,6 +147,13 @@ class UserWithProfileSerializer(serializers.ModelSerializer):
 
 # ==================== SERIALIZERS MESSAGE ====================
 
+class MessageListSerializer(serializers.ListSerializer):
+    """Précharge la présence de tous les expéditeurs de la liste"""
+    def to_representation(self, data):
+        messages = _as_list(data)
+        preload_presence(self.context, {message.sender_id for message in messages})
+        return super().to_representation(messages)
+
 class MessageSerializer(serializers.ModelSerializer):
     sender = UserWithProfileSerializer(read_only=True)
     image_url = serializers.SerializerMethodField()
@@ -147,6 +176,7 @@ class MessageSerializer(serializers.ModelSerializer):
             'id', 'conversation', 'sender', 'timestamp', 'is_read',
             'is_system_message', 'system_message_type', 'message_type'
         ]
+        list_serializer_class = MessageListSerializer
     def get_image_url(self, obj):
         if obj.image:
             request = self.context.get('request')
@@ -206,6 +236,24 @@ class ConversationCreateSerializer(serializers.ModelSerializer):
         
         return conversation
 
+class ConversationListSerializer(serializers.ListSerializer):
+    """
+    Précharge la présence de tous les participants préchargés et des
+    expéditeurs des derniers messages, pour toute la liste
+    """
+    def to_representation(self, data):
+        conversations = _as_list(data)
+        last_message_field = Conversation._meta.get_field('last_message')
+        user_ids = set()
+        for conversation in conversations:
+            participants = conversation._prefetched_participants()
+            if participants is not None:
+                user_ids.update(participant.id for participant in participants)
+            if last_message_field.is_cached(conversation) and conversation.last_message:
+                user_ids.add(conversation.last_message.sender_id)
+        preload_presence(self.context, user_ids)
+        return super().to_representation(conversations)
+
 class ConversationSerializer(serializers.ModelSerializer):
     """Serializer pour lire une conversation"""
     participants = UserWithProfileSerializer(many=True, read_only=True)
@@ -232,6 +280,7 @@ class ConversationSerializer(serializers.ModelSerializer):
             'can_anyone_invite', 'can_user_join', 'max_participants'
         ]
         read_only_fields = fields
+        list_serializer_class = ConversationListSerializer
     
     def get_can_invite(self, obj):
         """Déterminer si l'utilisateur actuel peut inviter"""
@@ -243,7 +292,8 @@ class ConversationSerializer(serializers.ModelSerializer):
         return False
     
     def get_last_message(self, obj):
-        last_msg = obj.messages.last()
+        # Pointeur dénormalisé (maintenu par Message.save / Message.delete)
+        last_msg = obj.last_message
         if last_msg:
             return MessageSerializer(last_msg, context=self.context).data
         return None
@@ -251,7 +301,13 @@ class ConversationSerializer(serializers.ModelSerializer):
     def get_unread_count(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.messages.filter(is_read=False).exclude(sender=request.user).count()
+            # Préchargé par la vue (Prefetch to_attr='my_read_states')
+            if hasattr(obj, 'my_read_states'):
+                return obj.my_read_states[0].unread_count if obj.my_read_states else 0
+            unread_count = obj.read_states.filter(
+                user=request.user
+            ).values_list('unread_count', flat=True).first()
+            return unread_count or 0
         return 0
     
     def get_display_name(self, obj):
@@ -269,7 +325,7 @@ class ConversationSerializer(serializers.ModelSerializer):
         return None
     
     def get_members_count(self, obj):
-        return obj.participants.count()
+        return obj.get_members_count()
     
     def get_can_user_join(self, obj):
         request = self.context.get('request')
@@ -423,7 +479,7 @@ class GroupCreateSerializer(serializers.ModelSerializer):
             try:
                 category = GroupCategory.objects.get(id=category_id)
                 conversation.category = category
-                conversation.save()
+                conversation.save(update_fields=['category', 'updated_at'])
             except GroupCategory.DoesNotExist:
                 pass
         
@@ -658,6 +714,7 @@ class ConversationDetailSerializer(ConversationSerializer):
             unread_messages = messages.filter(is_read=False).exclude(sender=request.user)
             if unread_messages.exists():
                 unread_messages.update(is_read=True)
+            ConversationReadState.mark_read(obj, request.user)
         
         return MessageSerializer(messages, many=True, context=self.context).data
     
@@ -1,17 +1,54 @@
 # messaging/signals.py
 from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import m2m_changed, post_save
 from django.dispatch import receiver
-from django.utils import timezone
-from .models import UserOnlineStatus
+from . import realtime_utils
+from .models import Conversation, GroupMember
+from .presence_utils import mark_offline
 
 @receiver(user_logged_out)
 def update_status_on_logout(sender, request, user, **kwargs):
     """Mettre à jour le statut quand l'utilisateur se déconnecte"""
+    if user is None:
+        return
     try:
-        online_status = UserOnlineStatus.objects.filter(user=user).first()
-        if online_status:
-            online_status.is_online = False
-            online_status.last_seen = timezone.now()
-            online_status.save()
+        mark_offline(user.id)
     except Exception as e:
-        print(f"Error updating online status on logout: {e}")
\ No newline at end of file
+        print(f"Error updating online status on logout: {e}")
+
+
+# ==================== TEMPS RÉEL: APPARTENANCE ====================
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def disconnect_removed_participants(sender, instance, action, reverse, pk_set, **kwargs):
+    """Fermer les sockets des participants retirés d'une conversation"""
+    if action == 'pre_clear':
+        # pk_set est vide pour clear(): relever les lignes avant suppression
+        if reverse:
+            instance._cleared_conversation_ids = list(instance.conversations.values_list('id', flat=True))
+        else:
+            instance._cleared_participant_ids = list(instance.participants.values_list('id', flat=True))
+        return
+    if action == 'post_clear':
+        if reverse:
+            for conversation_id in getattr(instance, '_cleared_conversation_ids', []):
+                realtime_utils.broadcast_member_removed(conversation_id, [instance.id])
+        else:
+            realtime_utils.broadcast_member_removed(
+                instance.id, getattr(instance, '_cleared_participant_ids', [])
+            )
+        return
+    if action != 'post_remove' or not pk_set:
+        return
+    if reverse:
+        for conversation_id in pk_set:
+            realtime_utils.broadcast_member_removed(conversation_id, [instance.id])
+    else:
+        realtime_utils.broadcast_member_removed(instance.id, pk_set)
+
+
+@receiver(post_save, sender=GroupMember)
+def disconnect_banned_member(sender, instance, **kwargs):
+    """Un membre banni reste participant: fermer ses sockets quand même"""
+    if instance.is_banned:
+        realtime_utils.broadcast_member_removed(instance.group_id, [instance.user_id])
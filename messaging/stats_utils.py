@@ -0,0 +1,23 @@
+# messaging/stats_utils.py
+from django.conf import settings
+from django.core.cache import cache
+
+
+def get_stats_cache_timeout():
+    """
+    Durée de vie (secondes) du cache de messaging_stats. 0 = désactivé.
+    """
+    return getattr(settings, 'MESSAGING_STATS_CACHE_TIMEOUT', 30)
+
+
+def get_stats_cache_key(user_id):
+    return f"messaging_stats_{user_id}"
+
+
+def invalidate_messaging_stats(user_ids):
+    """
+    Invalider les stats en cache (nouveau message, lecture, suppression)
+    """
+    keys = [get_stats_cache_key(user_id) for user_id in user_ids if user_id]
+    if keys:
+        cache.delete_many(keys)
@@ -49,6 +49,10 @@ urlpatterns = [
          views.delete_message_for_everyone, 
          name='delete-message-for-everyone'),
     
+    path('conversations/<int:conversation_id>/messages/<int:pk>/file/', 
+         views.serve_message_file, 
+         name='serve-message-file'),
+    
     # ==================== UTILISATEURS ====================
     path('users/', 
          views.user_list, 
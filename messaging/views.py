@@ -20,12 +20,16 @@ from django.shortcuts import get_object_or_404, render
 from django.db import transaction
 from .models import User, Block, BlockSettings, BlockHistory
 from .block_utils import BlockManager
+from . import message_utils, presence_utils, realtime_utils, stats_utils
+from post.media_utils import get_checksum_etag, serve_media_file
+from searchs import fuzzy_utils
+from searchs.index_utils import rank_ordering
 
 User = get_user_model()
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
 from .models import (
-    Conversation, Message, GroupCategory, 
+    Conversation, ConversationReadState, Message, GroupCategory, 
     GroupJoinRequest, GroupFeedback, GroupMember,GroupBlock
 )
 from .serializers import (
@@ -34,7 +38,8 @@ from .serializers import (
     GroupCategorySerializer, GroupJoinRequestSerializer,
     GroupFeedbackSerializer, GroupMemberSerializer,ConversationCreateSerializer
 )
-from django.db.models import Q, Count, Avg
+from django.db.models import Q, Count, Avg, Prefetch, Sum
+from django.core.cache import cache
 class UserWithProfileSerializer(serializers.ModelSerializer):
     profile_image = serializers.SerializerMethodField()
     
@@ -64,9 +69,17 @@ def conversation_list_create(request):
         # Précharger les participants et leurs profils
         conversations = Conversation.objects.filter(
             participants=request.user
+        ).select_related(
+            'created_by',
+            'last_message__sender__profile',
         ).prefetch_related(
-            'participants__profile'  # IMPORTANT
-        ).prefetch_related('messages')
+            'participants__profile',  # IMPORTANT
+            Prefetch(
+                'read_states',
+                queryset=ConversationReadState.objects.filter(user=request.user),
+                to_attr='my_read_states'
+            ),
+        )
         
         serializer = ConversationSerializer(
             conversations, 
@@ -129,7 +142,7 @@ def conversation_detail(request, pk):
             if request.user not in users:
                 conversation.participants.add(request.user)
             
-            conversation.save()
+            conversation.save(update_fields=['updated_at'])
         
         serializer = ConversationSerializer(
             conversation,
@@ -223,7 +236,7 @@ def add_participant(request, pk):
         user = User.objects.get(id=user_id, is_active=True  )
         conversation.participants.add(user)
         conversation.updated_at = timezone.now()
-        conversation.save()
+        conversation.save(update_fields=['updated_at'])
         
         return Response(
             ConversationSerializer(conversation, context={'request': request}).data
@@ -252,6 +265,10 @@ def mark_conversation_as_read(request, pk):
     ).exclude(
         sender=request.user
     ).update(is_read=True)
+    ConversationReadState.mark_read(conversation, request.user)
+    
+    if updated_count:
+        realtime_utils.broadcast_messages_read(conversation.id, request.user)
     
     return Response({
         'status': 'success',
@@ -267,6 +284,12 @@ def mark_conversation_as_read(request, pk):
 def message_list_create(request, conversation_id):
     """
     List all messages of a conversation or create a new message
+    
+    GET cursor mode (any of these params enables it):
+    - ?limit=N            -> the N latest messages
+    - ?before=<id>&limit=N -> N messages older than message <id>
+    - ?after=<id>&limit=N  -> N messages newer than message <id>
+    Without these params the full history is returned (legacy clients).
     """
     conversation = get_object_or_404(
         Conversation.objects.filter(participants=request.user),
@@ -289,19 +312,86 @@ def message_list_create(request, conversation_id):
         # Combine conditions
         messages = Message.objects.filter(
             visible_filter & (sender_condition | receiver_condition)
-        ).select_related('sender').order_by('timestamp')
+        ).select_related('sender', 'sender__profile')
+        
+        before = request.query_params.get('before')
+        after = request.query_params.get('after')
+        limit = request.query_params.get('limit')
+        cursor_mode = bool(before or after or limit)
+        
+        if cursor_mode:
+            if before and after:
+                return Response(
+                    {'error': 'before et after ne peuvent pas être combinés'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                limit = int(limit) if limit else message_utils.MESSAGE_PAGE_SIZE
+                cursor_id = int(before or after) if (before or after) else None
+            except ValueError:
+                return Response(
+                    {'error': 'before, after et limit doivent être des nombres'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            limit = max(1, min(limit, message_utils.MESSAGE_PAGE_SIZE_MAX))
+            
+            cursor = None
+            if cursor_id is not None:
+                # Curseur cherché dans la conversation (même s'il est masqué pour l'utilisateur)
+                cursor = Message.objects.filter(
+                    conversation=conversation, id=cursor_id
+                ).only('id', 'timestamp').first()
+                if cursor is None:
+                    return Response(
+                        {'error': 'Cursor message not found'},
+                        status=status.HTTP_404_NOT_FOUND
+                    )
+        
+        page, has_more = [], False
+        if cursor_mode:
+            page, has_more = message_utils.get_message_cursor_page(
+                messages,
+                cursor=cursor,
+                direction='after' if after else 'before',
+                limit=limit
+            )
         
-        # Mark as read
-        unread_messages = messages.filter(is_read=False).exclude(sender=request.user)
-        if unread_messages.exists():
-            unread_messages.update(is_read=True)
+        # Mark as read (not when scrolling back through older history).
+        # En mode curseur, seulement jusqu'au dernier message renvoyé
+        if not before and (page or not cursor_mode):
+            up_to_message_id = page[-1].id if cursor_mode else None
+            ConversationReadState.mark_read(conversation, request.user, up_to_message_id)
+            unread = messages.filter(is_read=False).exclude(sender=request.user)
+            if up_to_message_id is not None:
+                unread = unread.filter(id__lte=up_to_message_id)
+            unread_ids = list(unread.values_list('id', flat=True))
+            if unread_ids:
+                Message.objects.filter(id__in=unread_ids).update(is_read=True)
+                realtime_utils.broadcast_messages_read(conversation.id, request.user, unread_ids)
+                for message in page:
+                    if message.id in unread_ids:
+                        message.is_read = True
+        
+        if not cursor_mode:
+            serializer = MessageSerializer(
+                messages.order_by('timestamp'), 
+                many=True,
+                context={'request': request}
+            )
+            return Response(serializer.data)
         
         serializer = MessageSerializer(
-            messages, 
+            page, 
             many=True,
             context={'request': request}
         )
-        return Response(serializer.data)
+        return Response({
+            'results': serializer.data,
+            'has_more': has_more,
+            'next_before': page[0].id if page else None,
+            'next_after': page[-1].id if page else cursor_id,
+            'limit': limit,
+        })
     
     elif request.method == 'POST':
         # ============ BLOCK CHECK ============
@@ -397,7 +487,9 @@ def message_list_create(request, conversation_id):
             )
             
             conversation.updated_at = timezone.now()
-            conversation.save()
+            conversation.save(update_fields=['updated_at'])
+            
+            realtime_utils.broadcast_new_message(message, request)
             
             return Response(
                 MessageSerializer(message, context={'request': request}).data,
@@ -465,7 +557,9 @@ def message_detail(request, conversation_id, pk):
             updated_message = serializer.save()
             
             conversation.updated_at = timezone.now()
-            conversation.save()
+            conversation.save(update_fields=['updated_at'])
+            
+            realtime_utils.broadcast_message_updated(updated_message, request)
             
             return Response(serializer.data)
         
@@ -481,10 +575,13 @@ def message_detail(request, conversation_id, pk):
         
         # ⚠️ OPTIONAL: Implement WhatsApp-like delete
         # For now, we'll do a hard delete
+        message_id = message.id
         message.delete()
         
+        realtime_utils.broadcast_message_deleted(conversation.id, message_id, request.user)
+        
         conversation.updated_at = timezone.now()
-        conversation.save()
+        conversation.save(update_fields=['updated_at'])
         
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -566,6 +663,8 @@ def delete_message_for_everyone(request, conversation_id, pk):
     conversation.updated_at = timezone.now()
     conversation.save(update_fields=["updated_at"])
 
+    realtime_utils.broadcast_message_deleted(conversation.id, message_id, request.user)
+
     return Response({
         'status': 'success',
         'message': 'Message deleted for everyone',
@@ -573,6 +672,34 @@ def delete_message_for_everyone(request, conversation_id, pk):
     }, status=status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@authentication_classes([TokenAuthentication, SessionAuthentication])
+def serve_message_file(request, conversation_id, pk):
+    """
+    Fichier joint d'un message, pour les participants de la conversation,
+    avec support Range (lecture / avance dans les vidéos) et 304
+    """
+    conversation = get_object_or_404(
+        Conversation.objects.filter(participants=request.user),
+        pk=conversation_id
+    )
+
+    message = get_object_or_404(
+        Message.objects.filter(conversation=conversation, deleted_for_everyone=False),
+        pk=pk
+    )
+
+    metadata = message.media_metadata.get('file', {})
+    return serve_media_file(
+        request,
+        message.file,
+        content_type=metadata.get('mime_type'),
+        etag=get_checksum_etag(metadata.get('checksum')),
+        as_attachment=request.query_params.get('download', 'false').lower() == 'true'
+    )
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 @authentication_classes([TokenAuthentication, SessionAuthentication])
@@ -590,9 +717,12 @@ def mark_message_as_read(request, conversation_id, pk):
         pk=pk
     )
     
+    ConversationReadState.mark_read(conversation, request.user, up_to_message_id=message.id)
+    
     if not message.is_read:
         message.is_read = True
         message.save()
+        realtime_utils.broadcast_messages_read(conversation.id, request.user, [message.id])
     
     return Response({'status': 'message marked as read'})
 
@@ -608,6 +738,9 @@ def user_list(request):
     """
     users = User.objects.exclude(id=request.user.id).select_related('profile')
     
+    # Ni utilisateurs bloqués, ni utilisateurs qui ont bloqué le lecteur
+    users = users.exclude(id__in=BlockManager.get_hidden_user_ids(request.user))
+    
     # Filtrer les utilisateurs inactifs
     users = users.filter(is_active=True)
     
@@ -626,12 +759,9 @@ def user_list(request):
     
     search = request.query_params.get('search', None)
     if search:
-        users = users.filter(
-            Q(username__icontains=search) |
-            Q(email__icontains=search) |
-            Q(first_name__icontains=search) |
-            Q(last_name__icontains=search)
-        )
+        # Tolérant aux fautes: index de n-grammes + distance d'édition bornée
+        user_ids = fuzzy_utils.search_user_ids(search, users, limit=None)
+        users = users.filter(id__in=user_ids).order_by(rank_ordering(user_ids))
     
     serializer = UserWithProfileSerializer(users, many=True, context={'request': request})
     return Response(serializer.data)
@@ -653,7 +783,9 @@ def user_search(request):
     # Base queryset avec filtre d'utilisateurs actifs
     users = User.objects.filter(
         is_active=True  # <-- FILTRE AJOUTÉ: uniquement les utilisateurs actifs
-    ).exclude(id=request.user.id).select_related('profile')
+    ).exclude(id=request.user.id).exclude(
+        id__in=BlockManager.get_hidden_user_ids(request.user)
+    ).select_related('profile')
     
     # Filtre supplémentaire pour les profils actifs
     users = users.filter(
@@ -661,21 +793,17 @@ def user_search(request):
         Q(profile__is_active=True)  # Inclure les utilisateurs avec profil actif
     )
     
-    # Appliquer la recherche
-    users = users.filter(
-        Q(username__icontains=search) |
-        Q(email__icontains=search) |
-        Q(first_name__icontains=search) |
-        Q(last_name__icontains=search)
-    )[:20]
+    # Appliquer la recherche (tolérante aux fautes: "jonh" trouve "john")
+    user_ids = fuzzy_utils.search_user_ids(search, users, limit=20)
+    users = list(users.filter(id__in=user_ids).order_by(rank_ordering(user_ids)))
     
     serializer = UserWithProfileSerializer(users, many=True, context={'request': request})
     
     return Response({
         'results': serializer.data,
-        'count': users.count(),
+        'count': len(users),
         'search': search,
-        'message': f'Found {users.count()} active users matching "{search}"'
+        'message': f'Found {len(users)} active users matching "{search}"'
     })
 
 # ==================== STATISTICS ====================
@@ -686,37 +814,51 @@ def user_search(request):
 def messaging_stats(request):
     """
     Get user messaging statistics
+    
+    Les non-lus viennent de ConversationReadState (une seule agrégation);
+    le résultat est mis en cache quelques secondes par utilisateur et
+    invalidé à chaque nouveau message / lecture / suppression.
     """
+    cache_timeout = stats_utils.get_stats_cache_timeout()
+    cache_key = stats_utils.get_stats_cache_key(request.user.id)
+    if cache_timeout:
+        cached_stats = cache.get(cache_key)
+        if cached_stats is not None:
+            return Response(cached_stats)
+    
     total_conversations = Conversation.objects.filter(
         participants=request.user
     ).count()
     
-    unread_messages = 0
-    conversations = Conversation.objects.filter(participants=request.user)
-    
-    for conv in conversations:
-        unread_messages += conv.messages.filter(
-            is_read=False
-        ).exclude(
-            sender=request.user
-        ).count()
+    unread_messages = ConversationReadState.objects.filter(
+        user=request.user,
+        conversation__participants=request.user
+    ).aggregate(total=Sum('unread_count'))['total'] or 0
     
     last_message_sent = Message.objects.filter(
         sender=request.user
+    ).select_related(
+        'sender__profile'
     ).order_by('-timestamp').first()
     
     last_message_received = Message.objects.filter(
         conversation__participants=request.user
     ).exclude(
         sender=request.user
+    ).select_related(
+        'sender__profile'
     ).order_by('-timestamp').first()
     
-    return Response({
+    stats = {
         'total_conversations': total_conversations,
         'unread_messages': unread_messages,
         'last_message_sent': MessageSerializer(last_message_sent).data if last_message_sent else None,
         'last_message_received': MessageSerializer(last_message_received).data if last_message_received else None,
-    })
+    }
+    if cache_timeout:
+        cache.set(cache_key, stats, cache_timeout)
+    
+    return Response(stats)
 
 
 
@@ -727,32 +869,16 @@ def messaging_stats(request):
 @permission_classes([permissions.IsAuthenticated])
 def ping_online_status(request):
     """
-    Version simplifiée sans méthodes de classe
+    Ping de présence: clé à TTL dans le backend de présence, pas d'écriture
+    en base (reportée par lots, voir presence_utils.flush_presence)
     """
     try:
-        from .models import UserOnlineStatus
-        
-        # Récupérer ou créer le statut
-        user_status, created = UserOnlineStatus.objects.get_or_create(
-            user=request.user
-        )
-        
-        # Mettre à jour manuellement
-        from datetime import timedelta
-        from django.utils import timezone
-        
-        user_status.last_activity = timezone.now()
-        
-        # Marquer comme en ligne si activité dans les 2 dernières minutes
-        two_minutes_ago = timezone.now() - timedelta(minutes=2)
-        user_status.is_online = user_status.last_activity > two_minutes_ago
-        
-        user_status.save()
+        last_activity = presence_utils.record_activity(request.user.id)
         
         return Response({
             'status': 'success',
-            'is_online': user_status.is_online,
-            'last_activity': user_status.last_activity,
+            'is_online': True,
+            'last_activity': last_activity,
         })
         
     except Exception as e:
@@ -769,23 +895,14 @@ def get_my_online_status(request):
     Récupérer son propre statut en ligne
     """
     try:
-        from .models import UserOnlineStatus
-        
-        status, created = UserOnlineStatus.objects.get_or_create(
-            user=request.user,
-            defaults={
-                'is_online': True,
-                'last_activity': timezone.now(),
-                'last_seen': timezone.now()
-            }
-        )
+        presence = presence_utils.get_presence(request.user.id)
         
         return Response({
             'user_id': request.user.id,
             'username': request.user.username,
-            'is_online': status.is_online,
-            'last_activity': status.last_activity,
-            'last_seen': status.last_seen,
+            'is_online': presence['is_online'],
+            'last_activity': presence['last_activity'],
+            'last_seen': presence['last_activity'],
         })
         
     except Exception as e:
@@ -803,52 +920,24 @@ def check_user_online(request, user_id):
     Vérifier si un utilisateur spécifique est en ligne
     """
     try:
-        user = User.objects.get(id=user_id)
-        
-        if hasattr(user, 'online_status'):
-            status = user.online_status
-            
-            # Considérer en ligne si activité dans les 2 dernières minutes
-            two_minutes_ago = timezone.now() - timedelta(minutes=2)
-            is_currently_online = status.last_activity > two_minutes_ago
-            
-            # Mettre à jour le champ is_online si nécessaire
-            if status.is_online != is_currently_online:
-                status.is_online = is_currently_online
-                status.save()
-            
-            return Response({
-                'user_id': user_id,
-                'username': user.username,
-                'is_online': is_currently_online,
-                'last_seen': status.last_activity,
-                'last_activity': status.last_activity,
-                'formatted_last_seen': format_last_seen(status.last_activity),
-            })
-        
-        # Si pas de statut, créer un par défaut
-        from .models import UserOnlineStatus
-        status = UserOnlineStatus.objects.create(
-            user=user,
-            is_online=False,
-            last_activity=timezone.now() - timedelta(days=1)
-        )
-        
-        return Response({
-            'user_id': user_id,
-            'username': user.username,
-            'is_online': False,
-            'last_seen': status.last_activity,
-            'last_activity': status.last_activity,
-            'formatted_last_seen': 'Long time ago',
-            'note': 'Status created with default values'
-        })
-        
+        user = User.objects.only('id', 'username').get(id=user_id)
     except User.DoesNotExist:
         return Response(
             {'error': 'User not found'}, 
             status=status.HTTP_404_NOT_FOUND
         )
+    
+    presence = presence_utils.get_presence(user.id)
+    last_activity = presence['last_activity']
+    
+    return Response({
+        'user_id': user_id,
+        'username': user.username,
+        'is_online': presence['is_online'],
+        'last_seen': last_activity,
+        'last_activity': last_activity,
+        'formatted_last_seen': format_last_seen(last_activity) if last_activity else 'Long time ago',
+    })
 
 
 @api_view(['GET'])
@@ -857,6 +946,7 @@ def check_user_online(request, user_id):
 def get_multiple_users_online_status(request):
     """
     Récupérer le statut en ligne de plusieurs utilisateurs
+    (un MGET dans le backend de présence + au plus deux requêtes)
     """
     user_ids = request.GET.getlist('user_ids[]')
     
@@ -867,32 +957,20 @@ def get_multiple_users_online_status(request):
         )
     
     try:
-        users = User.objects.filter(id__in=user_ids)
+        users = list(User.objects.filter(id__in=user_ids).only('id', 'username'))
+        presence = presence_utils.get_presence_many([user.id for user in users])
         results = []
         
         for user in users:
-            if hasattr(user, 'online_status'):
-                status = user.online_status
-                
-                # Vérifier si en ligne
-                two_minutes_ago = timezone.now() - timedelta(minutes=2)
-                is_online = status.last_activity > two_minutes_ago
-                
-                results.append({
-                    'user_id': user.id,
-                    'username': user.username,
-                    'is_online': is_online,
-                    'last_seen': status.last_activity,
-                    'formatted_last_seen': format_last_seen(status.last_activity),
-                })
-            else:
-                results.append({
-                    'user_id': user.id,
-                    'username': user.username,
-                    'is_online': False,
-                    'last_seen': None,
-                    'formatted_last_seen': 'Unknown',
-                })
+            user_presence = presence[user.id]
+            last_activity = user_presence['last_activity']
+            results.append({
+                'user_id': user.id,
+                'username': user.username,
+                'is_online': user_presence['is_online'],
+                'last_seen': last_activity,
+                'formatted_last_seen': format_last_seen(last_activity) if last_activity else 'Unknown',
+            })
         
         return Response({
             'results': results,
@@ -914,27 +992,18 @@ def set_online_status(request):
     Définir manuellement son statut en ligne (pour tests ou contrôle manuel)
     """
     try:
-        from .models import UserOnlineStatus
-        
         is_online = request.data.get('is_online', True)
         
-        status, created = UserOnlineStatus.objects.get_or_create(
-            user=request.user
-        )
-        
-        status.is_online = is_online
-        status.last_activity = timezone.now()
-        
-        if not is_online:
-            status.last_seen = timezone.now()
-        
-        status.save()
+        if is_online:
+            last_activity = presence_utils.record_activity(request.user.id)
+        else:
+            last_activity = presence_utils.mark_offline(request.user.id)
         
         return Response({
             'status': 'success',
-            'is_online': status.is_online,
-            'last_activity': status.last_activity,
-            'last_seen': status.last_seen,
+            'is_online': bool(is_online),
+            'last_activity': last_activity,
+            'last_seen': last_activity,
             'message': f"Status set to {'online' if is_online else 'offline'}"
         })
         
@@ -1086,7 +1155,7 @@ def create_group_conversation(request):
     # Si le groupe a une photo par défaut ou envoyée
     if 'group_photo' in request.FILES:
         conversation.group_photo = request.FILES['group_photo']
-        conversation.save()
+        conversation.save(update_fields=['group_photo', 'updated_at'])
         
         # Message système pour la photo
         Message.objects.create(
@@ -1102,13 +1171,13 @@ def create_group_conversation(request):
     tags = request.data.get('tags', [])
     if tags:
         conversation.tags = tags
-        conversation.save()
+        conversation.save(update_fields=['tags', 'updated_at'])
     
     # Si une description est fournie
     description = request.data.get('description', '')
     if description:
         conversation.description = description
-        conversation.save()
+        conversation.save(update_fields=['description', 'updated_at'])
     
     serializer = ConversationDetailSerializer(conversation, context={'request': request})
     return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -1670,11 +1739,13 @@ def search_groups(request):
     groups = Conversation.objects.filter(
         is_group=True,
         group_type='group_public',
-        is_active=True,
-        name__icontains=search_query
+        is_active=True
     ).exclude(
         participants=request.user
     )
+    # Tolérant aux fautes: index de n-grammes + distance d'édition bornée
+    group_ids = fuzzy_utils.search_group_ids(search_query, groups, limit=None)
+    groups = groups.filter(id__in=group_ids).order_by(rank_ordering(group_ids))
     
     serializer = ConversationSerializer(
         groups, 
@@ -2064,7 +2135,7 @@ def transfer_group_ownership(request, pk):
         # Effectuer le transfert
         old_owner = group.created_by
         group.created_by = new_owner
-        group.save()
+        group.save(update_fields=['created_by', 'updated_at'])
         
         # Mettre à jour GroupMember
         try:
@@ -2728,9 +2799,10 @@ def list_group_members(request, pk):
         )
     
     # Pour les groupes publics, montrer tous les membres
+    # Un bannissement expiré compte comme levé, même avant le passage de expire_blocks
     members = GroupMember.objects.filter(
-        group=group,
-        is_banned=False
+        Q(is_banned=False) | Q(ban_expires__lte=timezone.now()),
+        group=group
     ).select_related('user', 'user__profile')
     
     # Pour les non-membres, limiter à 20 membres maximum
@@ -0,0 +1,55 @@
+# messaging/ws_auth.py
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+
+User = get_user_model()
+
+
+@database_sync_to_async
+def get_user_from_token(raw_token):
+    """
+    Résoudre un token DRF (authtoken) ou un access token JWT
+    """
+    from rest_framework.authtoken.models import Token
+
+    try:
+        return Token.objects.select_related('user').get(key=raw_token).user
+    except Token.DoesNotExist:
+        pass
+
+    try:
+        from rest_framework_simplejwt.tokens import AccessToken
+        from rest_framework_simplejwt.exceptions import TokenError
+
+        access_token = AccessToken(raw_token)
+        return User.objects.get(id=access_token['user_id'])
+    except (TokenError, User.DoesNotExist, KeyError):
+        return AnonymousUser()
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """
+    Authentification WebSocket par ?token=<clé> (les navigateurs ne peuvent pas
+    envoyer d'en-tête Authorization pendant le handshake)
+    """
+
+    async def __call__(self, scope, receive, send):
+        query_string = scope.get('query_string', b'').decode()
+        token = parse_qs(query_string).get('token', [None])[0]
+
+        if token:
+            scope['user'] = await get_user_from_token(token)
+
+        return await super().__call__(scope, receive, send)
+
+
+def TokenAuthMiddlewareStack(inner):
+    """
+    Session d'abord (admin / même domaine), puis token s'il est fourni
+    """
+    return AuthMiddlewareStack(TokenAuthMiddleware(inner))
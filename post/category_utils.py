@@ -0,0 +1,161 @@
+# post/category_utils.py
+"""
+Arbre des catégories en mémoire du process.
+
+Les catégories sont peu nombreuses et changent rarement: elles sont chargées
+en une requête et gardées par process, avec ancêtres, chemin complet, URL
+d'image et sous-catégories actives précalculés. Un numéro de version en
+cache (partagé entre workers avec Redis) est incrémenté à chaque
+save/delete de Category (signals.py); chaque process recharge son arbre
+quand la version change, ou au plus tard après CATEGORY_TREE_MAX_AGE.
+
+Les instances de l'arbre sont partagées: lecture seule.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'category_tree_version'
+PATH_SEPARATOR = ' > '
+
+
+def get_category_tree_max_age():
+    return getattr(settings, 'CATEGORY_TREE_MAX_AGE', 300)
+
+
+class CategoryTree:
+    def __init__(self, categories, version=None):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.categories = {category.id: category for category in categories}
+        self.by_name = {category.name: category for category in self.categories.values()}
+
+        # Sous-catégories actives, dans l'ordre d'affichage
+        self.children = {}
+        for category in sorted(self.categories.values(), key=lambda c: (c.order, c.name)):
+            if category.parent_id in self.categories and category.is_active:
+                self.children.setdefault(category.parent_id, []).append(category)
+
+        self.image_urls = {
+            category.id: category.image.url if category.image else None
+            for category in self.categories.values()
+        }
+
+        self.ancestor_ids = {}
+        for category_id in self.categories:
+            self.ancestor_ids[category_id] = self._walk_ancestors(category_id)
+
+        self.paths = {
+            category_id: PATH_SEPARATOR.join(
+                self.categories[ancestor_id].name
+                for ancestor_id in self.ancestor_ids[category_id] + [category_id]
+            )
+            for category_id in self.categories
+        }
+
+    def _walk_ancestors(self, category_id):
+        ancestors = []
+        seen = {category_id}
+        parent_id = self.categories[category_id].parent_id
+        # seen protège d'un cycle déjà présent en base
+        while parent_id in self.categories and parent_id not in seen:
+            ancestors.append(parent_id)
+            seen.add(parent_id)
+            parent_id = self.categories[parent_id].parent_id
+        return ancestors[::-1]
+
+    def get(self, category_id):
+        return self.categories.get(category_id)
+
+    def get_by_name(self, name):
+        return self.by_name.get((name or '').lower().strip())
+
+    def get_parent(self, category_id):
+        category = self.categories.get(category_id)
+        return self.categories.get(category.parent_id) if category else None
+
+    def get_ancestors(self, category_id):
+        """Ancêtres, de la racine vers le parent"""
+        return [self.categories[ancestor_id] for ancestor_id in self.ancestor_ids.get(category_id, [])]
+
+    def get_path(self, category_id):
+        return self.paths.get(category_id)
+
+    def get_image_url(self, category_id, request=None):
+        url = self.image_urls.get(category_id)
+        if url and request:
+            return request.build_absolute_uri(url)
+        return url
+
+    def get_active_subcategories(self, category_id):
+        return self.children.get(category_id, [])
+
+    def get_hierarchy(self, category_id, request=None):
+        """[{'id', 'name', 'image_url'}] de la racine jusqu'à la catégorie"""
+        if category_id not in self.categories:
+            return []
+        return [
+            {
+                'id': ancestor_id,
+                'name': self.categories[ancestor_id].name,
+                'image_url': self.get_image_url(ancestor_id, request),
+            }
+            for ancestor_id in self.ancestor_ids[category_id] + [category_id]
+        ]
+
+    def would_create_cycle(self, category_id, parent_id):
+        """True si rattacher category_id sous parent_id crée un cycle"""
+        if category_id is None or parent_id is None:
+            return False
+        return category_id == parent_id or category_id in self.ancestor_ids.get(parent_id, [])
+
+
+_tree = None
+_tree_lock = threading.Lock()
+
+
+def _get_version():
+    return cache.get(VERSION_KEY)
+
+
+def get_category_tree():
+    """
+    Arbre courant: une lecture de version en cache, rechargement (une
+    requête) si elle a changé ou si l'arbre est trop ancien
+    """
+    from .models import Category
+
+    global _tree
+    version = _get_version()
+    tree = _tree
+    if (
+        tree is None
+        or tree.version != version
+        or time.monotonic() - tree.loaded_at > get_category_tree_max_age()
+    ):
+        with _tree_lock:
+            tree = CategoryTree(Category.objects.all(), version=version)
+            _tree = tree
+    return tree
+
+
+def invalidate_category_tree():
+    """
+    Oublier l'arbre de ce process tout de suite et changer la version pour
+    les autres après commit
+    """
+    global _tree
+    _tree = None
+
+    def bump():
+        global _tree
+        _tree = None
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, time.time_ns(), None)
+
+    transaction.on_commit(bump)
@@ -0,0 +1,65 @@
+# post/counter_utils.py
+"""
+Compteurs dénormalisés Category.post_count et Tag.post_count.
+
+Tenus à jour par les signaux de post/signals.py (création, suppression,
+changement de catégorie, ajout / retrait de tags) avec des UPDATE en
+F-expression. Les écritures de masse (update(), bulk_create, SQL brut)
+n'émettent pas de signaux: reconcile_post_counts() recalcule tout.
+"""
+from collections import Counter
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Category, Post, Tag
+
+
+def adjust_category_count(category_id, delta):
+    if category_id and delta:
+        Category.objects.filter(id=category_id).update(post_count=F('post_count') + delta)
+
+
+def adjust_tag_counts(tag_ids, delta):
+    """delta appliqué une fois par occurrence de tag_id"""
+    for times, ids in _group_by_times(Counter(tag_ids)).items():
+        Tag.objects.filter(id__in=ids).update(post_count=F('post_count') + delta * times)
+
+
+def _group_by_times(counter):
+    grouped = {}
+    for tag_id, times in counter.items():
+        grouped.setdefault(times, []).append(tag_id)
+    return grouped
+
+
+def get_post_tag_ids(post_ids, tag_ids=None):
+    """tag_id de chaque ligne post <-> tag existante (avec répétitions)"""
+    rows = Post.tags.through.objects.filter(post_id__in=post_ids)
+    if tag_ids is not None:
+        rows = rows.filter(tag_id__in=tag_ids)
+    return list(rows.values_list('tag_id', flat=True))
+
+
+def reconcile_post_counts():
+    """
+    Recalculer les deux compteurs, un UPDATE par table.
+    Retourne (catégories corrigées, tags corrigés).
+    """
+    category_counts = Post.objects.filter(
+        category_id=OuterRef('id')
+    ).order_by().values('category_id').annotate(total=Count('id')).values('total')
+    tag_counts = Post.tags.through.objects.filter(
+        tag_id=OuterRef('id')
+    ).order_by().values('tag_id').annotate(total=Count('id')).values('total')
+
+    category_expected = Coalesce(Subquery(category_counts), Value(0))
+    tag_expected = Coalesce(Subquery(tag_counts), Value(0))
+
+    categories = Category.objects.annotate(expected=category_expected).exclude(
+        post_count=F('expected')
+    ).update(post_count=category_expected)
+    tags = Tag.objects.annotate(expected=tag_expected).exclude(
+        post_count=F('expected')
+    ).update(post_count=tag_expected)
+    return categories, tags
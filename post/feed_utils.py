@@ -0,0 +1,127 @@
+# post/feed_utils.py
+"""
+Pagination par curseur (keyset) de post_list_create: chaque page reprend
+après la dernière clé de tri vue, au lieu d'un OFFSET qui relit tout ce qui
+précède. Les totaux, coûteux sur un queryset annoté, ne sont calculés qu'à
+la demande et mis en cache par combinaison de filtres.
+"""
+import base64
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+POST_PAGE_SIZE = 20
+POST_PAGE_SIZE_MAX = 100
+
+# Clés de tri (champ, décroissant) par valeur de ?sort=, id en dernier pour
+# départager les égalités
+SORT_KEYS = {
+    'newest': [('created_at', True), ('id', True)],
+    'oldest': [('created_at', False), ('id', False)],
+    # Annotations lues sur PostScore (voir post_list_create)
+    'popular': [('popularity_score', True), ('created_at', True), ('id', True)],
+    'rated': [('bayesian_rating', True), ('created_at', True), ('id', True)],
+}
+
+DATETIME_FIELDS = {'created_at'}
+
+
+def get_total_cache_timeout():
+    """
+    Durée de vie (secondes) des totaux en mode curseur. 0 = désactivé.
+    """
+    return getattr(settings, 'POST_LIST_TOTAL_CACHE_TIMEOUT', 60)
+
+
+def get_sort_keys(sort_by):
+    return SORT_KEYS.get(sort_by, SORT_KEYS['newest'])
+
+
+def encode_cursor(post, sort_keys):
+    values = []
+    for field, _ in sort_keys:
+        value = getattr(post, field)
+        values.append(value.isoformat() if field in DATETIME_FIELDS else value)
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort_keys):
+    """Valeurs des clés de tri contenues dans le curseur (ValueError si invalide)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if not isinstance(values, list) or len(values) != len(sort_keys):
+        raise ValueError("Invalid cursor")
+
+    decoded = []
+    for (field, _), value in zip(sort_keys, values):
+        if field in DATETIME_FIELDS:
+            value = parse_datetime(value) if isinstance(value, str) else None
+            if value is None:
+                raise ValueError("Invalid cursor")
+        elif not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise ValueError("Invalid cursor")
+        decoded.append(value)
+    return decoded
+
+
+def keyset_filter(sort_keys, values):
+    """
+    Lignes strictement après `values` dans l'ordre de sort_keys:
+    (k1 < v1) OR (k1 = v1 AND k2 < v2) OR ...
+    """
+    condition = Q()
+    equal = Q()
+    for (field, descending), value in zip(sort_keys, values):
+        lookup = 'lt' if descending else 'gt'
+        condition |= equal & Q(**{f'{field}__{lookup}': value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+def get_post_cursor_page(queryset, sort_by, cursor=None, limit=POST_PAGE_SIZE):
+    """
+    Retourne (posts, next_cursor). queryset doit déjà porter les annotations
+    du tri demandé (rating_count, avg_rating).
+    """
+    sort_keys = get_sort_keys(sort_by)
+    queryset = queryset.order_by(*[
+        f'-{field}' if descending else field for field, descending in sort_keys
+    ])
+    if cursor:
+        queryset = queryset.filter(keyset_filter(sort_keys, decode_cursor(cursor, sort_keys)))
+
+    # Une ligne de plus pour savoir s'il reste une page
+    posts = list(queryset[:limit + 1])
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+    next_cursor = encode_cursor(posts[-1], sort_keys) if has_more else None
+    return posts, next_cursor
+
+
+def get_cached_total(queryset, filters):
+    """
+    Total pour une combinaison de filtres, mis en cache quelques secondes:
+    un COUNT par signature au lieu d'un COUNT par page.
+    """
+    timeout = get_total_cache_timeout()
+    if not timeout:
+        return queryset.count()
+
+    signature = hashlib.md5(
+        json.dumps(filters, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    cache_key = f"post_list_total_{signature}"
+    total = cache.get(cache_key)
+    if total is None:
+        total = queryset.count()
+        cache.set(cache_key, total, timeout)
+    return total
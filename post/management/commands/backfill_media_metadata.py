@@ -0,0 +1,65 @@
+# post/management/commands/backfill_media_metadata.py
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from comment_post.models import Comment
+from messaging.models import Message
+from post.media_utils import describe_file
+from post.models import PostFile, PostImage
+
+
+class Command(BaseCommand):
+    help = "Relève taille, type MIME, empreinte et dimensions des médias envoyés avant leur stockage en base"
+
+    def describe(self, field_file):
+        try:
+            return describe_file(field_file)
+        except (OSError, ValueError) as e:
+            self.stderr.write(f"{field_file.name}: {e}")
+            return None
+        finally:
+            field_file.close()
+
+    def handle(self, *args, **options):
+        total = 0
+
+        for image in PostImage.objects.filter(checksum='').exclude(image=''):
+            info = self.describe(image.image)
+            if info:
+                PostImage.objects.filter(id=image.id).update(
+                    file_size=info['size'],
+                    mime_type=info['mime_type'],
+                    checksum=info['checksum'],
+                    width=info.get('width'),
+                    height=info.get('height'),
+                )
+                total += 1
+
+        for post_file in PostFile.objects.filter(checksum='').exclude(file=''):
+            info = self.describe(post_file.file)
+            if info:
+                PostFile.objects.filter(id=post_file.id).update(
+                    file_size=info['size'],
+                    mime_type=info['mime_type'],
+                    checksum=info['checksum'],
+                )
+                total += 1
+
+        for model in (Message, Comment):
+            has_media = Q()
+            for field_name in model.MEDIA_FIELDS:
+                has_media |= ~Q(**{field_name: ''}) & Q(**{f'{field_name}__isnull': False})
+
+            for instance in model.objects.filter(has_media).only('id', 'media_metadata', *model.MEDIA_FIELDS):
+                metadata = dict(instance.media_metadata or {})
+                for field_name in model.MEDIA_FIELDS:
+                    field_file = getattr(instance, field_name)
+                    if field_file and field_name not in metadata:
+                        info = self.describe(field_file)
+                        if info:
+                            metadata[field_name] = info
+                if metadata != instance.media_metadata:
+                    model.objects.filter(id=instance.id).update(media_metadata=metadata)
+                    total += 1
+
+        self.stdout.write(self.style.SUCCESS(f"{total} média(s) renseigné(s)"))
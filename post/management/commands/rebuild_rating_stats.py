@@ -0,0 +1,26 @@
+# post/management/commands/rebuild_rating_stats.py
+from django.core.management.base import BaseCommand
+
+from post.models import Post
+from post.rating_utils import rebuild_rating_stats
+
+
+class Command(BaseCommand):
+    help = "Recalcule average_rating, total_ratings et l'histogramme des notes des posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--post',
+            type=int,
+            action='append',
+            help="ID de post à recalculer (répétable). Par défaut: tous."
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if options['post']:
+            posts = posts.filter(id__in=options['post'])
+
+        total = rebuild_rating_stats(posts)
+
+        self.stdout.write(self.style.SUCCESS(f"{total} post(s) recalculé(s)"))
@@ -0,0 +1,29 @@
+# post/management/commands/rebuild_timelines.py
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from post.timeline_utils import rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les fils d'accueil (TimelineEntry) à partir des abonnements"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            help="ID d'utilisateur dont le fil est à reconstruire (répétable). Par défaut: tous."
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(is_active=True)
+        if options['user']:
+            users = users.filter(id__in=options['user'])
+
+        total = 0
+        for user_id in users.values_list('id', flat=True).iterator():
+            rebuild_timeline(user_id)
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(f"{total} fil(s) reconstruit(s)"))
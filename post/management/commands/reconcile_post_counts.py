@@ -0,0 +1,15 @@
+# post/management/commands/reconcile_post_counts.py
+from django.core.management.base import BaseCommand
+
+from post.counter_utils import reconcile_post_counts
+
+
+class Command(BaseCommand):
+    help = "Recalcule Category.post_count et Tag.post_count (après des écritures de masse)"
+
+    def handle(self, *args, **options):
+        categories, tags = reconcile_post_counts()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{categories} catégorie(s) et {tags} tag(s) corrigé(s)"
+        ))
@@ -0,0 +1,22 @@
+# post/management/commands/refresh_post_scores.py
+from django.core.management.base import BaseCommand
+
+from post.score_utils import refresh_post_scores
+
+
+class Command(BaseCommand):
+    help = "Rafraîchit la table PostScore (à lancer périodiquement, ex: toutes les 5 minutes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help="Recalculer l'engagement depuis le début au lieu des seuls nouveaux événements"
+        )
+
+    def handle(self, *args, **options):
+        created, touched = refresh_post_scores(full=options['full'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{created} score(s) créé(s), engagement mis à jour pour {touched} post(s)"
+        ))
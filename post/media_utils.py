@@ -0,0 +1,286 @@
+# post/media_utils.py
+"""
+Envoi des médias (posts, messages).
+
+- serve_media_file: réponse avec requêtes partielles (Range -> 206), GET
+  conditionnel (ETag / Last-Modified -> 304) et délégation optionnelle de
+  l'envoi au serveur frontal (X-Accel-Redirect pour nginx, X-Sendfile pour
+  Apache / lighttpd) pour ne pas occuper un worker pendant le transfert.
+- describe_file / refresh_media_metadata: taille, type MIME, empreinte
+  SHA-256 et dimensions des images, relevées une fois à l'envoi et stockées
+  en base (plus de stat du fichier à chaque requête).
+- stream_zip: archives ZIP générées à la volée. L'archive n'est jamais
+  construite en entier; les médias déjà compressés (jpg, mp4, zip...) sont
+  stockés tels quels (ZIP_STORED): les recompresser coûte du CPU pour rien.
+
+Settings:
+- MEDIA_SENDFILE_BACKEND: None (Django envoie), 'x-accel-redirect' ou 'x-sendfile'
+- MEDIA_ACCEL_REDIRECT_PREFIX: location interne nginx qui pointe sur MEDIA_ROOT
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import zipfile
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.images import get_image_dimensions
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Formats déjà compressés
+STORED_EXTENSIONS = {
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'heic', 'avif',
+    'mp4', 'mov', 'm4v', 'webm', 'mkv', 'avi',
+    'mp3', 'm4a', 'aac', 'ogg', 'opus', 'flac',
+    'zip', 'gz', 'tgz', 'bz2', 'xz', '7z', 'rar',
+    'docx', 'xlsx', 'pptx', 'odt', 'ods', 'odp', 'epub', 'pdf',
+}
+
+
+def get_compress_type(filename):
+    extension = os.path.splitext(filename)[1].lstrip('.').lower()
+    return zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+class _StreamBuffer:
+    """
+    Sortie non "seekable" pour zipfile: il écrit alors des data descriptors
+    après chaque entrée au lieu de revenir corriger les en-têtes
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Générateur des octets d'une archive ZIP.
+    entries: itérable de (chemin sur disque, nom dans l'archive)
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for file_path, arcname in entries:
+            zinfo = zipfile.ZipInfo.from_file(file_path, arcname=arcname)
+            zinfo.compress_type = get_compress_type(arcname)
+            with open(file_path, 'rb') as source, archive.open(zinfo, 'w') as target:
+                for chunk in iter(lambda: source.read(chunk_size), b''):
+                    target.write(chunk)
+                    data = buffer.pop()
+                    if data:
+                        yield data
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+# ==================== MÉTADONNÉES ====================
+
+def has_new_upload(field_file):
+    """True si le champ porte un fichier pas encore enregistré (envoi en cours)"""
+    return bool(field_file) and not field_file._committed
+
+
+def describe_file(field_file):
+    """
+    {'size', 'mime_type', 'checksum'} (+ 'width', 'height' pour les images),
+    en une lecture du fichier par morceaux
+    """
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in field_file.chunks(STREAM_CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+
+    mime_type = (
+        mimetypes.guess_type(field_file.name)[0]
+        or getattr(field_file.file, 'content_type', None)
+        or 'application/octet-stream'
+    )
+    info = {'size': size, 'mime_type': mime_type, 'checksum': digest.hexdigest()}
+
+    if mime_type.startswith('image/'):
+        width, height = get_image_dimensions(field_file.file)
+        if width and height:
+            info['width'] = width
+            info['height'] = height
+    return info
+
+
+def refresh_media_metadata(instance, field_names, update_fields=None):
+    """
+    Tenir à jour instance.media_metadata ({champ: describe_file(...)}) pour
+    les modèles à plusieurs fichiers: relevé pour les fichiers envoyés dans
+    ce save(), retiré pour les champs vidés. Retourne update_fields, complété
+    de 'media_metadata' si besoin.
+    """
+    if update_fields is not None:
+        field_names = [field_name for field_name in field_names if field_name in update_fields]
+        if not field_names:
+            return update_fields
+
+    metadata = dict(instance.media_metadata or {})
+    for field_name in field_names:
+        field_file = getattr(instance, field_name)
+        if not field_file:
+            metadata.pop(field_name, None)
+        elif has_new_upload(field_file):
+            metadata[field_name] = describe_file(field_file)
+
+    if metadata != instance.media_metadata:
+        instance.media_metadata = metadata
+        if update_fields is not None and 'media_metadata' not in update_fields:
+            update_fields = list(update_fields) + ['media_metadata']
+    return update_fields
+
+
+def get_checksum_etag(checksum):
+    return f'"{checksum}"' if checksum else None
+
+
+# ==================== SERVICE DES FICHIERS ====================
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_sendfile_backend():
+    return getattr(settings, 'MEDIA_SENDFILE_BACKEND', None)
+
+
+def get_accel_redirect_prefix():
+    return getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(header, size):
+    """
+    (début, fin) inclus pour un en-tête "bytes=a-b", "bytes=a-" ou "bytes=-n".
+    None si l'en-tête est ignoré (plages multiples, syntaxe inconnue):
+    le fichier entier est alors renvoyé, comme le permet la RFC 9110.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffixe: les n derniers octets
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or (last and end < start):
+        raise RangeNotSatisfiable
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _iter_file_range(path, start, end, chunk_size=STREAM_CHUNK_SIZE):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = source.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_media_file(request, field_file, filename=None, content_type=None,
+                     etag=None, last_modified=None, as_attachment=False):
+    """
+    Réponse pour un FileField stocké localement.
+    etag / last_modified (datetime) peuvent venir des métadonnées en base;
+    à défaut, ils sont tirés de la taille et de la date du fichier.
+    """
+    if not field_file:
+        raise Http404("No file")
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        # Stockage distant (S3...): il gère lui-même Range et cache
+        return HttpResponseRedirect(field_file.url)
+    if not os.path.exists(path):
+        raise Http404("File not found")
+
+    stat = os.stat(path)
+    size = stat.st_size
+    last_modified = int(last_modified.timestamp()) if last_modified else int(stat.st_mtime)
+    etag = etag or f'"{size:x}-{stat.st_mtime_ns:x}"'
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    filename = filename or os.path.basename(field_file.name)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    backend = get_sendfile_backend()
+    if backend in ('x-accel-redirect', 'x-sendfile'):
+        # Le serveur frontal envoie le fichier et gère lui-même Range
+        response = HttpResponse(content_type=content_type)
+        if backend == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = get_accel_redirect_prefix() + quote(field_file.name)
+        else:
+            response['X-Sendfile'] = path
+    else:
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE')
+        if range_header and _if_range_matches(request, etag, last_modified):
+            try:
+                byte_range = parse_range_header(range_header, size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        if byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+            response['Content-Length'] = size
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _iter_file_range(path, start, end),
+                status=206,
+                content_type=content_type
+            )
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    return response
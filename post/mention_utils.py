@@ -0,0 +1,88 @@
+# post/mention_utils.py
+"""
+Extraction des @mentions et #hashtags du contenu des posts et commentaires.
+
+L'extraction ne tourne que si le contenu a changé depuis le chargement
+(ContentTrackingMixin), résout tous les tags en deux requêtes
+(bulk_create ignore_conflicts + filter name__in) et n'écrit dans les
+tables M2M que la différence avec l'existant.
+"""
+import re
+
+from django.contrib.auth import get_user_model
+
+MENTION_PATTERN = re.compile(r'@(\w+)')
+HASHTAG_PATTERN = re.compile(r'#(\w+)')
+TAG_NAME_MAX_LENGTH = 50
+
+
+def extract_usernames(text):
+    """Usernames mentionnés, sans doublons, dans l'ordre d'apparition"""
+    return list(dict.fromkeys(MENTION_PATTERN.findall(text or '')))
+
+
+def extract_tag_names(text):
+    """Noms de tags (minuscules), sans doublons, dans l'ordre d'apparition"""
+    return [
+        name for name in dict.fromkeys(tag.lower() for tag in HASHTAG_PATTERN.findall(text or ''))
+        if len(name) <= TAG_NAME_MAX_LENGTH
+    ]
+
+
+def resolve_user_ids(usernames):
+    if not usernames:
+        return []
+    return list(get_user_model().objects.filter(username__in=usernames).values_list('id', flat=True))
+
+
+def resolve_tag_ids(names):
+    """IDs des tags, créés au besoin: un INSERT groupé + un SELECT"""
+    from .models import Tag
+
+    if not names:
+        return []
+    Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+    return list(Tag.objects.filter(name__in=names).values_list('id', flat=True))
+
+
+def sync_m2m(manager, ids, is_new=False):
+    """
+    Aligner une relation M2M sur ids en n'écrivant que la différence.
+    Un objet neuf n'a encore aucune ligne: pas de lecture préalable.
+    """
+    if is_new:
+        if ids:
+            manager.add(*ids)
+        return
+    current = set(manager.values_list('id', flat=True))
+    wanted = set(ids)
+    if wanted - current:
+        manager.add(*(wanted - current))
+    if current - wanted:
+        manager.remove(*(current - wanted))
+
+
+class ContentTrackingMixin:
+    """
+    Garde le `content` tel que chargé depuis la base pour savoir, au save(),
+    s'il faut relancer l'extraction des mentions / tags.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # None si le champ est différé (only/defer): contenu inconnu
+        instance._loaded_content = instance.__dict__.get('content')
+        return instance
+
+    def content_has_changed(self, is_new, update_fields=None):
+        if is_new:
+            return True
+        if update_fields is not None and 'content' not in update_fields:
+            return False
+        if 'content' not in self.__dict__:
+            return False  # Champ différé jamais relu ni modifié
+        return getattr(self, '_loaded_content', None) != self.content
+
+    def mark_content_clean(self):
+        self._loaded_content = self.__dict__.get('content')
@@ -1,8 +1,14 @@
 from django.db import models
 from django.conf import settings 
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.contrib.auth import get_user_model
-import re
+from .mention_utils import (
+    ContentTrackingMixin, extract_tag_names, extract_usernames,
+    resolve_tag_ids, resolve_user_ids, sync_m2m,
+)
+from .category_utils import get_category_tree
+from .media_utils import describe_file, has_new_upload
 
 #here's the model for categories on posts
 class Category(models.Model):           
@@ -20,6 +26,9 @@ class Category(models.Model):
     # Champ pour savoir si c'est une catégorie active
     is_active = models.BooleanField(default=True)
     
+    # Nombre de posts, tenu à jour par signals.py (reconcile_post_counts)
+    post_count = models.IntegerField(default=0)
+    
     # Métadonnées
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True,null=True)
@@ -30,7 +39,10 @@ class Category(models.Model):
         return self.name
     
     def get_full_path(self):
-        """Retourne le chemin complet de la catégorie"""
+        """Retourne le chemin complet de la catégorie (arbre en mémoire)"""
+        path = get_category_tree().get_path(self.id)
+        if path is not None:
+            return path
         if self.parent:
             return f"{self.parent.get_full_path()} > {self.name}"
         return self.name
@@ -43,29 +55,21 @@ class Category(models.Model):
     
     def has_subcategories(self):
         """Vérifie si la catégorie a des sous-catégories"""
-        return self.subcategories.filter(is_active=True).exists()
+        return bool(get_category_tree().get_active_subcategories(self.id))
     
     def get_active_subcategories(self):
         """Retourne les sous-catégories actives"""
-        return self.subcategories.filter(is_active=True).order_by('order', 'name')
+        return get_category_tree().get_active_subcategories(self.id)
     
     def save(self, *args, **kwargs):
         # S'assurer que le nom est en minuscules pour l'unicité
         self.name = self.name.lower().strip()
         
-        # Vérifier qu'une catégorie n'est pas sa propre parente
-        if self.parent and self.parent == self:
+        # Vérifier qu'une catégorie n'est pas sa propre parente, ni
+        # rattachée sous l'une de ses descendantes (cycle)
+        if get_category_tree().would_create_cycle(self.id, self.parent_id):
             self.parent = None
         
-        # Vérifier les cycles dans l'arborescence
-        if self.parent:
-            current = self.parent
-            while current:
-                if current == self:
-                    self.parent = None
-                    break
-                current = current.parent
-        
         super().save(*args, **kwargs)
     
     class Meta:
@@ -76,16 +80,26 @@ class Category(models.Model):
 # Modèle pour les tags
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True, blank=True, null=True)
+    # Nombre de posts, tenu à jour par signals.py (reconcile_post_counts)
+    post_count = models.IntegerField(default=0, db_index=True)
+    
     def __str__(self):
         return self.name
     
 #here's the model for creatingosts
-class Post(models.Model):
+class Post(ContentTrackingMixin, models.Model):
     title = models.CharField(max_length=200)
     content = models.TextField()
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     average_rating = models.FloatField(default=0.0)
     total_ratings = models.IntegerField(default=0)
+    # Somme et histogramme des notes, tenus à jour par rating_utils
+    ratings_sum = models.IntegerField(default=0)
+    rating_1_count = models.IntegerField(default=0)
+    rating_2_count = models.IntegerField(default=0)
+    rating_3_count = models.IntegerField(default=0)
+    rating_4_count = models.IntegerField(default=0)
+    rating_5_count = models.IntegerField(default=0)
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
     link = models.URLField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -96,28 +110,28 @@ class Post(models.Model):
     # ✅ AJOUTEZ CETTE RELATION MANQUANTE
     tags = models.ManyToManyField('Tag', related_name='posts', blank=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Catégorie chargée, pour déplacer le compteur au changement (signals.py)
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        return instance
+
     def save(self, *args, **kwargs):
+        is_new = self._state.adding
         super().save(*args, **kwargs)
-        self.extract_mentions_and_tags()
+        # Pas d'extraction si le contenu n'a pas bougé (ex: save() après un vote)
+        if self.content_has_changed(is_new, kwargs.get('update_fields')):
+            self.extract_mentions_and_tags(is_new)
+            self.mark_content_clean()
 
-    def extract_mentions_and_tags(self):
-        mention_pattern = r'@(\w+)'
-        mentioned_usernames = re.findall(mention_pattern, self.content)
+    def extract_mentions_and_tags(self, is_new=False):
+        sync_m2m(self.mentions, resolve_user_ids(extract_usernames(self.content)), is_new)
+        sync_m2m(self.tags, resolve_tag_ids(extract_tag_names(self.content)), is_new)
     
-        User = get_user_model()
-        users = User.objects.filter(username__in=mentioned_usernames)
-        self.mentions.set(users)
-
-        # ✅ AJOUTEZ L'EXTRACTION DES TAGS SI BESOIN
-        tag_pattern = r'#(\w+)'
-        tag_names = re.findall(tag_pattern, self.content)
-        
-        tags = []
-        for tag_name in tag_names:
-            tag, created = Tag.objects.get_or_create(name=tag_name.lower())
-            tags.append(tag)
-        
-        self.tags.set(tags)
+    def get_rating_distribution(self):
+        """Distribution des notes (1-5 étoiles), lue sur les colonnes stockées"""
+        return {stars: getattr(self, f'rating_{stars}_count') for stars in range(5, 0, -1)}
     
     def __str__(self):
         return f"{self.title} by {self.user.username} {self.id} "
@@ -128,9 +142,26 @@ class PostImage(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     order = models.IntegerField(default=0)
     
+    # Métadonnées relevées à l'envoi (media_utils.describe_file)
+    file_size = models.BigIntegerField(default=0)
+    mime_type = models.CharField(max_length=100, blank=True)
+    checksum = models.CharField(max_length=64, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    
     class Meta:
         ordering = ['order', 'uploaded_at']
     
+    def save(self, *args, **kwargs):
+        if has_new_upload(self.image):
+            info = describe_file(self.image)
+            self.file_size = info['size']
+            self.mime_type = info['mime_type']
+            self.checksum = info['checksum']
+            self.width = info.get('width')
+            self.height = info.get('height')
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"Image for Post #{self.post.id}"
 
@@ -149,14 +180,64 @@ class PostFile(models.Model):
     file_type = models.CharField(max_length=20, choices=FILE_TYPE_CHOICES, default='other')
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # Métadonnées relevées à l'envoi (media_utils.describe_file)
+    file_size = models.BigIntegerField(default=0)
+    mime_type = models.CharField(max_length=100, blank=True)
+    checksum = models.CharField(max_length=64, blank=True)
+    
     class Meta:
         ordering = ['-created_at']
     
     def save(self, *args, **kwargs):
         if not self.name and self.file:
             self.name = self.file.name
+        if has_new_upload(self.file):
+            info = describe_file(self.file)
+            self.file_size = info['size']
+            self.mime_type = info['mime_type']
+            self.checksum = info['checksum']
         super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.get_file_type_display()}: {self.name or self.file.name}"
 
+
+
+# Fil d'accueil ("posts des gens que je suis"), alimenté à l'écriture
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey('Post', on_delete=models.CASCADE, related_name='timeline_entries')
+    # Copie de Post.created_at pour paginer sans jointure
+    post_created_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ['user', 'post']
+        indexes = [
+            models.Index(fields=['user', '-post_created_at', '-post']),
+        ]
+    
+    def __str__(self):
+        return f"Post #{self.post_id} in {self.user_id}'s timeline"
+
+
+# Scores de classement précalculés (score_utils.refresh_post_scores)
+class PostScore(models.Model):
+    post = models.OneToOneField('Post', on_delete=models.CASCADE, primary_key=True, related_name='score')
+    rating_count = models.IntegerField(default=0)
+    # Moyenne bayésienne: tirée vers la moyenne globale tant qu'il y a peu de notes
+    bayesian_rating = models.FloatField(default=0.0)
+    # Engagement récent (notes + commentaires) à décroissance exponentielle,
+    # exprimé par rapport à une époque fixe pour ne jamais avoir à le décroître;
+    # en log2 (score_utils), NULL tant qu'il n'y a aucun événement
+    engagement = models.FloatField(null=True, blank=True)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-engagement']),
+            models.Index(fields=['-bayesian_rating']),
+            models.Index(fields=['refreshed_at']),
+        ]
+    
+    def __str__(self):
+        return f"Scores of post #{self.post_id}"
@@ -0,0 +1,120 @@
+# post/rating_utils.py
+"""
+Agrégats des notes d'un post (average_rating, total_ratings, ratings_sum,
+rating_<n>_count) mis à jour par deltas dans un seul UPDATE, sans relire
+toutes les notes du post.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+
+from feedback_post.models import Rating
+from .models import Post
+
+
+def histogram_field(stars):
+    return f'rating_{int(stars)}_count'
+
+
+def apply_rating_change(post_id, added=None, removed=None):
+    """
+    Répercuter une note ajoutée (added), retirée (removed) ou modifiée
+    (les deux) sur les agrégats du post
+    """
+    if added == removed:
+        return
+
+    count_delta = (added is not None) - (removed is not None)
+    sum_delta = (added or 0) - (removed or 0)
+
+    updates = {}
+    if added is not None:
+        updates[histogram_field(added)] = F(histogram_field(added)) + 1
+    if removed is not None:
+        updates[histogram_field(removed)] = F(histogram_field(removed)) - 1
+    if count_delta:
+        updates['total_ratings'] = F('total_ratings') + count_delta
+    updates['ratings_sum'] = F('ratings_sum') + sum_delta
+
+    # Les expressions d'un UPDATE lisent les valeurs d'avant la mise à jour
+    updates['average_rating'] = Case(
+        When(
+            Q(total_ratings__gt=-count_delta),
+            then=Cast(F('ratings_sum') + sum_delta, FloatField()) /
+                 Cast(F('total_ratings') + count_delta, FloatField())
+        ),
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+
+    Post.objects.filter(id=post_id).update(**updates)
+
+
+def set_rating(post, user, stars):
+    """
+    Créer ou modifier la note de user sur post.
+    Retourne (rating, created).
+    """
+    with transaction.atomic():
+        rating = Rating.objects.select_for_update().filter(post=post, user=user).first()
+        if rating is None:
+            try:
+                with transaction.atomic():
+                    rating = Rating.objects.create(post=post, user=user, stars=stars)
+            except IntegrityError:
+                # Note créée entre-temps par une requête concurrente
+                rating = Rating.objects.select_for_update().get(post=post, user=user)
+            else:
+                apply_rating_change(post.id, added=stars)
+                return rating, True
+
+        previous = rating.stars
+        if previous != stars:
+            rating.stars = stars
+            rating.save(update_fields=['stars'])
+            apply_rating_change(post.id, added=stars, removed=previous)
+        return rating, False
+
+
+def remove_rating(post, user):
+    """Supprimer la note de user sur post. Retourne la note supprimée ou None."""
+    with transaction.atomic():
+        rating = Rating.objects.select_for_update().filter(post=post, user=user).first()
+        if rating is None:
+            return None
+        rating.delete()
+        apply_rating_change(post.id, removed=rating.stars)
+        return rating
+
+
+def rebuild_rating_stats(posts=None):
+    """
+    Recalculer les agrégats à partir des notes (reprise des données
+    existantes, notes supprimées en cascade). Retourne le nombre de posts.
+    """
+    posts = Post.objects.all() if posts is None else posts
+    stats = posts.annotate(
+        calc_count=Count('ratings'),
+        calc_sum=Sum('ratings__stars'),
+        calc_avg=Avg('ratings__stars'),
+        **{
+            f'calc_{stars}': Count('ratings', filter=Q(ratings__stars=stars))
+            for stars in range(1, 6)
+        }
+    ).only('id')
+
+    to_update = []
+    for post in stats:
+        post.total_ratings = post.calc_count
+        post.ratings_sum = post.calc_sum or 0
+        post.average_rating = post.calc_avg or 0.0
+        for stars in range(1, 6):
+            setattr(post, histogram_field(stars), getattr(post, f'calc_{stars}'))
+        to_update.append(post)
+
+    Post.objects.bulk_update(
+        to_update,
+        ['total_ratings', 'ratings_sum', 'average_rating'] + [histogram_field(s) for s in range(1, 6)],
+        batch_size=500
+    )
+    return len(to_update)
@@ -0,0 +1,120 @@
+# post/score_utils.py
+"""
+Table PostScore: scores de classement des posts, rafraîchis par un job
+périodique (commande refresh_post_scores) au lieu d'être agrégés sur
+Post x Rating à chaque requête.
+
+- engagement: log2 de la somme des événements (notes, commentaires)
+  pondérés par 2^((t - SCORE_EPOCH) / demi-vie), NULL sans événement. Le
+  classement est le même que celui de l'engagement décroissant à l'instant
+  présent, et un nouvel événement s'ajoute sans retoucher les autres lignes:
+  le rafraîchissement ne traite que les événements depuis le passage
+  précédent. Stocké en log (somme par log-sum-exp) car le poids lui-même
+  croît sans borne: 2^(t / demi-vie) déborde un float en quelques années,
+  en quelques semaines pour une demi-vie courte.
+- bayesian_rating: (C * moyenne globale + somme des notes) / (C + nombre de notes),
+  lu sur les agrégats stockés de Post.
+
+Settings:
+- POST_SCORE_HALF_LIFE_HOURS: demi-vie de l'engagement
+- POST_SCORE_BAYESIAN_PRIOR: poids C de la moyenne globale
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import FloatField, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from comment_post.models import Comment
+from feedback_post.models import Rating
+from .models import Post, PostScore
+
+SCORE_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+RATING_WEIGHT = 1.0
+COMMENT_WEIGHT = 1.0
+
+
+def get_half_life_hours():
+    return getattr(settings, 'POST_SCORE_HALF_LIFE_HOURS', 72)
+
+
+def get_bayesian_prior():
+    return getattr(settings, 'POST_SCORE_BAYESIAN_PRIOR', 5)
+
+
+def event_log_weight(created_at, weight=1.0):
+    """log2 du poids d'un événement: log2(weight) + heures depuis l'époque / demi-vie"""
+    hours = (created_at - SCORE_EPOCH).total_seconds() / 3600
+    return math.log2(weight) + hours / get_half_life_hours()
+
+
+def log2_add(a, b):
+    """log2(2^a + 2^b) sans calculer 2^a ni 2^b (None: aucun événement)"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def refresh_post_scores(full=False):
+    """
+    Rafraîchir PostScore. Par défaut incrémental: seuls les événements
+    postérieurs au passage précédent sont ajoutés à l'engagement.
+    Retourne (nouvelles lignes, posts dont l'engagement a changé).
+    """
+    started = timezone.now()
+    since = None if full else PostScore.objects.aggregate(last=Max('refreshed_at'))['last']
+
+    # Posts créés depuis le dernier passage
+    missing_ids = list(Post.objects.filter(score__isnull=True).values_list('id', flat=True))
+    PostScore.objects.bulk_create(
+        [PostScore(post_id=post_id, refreshed_at=started) for post_id in missing_ids],
+        batch_size=1000,
+        ignore_conflicts=True
+    )
+
+    # Événements de la fenêtre [since, started[ (chaque événement compté une fois)
+    ratings = Rating.objects.filter(created_at__lt=started)
+    comments = Comment.objects.filter(created_at__lt=started, is_hidden=False, is_spam=False)
+    if since is not None:
+        ratings = ratings.filter(created_at__gte=since)
+        comments = comments.filter(created_at__gte=since)
+
+    increments = {}
+    for post_id, created_at in ratings.values_list('post_id', 'created_at').iterator():
+        increments[post_id] = log2_add(increments.get(post_id), event_log_weight(created_at, RATING_WEIGHT))
+    for post_id, created_at in comments.values_list('post_id', 'created_at').iterator():
+        increments[post_id] = log2_add(increments.get(post_id), event_log_weight(created_at, COMMENT_WEIGHT))
+
+    with transaction.atomic():
+        if since is None:
+            PostScore.objects.update(engagement=None)
+        post_ids = list(increments)
+        for start in range(0, len(post_ids), 1000):
+            scores = list(
+                PostScore.objects.select_for_update().filter(post_id__in=post_ids[start:start + 1000])
+            )
+            for score in scores:
+                score.engagement = log2_add(score.engagement, increments[score.post_id])
+            PostScore.objects.bulk_update(scores, ['engagement'])
+
+        # Moyenne bayésienne de toutes les lignes en un seul UPDATE
+        totals = Post.objects.aggregate(ratings_sum=Sum('ratings_sum'), ratings_count=Sum('total_ratings'))
+        global_mean = (totals['ratings_sum'] or 0) / totals['ratings_count'] if totals['ratings_count'] else 0.0
+        prior = max(get_bayesian_prior(), 1)
+
+        post = Post.objects.filter(id=OuterRef('post_id'))
+        ratings_sum = Cast(Subquery(post.values('ratings_sum')[:1]), FloatField())
+        ratings_count = Subquery(post.values('total_ratings')[:1])
+        PostScore.objects.update(
+            rating_count=ratings_count,
+            bayesian_rating=(ratings_sum + prior * global_mean) / (Cast(ratings_count, FloatField()) + prior),
+            refreshed_at=started
+        )
+
+    return len(missing_ids), len(increments)
@@ -1,13 +1,34 @@
 # In serializers.py - Remove the duplicate RatingSerializer
 from rest_framework import serializers
 from .models import Post, Category, Tag, PostImage, PostFile
+from .category_utils import get_category_tree
 from feedback_post.models import Rating
 from django.contrib.auth import get_user_model
+from django.db.models import Count
 import base64
 from django.core.files.base import ContentFile
 
 User = get_user_model()
 
+
+def get_context_category_tree(context):
+    """Arbre des catégories, lu une fois par sérialisation"""
+    if 'category_tree' not in context:
+        context['category_tree'] = get_category_tree()
+    return context['category_tree']
+
+
+def get_context_post_counts(context):
+    """
+    post_count à jour de toutes les catégories, lus une fois par
+    sérialisation: les instances de l'arbre gardent ceux de leur chargement
+    (les compteurs changent par update(), sans recharger l'arbre)
+    """
+    if 'category_post_counts' not in context:
+        context['category_post_counts'] = dict(Category.objects.values_list('id', 'post_count'))
+    return context['category_post_counts']
+
+
 class Base64ImageField(serializers.ImageField):
     """
     Custom field pour gérer les images en base64
@@ -301,33 +322,9 @@ class PostSerializer(serializers.ModelSerializer):
     
     def get_category_hierarchy(self, obj):
         """Retourne la hiérarchie complète de la catégorie"""
-        def get_hierarchy(category):
-            if not category:
-                return []
-            
-            hierarchy = []
-            current = category
-            
-            while current:
-                hierarchy.insert(0, {
-                    'id': current.id,
-                    'name': current.name,
-                    'image_url': self.get_category_image_url(current)
-                })
-                current = current.parent
-            
-            return hierarchy
-        
-        return get_hierarchy(obj.category)
-    
-    def get_category_image_url(self, category):
-        """Helper pour obtenir l'URL de l'image d'une catégorie"""
-        if category and category.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(category.image.url)
-            return category.image.url
-        return None
+        return get_context_category_tree(self.context).get_hierarchy(
+            obj.category_id, self.context.get('request')
+        )
        # ✅ AJOUTEZ CETTE MÉTHODE
     def get_comments_count(self, obj):
         """Retourne le nombre de commentaires pour ce post"""
@@ -341,28 +338,54 @@ class PostDetailSerializer(PostSerializer):
         fields = PostSerializer.Meta.fields + ['ratings', 'rating_distribution', 'updated_at']
     
     def get_rating_distribution(self, obj):
-        """Calculer la distribution des notes (1-5 étoiles)"""
-        from django.db.models import Count
-        
-        # Récupérer les ratings de ce post
-        ratings_qs = obj.ratings.all() if hasattr(obj, 'ratings') else Rating.objects.filter(post=obj)
-        
-        # Compter les ratings par nombre d'étoiles
-        distribution = ratings_qs.values('stars').annotate(
-            count=Count('stars')
-        ).order_by('stars')
-        
-        # Initialiser le dictionnaire
-        result = {5: 0, 4: 0, 3: 0, 2: 0, 1: 0}
-        
-        # Remplir avec les valeurs réelles
-        for item in distribution:
-            stars = item['stars']
-            count = item['count']
-            if 1 <= stars <= 5:
-                result[stars] = count
-        
-        return result
+        """Distribution des notes (1-5 étoiles), histogramme stocké sur le post"""
+        return obj.get_rating_distribution()
+
+class PostListPageSerializer(serializers.ListSerializer):
+    """
+    Prépare pour toute la page, une requête chacune, les données par post
+    lues par PostListSerializer. Une vue peut aussi fournir ces maps déjà
+    calculées dans le contexte:
+    - user_ratings: {post_id: note de l'utilisateur courant}
+    - comments_counts: {post_id: nombre de commentaires}
+    - post_files: {post_id: [PostFile]}
+    """
+
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        post_ids = [post.id for post in posts]
+        request = self.context.get('request')
+
+        if 'user_ratings' not in self.context and request and request.user.is_authenticated:
+            self.context['user_ratings'] = {
+                rating.post_id: rating
+                for rating in Rating.objects.filter(
+                    post_id__in=post_ids, user_id=request.user.id
+                ).only('id', 'post_id', 'stars', 'created_at')
+            }
+
+        if 'comments_counts' not in self.context:
+            if all(hasattr(post, 'comments_count_annotated') for post in posts):
+                self.context['comments_counts'] = {
+                    post.id: post.comments_count_annotated for post in posts
+                }
+            else:
+                self.context['comments_counts'] = dict(
+                    Post.objects.filter(id__in=post_ids).annotate(
+                        comments_total=Count('post_comments')
+                    ).values_list('id', 'comments_total')
+                )
+
+        if 'post_files' not in self.context and not all(
+            'post_files' in getattr(post, '_prefetched_objects_cache', {}) for post in posts
+        ):
+            post_files = {}
+            for post_file in PostFile.objects.filter(post_id__in=post_ids):
+                post_files.setdefault(post_file.post_id, []).append(post_file)
+            self.context['post_files'] = post_files
+
+        return super().to_representation(posts)
+
 
 # Serializer simplifié pour la liste des posts
 # Dans PostListSerializer, ajoutez ces champs :
@@ -428,6 +451,14 @@ class PostListSerializer(serializers.ModelSerializer):
             # Dates et tags
             'created_at', 'tags'
         ]
+        list_serializer_class = PostListPageSerializer
+    
+    def _get_post_files(self, obj):
+        """Fichiers du post: map de la page, sinon prefetch / requête"""
+        post_files = self.context.get('post_files')
+        if post_files is not None:
+            return post_files.get(obj.id, [])
+        return list(obj.post_files.all())
     
     def get_user_profile_image(self, obj):
         if hasattr(obj.user, 'profile') and obj.user.profile.image:
@@ -455,10 +486,14 @@ class PostListSerializer(serializers.ModelSerializer):
         return False
     def get_comments_count(self, obj):
         """Retourne le nombre de commentaires pour ce post"""
+        comments_counts = self.context.get('comments_counts')
+        if comments_counts is not None:
+            return comments_counts.get(obj.id, 0)
+        if hasattr(obj, 'comments_count_annotated'):
+            return obj.comments_count_annotated
         # Compte tous les commentaires du post
         return obj.post_comments.count()
     
-        return 0
     def get_user_can_delete(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
@@ -467,36 +502,19 @@ class PostListSerializer(serializers.ModelSerializer):
     
     def get_category_details(self, obj):
         if obj.category:
-            return CategorySerializer(obj.category, context=self.context).data
+            # Une sérialisation par catégorie pour toute la page
+            category_details = self.context.setdefault('category_details', {})
+            if obj.category_id not in category_details:
+                category_details[obj.category_id] = CategorySerializer(
+                    obj.category, context=self.context
+                ).data
+            return category_details[obj.category_id]
         return None
     
     def get_category_hierarchy(self, obj):
-        def get_hierarchy(category):
-            if not category:
-                return []
-            
-            hierarchy = []
-            current = category
-            
-            while current:
-                hierarchy.insert(0, {
-                    'id': current.id,
-                    'name': current.name,
-                    'image_url': self.get_category_image_url(current)
-                })
-                current = current.parent
-            
-            return hierarchy
-        
-        return get_hierarchy(obj.category)
-    
-    def get_category_image_url(self, category):
-        if category and category.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(category.image.url)
-            return category.image.url
-        return None
+        return get_context_category_tree(self.context).get_hierarchy(
+            obj.category_id, self.context.get('request')
+        )
     
     def get_calculated_rating(self, obj):
         if hasattr(obj, 'calculated_avg_rating'):
@@ -524,15 +542,18 @@ class PostListSerializer(serializers.ModelSerializer):
     def get_user_rating(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            try:
-                rating = Rating.objects.get(post=obj, user=request.user)
-                return {
-                    'id': rating.id,
-                    'stars': rating.stars,
-                    'created_at': rating.created_at
-                }
-            except Rating.DoesNotExist:
+            user_ratings = self.context.get('user_ratings')
+            if user_ratings is not None:
+                rating = user_ratings.get(obj.id)
+            else:
+                rating = Rating.objects.filter(post=obj, user=request.user).first()
+            if rating is None:
                 return None
+            return {
+                'id': rating.id,
+                'stars': rating.stars,
+                'created_at': rating.created_at
+            }
         return None
     
     def get_image_url(self, obj):
@@ -544,8 +565,8 @@ class PostListSerializer(serializers.ModelSerializer):
         return None
     
     def get_files(self, obj):
-        post_files = obj.post_files.all()
-        if post_files.exists():
+        post_files = self._get_post_files(obj)
+        if post_files:
             request = self.context.get('request')
             files_data = []
             for file in post_files[:3]:
@@ -705,12 +726,12 @@ class CategorySerializer(serializers.ModelSerializer):
         required=False, 
         allow_null=True
     )
-    parent_name = serializers.CharField(source='parent.name', read_only=True)
+    parent_name = serializers.SerializerMethodField()
     parent_details = serializers.SerializerMethodField()
     subcategories = serializers.SerializerMethodField()
-    has_subcategories = serializers.BooleanField(read_only=True)
-    full_path = serializers.CharField(read_only=True)
-    posts_count = serializers.IntegerField(read_only=True)
+    has_subcategories = serializers.SerializerMethodField()
+    full_path = serializers.SerializerMethodField()
+    posts_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Category
@@ -731,27 +752,42 @@ class CategorySerializer(serializers.ModelSerializer):
             return obj.image.url
         return None
     
+    def get_parent_name(self, obj):
+        parent = get_context_category_tree(self.context).get_parent(obj.id)
+        return parent.name if parent else None
+    
     def get_parent_details(self, obj):
-        if obj.parent:
+        tree = get_context_category_tree(self.context)
+        parent = tree.get_parent(obj.id)
+        if parent:
             return {
-                'id': obj.parent.id,
-                'name': obj.parent.name,
-                'image_url': self.get_image_url(obj.parent)
+                'id': parent.id,
+                'name': parent.name,
+                'image_url': tree.get_image_url(parent.id, self.context.get('request'))
             }
         return None
     
     def get_subcategories(self, obj):
-        # Récupérer uniquement les sous-catégories actives
-        subcategories = obj.subcategories.filter(is_active=True).order_by('order', 'name')
+        # Sous-catégories actives, lues dans l'arbre en mémoire
+        subcategories = get_context_category_tree(self.context).get_active_subcategories(obj.id)
         serializer = CategorySerializer(subcategories, many=True, context=self.context)
         return serializer.data
+    
+    def get_has_subcategories(self, obj):
+        return bool(get_context_category_tree(self.context).get_active_subcategories(obj.id))
+    
+    def get_full_path(self, obj):
+        return get_context_category_tree(self.context).get_path(obj.id) or obj.name
+    
+    def get_posts_count(self, obj):
+        return get_context_post_counts(self.context).get(obj.id, obj.post_count)
 
 # Serializer simplifié pour les listes
 class CategoryListSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
-    parent_name = serializers.CharField(source='parent.name', read_only=True)
-    has_subcategories = serializers.BooleanField(read_only=True)
-    posts_count = serializers.IntegerField(read_only=True)
+    parent_name = serializers.SerializerMethodField()
+    has_subcategories = serializers.SerializerMethodField()
+    posts_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Category
@@ -768,6 +804,16 @@ class CategoryListSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.image.url)
             return obj.image.url
         return None
+    
+    def get_parent_name(self, obj):
+        parent = get_context_category_tree(self.context).get_parent(obj.id)
+        return parent.name if parent else None
+    
+    def get_has_subcategories(self, obj):
+        return bool(get_context_category_tree(self.context).get_active_subcategories(obj.id))
+    
+    def get_posts_count(self, obj):
+        return get_context_post_counts(self.context).get(obj.id, obj.post_count)
 
 # Serializer pour la création/mise à jour avec image base64
 class CategoryCreateUpdateSerializer(serializers.ModelSerializer):
@@ -0,0 +1,105 @@
+# post/signals.py
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from app.models import Profile
+from .models import Category, Post
+from . import category_utils, counter_utils, timeline_utils
+
+
+@receiver(post_save, sender=Post)
+def update_category_post_count(sender, instance, created, **kwargs):
+    """Category.post_count: +1 à la création, déplacé si la catégorie change"""
+    if created:
+        counter_utils.adjust_category_count(instance.category_id, 1)
+    else:
+        loaded_category_id = getattr(instance, '_loaded_category_id', None)
+        if loaded_category_id and loaded_category_id != instance.category_id:
+            counter_utils.adjust_category_count(loaded_category_id, -1)
+            counter_utils.adjust_category_count(instance.category_id, 1)
+    instance._loaded_category_id = instance.category_id
+
+
+@receiver(pre_delete, sender=Post)
+def release_post_counts(sender, instance, **kwargs):
+    """
+    Lu en base avant la suppression (même transaction): l'instance peut
+    être périmée et les lignes post <-> tag partent en cascade, sans m2m_changed
+    """
+    category_id = Post.objects.filter(id=instance.id).values_list('category_id', flat=True).first()
+    counter_utils.adjust_category_count(category_id, -1)
+    counter_utils.adjust_tag_counts(counter_utils.get_post_tag_ids([instance.id]), -1)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def update_tag_post_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Tag.post_count sur post.tags.add/remove/clear (et tag.posts.*).
+    pk_set de post_add ne contient que les lignes réellement créées;
+    pour remove / clear, les lignes existantes sont relevées avant.
+    """
+    if action in ('pre_remove', 'pre_clear'):
+        if reverse:
+            post_ids = list(pk_set) if pk_set is not None else None
+            rows = Post.tags.through.objects.filter(tag_id=instance.pk)
+            if post_ids is not None:
+                rows = rows.filter(post_id__in=post_ids)
+            instance._released_tag_ids = [instance.pk] * rows.count()
+        else:
+            tag_ids = list(pk_set) if pk_set is not None else None
+            instance._released_tag_ids = counter_utils.get_post_tag_ids([instance.pk], tag_ids)
+    elif action in ('post_remove', 'post_clear'):
+        counter_utils.adjust_tag_counts(getattr(instance, '_released_tag_ids', []), -1)
+        instance._released_tag_ids = []
+    elif action == 'post_add' and pk_set:
+        if reverse:
+            counter_utils.adjust_tag_counts([instance.pk] * len(pk_set), 1)
+        else:
+            counter_utils.adjust_tag_counts(pk_set, 1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    """Diffuser le nouveau post dans les fils des abonnés (après commit)"""
+    if not created:
+        return
+
+    def fan_out():
+        try:
+            timeline_utils.fan_out_post(instance)
+        except Exception as e:
+            print(f"Error fanning out post {instance.id}: {e}")
+
+    transaction.on_commit(fan_out)
+
+
+@receiver(m2m_changed, sender=Profile.followers.through)
+def update_timeline_on_follow(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    follower.following.add(profile) / profile.followers.add(follower):
+    copier ou retirer les posts de l'auteur dans le fil de l'abonné
+    """
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+
+    other_user_ids = dict(Profile.objects.filter(id__in=pk_set).values_list('id', 'user_id'))
+    if reverse:
+        # instance suit les profils de pk_set
+        pairs = [(instance.user_id, user_id) for user_id in other_user_ids.values()]
+    else:
+        # les profils de pk_set suivent instance
+        pairs = [(user_id, instance.user_id) for user_id in other_user_ids.values()]
+
+    for follower_id, author_id in pairs:
+        if action == 'post_add':
+            timeline_utils.backfill_timeline(follower_id, author_id)
+        else:
+            timeline_utils.remove_from_timeline(follower_id, author_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    """Recharger l'arbre des catégories après toute modification"""
+    category_utils.invalidate_category_tree()
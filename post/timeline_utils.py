@@ -0,0 +1,189 @@
+# post/timeline_utils.py
+"""
+Fil d'accueil: posts des profils suivis (et de l'utilisateur lui-même).
+
+Fan-out à l'écriture: à la création d'un post, une TimelineEntry est ajoutée
+pour chaque abonné de l'auteur. Les comptes trop suivis (au-delà de
+TIMELINE_FANOUT_MAX_FOLLOWERS) ne sont pas diffusés: leurs posts sont lus à
+la demande et fusionnés au moment de la lecture.
+
+Settings:
+- TIMELINE_MAX_LENGTH: nombre d'entrées conservées par utilisateur
+- TIMELINE_FANOUT_MAX_FOLLOWERS: seuil "célébrité" (abonnés)
+- TIMELINE_BACKFILL: posts récents copiés lors d'un nouvel abonnement
+"""
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from app.models import Profile
+from .feed_utils import decode_cursor, encode_cursor, keyset_filter
+from .models import Post, TimelineEntry
+
+HOME_FEED_SORT_KEYS = [('created_at', True), ('id', True)]
+
+
+def get_timeline_max_length():
+    return getattr(settings, 'TIMELINE_MAX_LENGTH', 800)
+
+
+def get_fanout_max_followers():
+    return getattr(settings, 'TIMELINE_FANOUT_MAX_FOLLOWERS', 5000)
+
+
+def get_timeline_backfill():
+    return getattr(settings, 'TIMELINE_BACKFILL', 50)
+
+
+def _follower_user_ids(author_id):
+    return list(
+        Profile.objects.filter(following__user_id=author_id).values_list('user_id', flat=True)
+    )
+
+
+def is_celebrity(author_id):
+    return Profile.objects.filter(
+        following__user_id=author_id
+    ).count() > get_fanout_max_followers()
+
+
+# ==================== ÉCRITURE ====================
+
+def fan_out_post(post):
+    """
+    Ajouter le post au fil de l'auteur et de ses abonnés.
+    Retourne le nombre d'entrées créées (0 pour un compte célébrité).
+    """
+    follower_ids = _follower_user_ids(post.user_id)
+    if len(follower_ids) > get_fanout_max_followers():
+        follower_ids = []  # Lu à la demande (get_home_feed_page)
+
+    entries = [
+        TimelineEntry(user_id=user_id, post_id=post.id, post_created_at=post.created_at)
+        for user_id in set(follower_ids) | {post.user_id}
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=1000, ignore_conflicts=True)
+    return len(entries)
+
+
+def backfill_timeline(follower_user_id, author_id):
+    """Nouvel abonnement: copier les posts récents de l'auteur"""
+    if is_celebrity(author_id):
+        return 0
+    recent = Post.objects.filter(user_id=author_id).order_by('-created_at').values_list(
+        'id', 'created_at'
+    )[:get_timeline_backfill()]
+    TimelineEntry.objects.bulk_create([
+        TimelineEntry(user_id=follower_user_id, post_id=post_id, post_created_at=created_at)
+        for post_id, created_at in recent
+    ], ignore_conflicts=True)
+    invalidate_celebrity_following(follower_user_id)
+    return len(recent)
+
+
+def remove_from_timeline(follower_user_id, author_id):
+    """Désabonnement: retirer les posts de l'auteur du fil"""
+    TimelineEntry.objects.filter(user_id=follower_user_id, post__user_id=author_id).delete()
+    invalidate_celebrity_following(follower_user_id)
+
+
+def trim_timeline(user_id):
+    """Ne garder que les TIMELINE_MAX_LENGTH entrées les plus récentes"""
+    cutoff = TimelineEntry.objects.filter(user_id=user_id).order_by(
+        '-post_created_at', '-post_id'
+    ).values_list('post_created_at', 'post_id')[get_timeline_max_length():][:1]
+    cutoff = list(cutoff)
+    if not cutoff:
+        return 0
+    created_at, post_id = cutoff[0]
+    deleted, _ = TimelineEntry.objects.filter(user_id=user_id).filter(
+        Q(post_created_at__lt=created_at) | Q(post_created_at=created_at, post_id__lte=post_id)
+    ).delete()
+    return deleted
+
+
+def rebuild_timeline(user_id):
+    """
+    Reconstruire le fil à partir des abonnements actuels (reprise des données
+    existantes, réparation). Retourne le nombre d'entrées.
+    """
+    celebrity_ids = set(get_celebrity_following_ids(user_id))
+    author_ids = set(
+        Profile.objects.filter(followers__user_id=user_id).values_list('user_id', flat=True)
+    ) - celebrity_ids
+    author_ids.add(user_id)
+
+    recent = Post.objects.filter(user_id__in=author_ids).order_by(
+        '-created_at', '-id'
+    ).values_list('id', 'created_at')[:get_timeline_max_length()]
+
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    TimelineEntry.objects.bulk_create([
+        TimelineEntry(user_id=user_id, post_id=post_id, post_created_at=created_at)
+        for post_id, created_at in recent
+    ], batch_size=1000, ignore_conflicts=True)
+    return len(recent)
+
+
+# ==================== LECTURE ====================
+
+def _celebrity_cache_key(user_id):
+    return f"timeline_celebrities_{user_id}"
+
+
+def invalidate_celebrity_following(user_id):
+    cache.delete(_celebrity_cache_key(user_id))
+
+
+def get_celebrity_following_ids(user_id):
+    """Auteurs suivis non diffusés à l'écriture (mis en cache quelques minutes)"""
+    cache_key = _celebrity_cache_key(user_id)
+    author_ids = cache.get(cache_key)
+    if author_ids is None:
+        author_ids = list(
+            # Sous-requête: un filtre sur followers fausserait le Count
+            Profile.objects.filter(
+                id__in=Profile.objects.filter(followers__user_id=user_id).values('id')
+            ).annotate(
+                followers_total=Count('followers', distinct=True)
+            ).filter(
+                followers_total__gt=get_fanout_max_followers()
+            ).values_list('user_id', flat=True)
+        )
+        cache.set(cache_key, author_ids, 300)
+    return author_ids
+
+
+def get_home_feed_page(user, cursor=None, limit=20):
+    """
+    Retourne (post_ids, next_cursor): entrées du fil fusionnées avec les
+    posts récents des célébrités suivies, du plus récent au plus ancien.
+    """
+    after = decode_cursor(cursor, HOME_FEED_SORT_KEYS) if cursor else None
+
+    entries = TimelineEntry.objects.filter(user_id=user.id).order_by('-post_created_at', '-post_id')
+    if after:
+        entries = entries.filter(keyset_filter(
+            [('post_created_at', True), ('post_id', True)], after
+        ))
+    candidates = list(entries.values_list('post_created_at', 'post_id')[:limit + 1])
+
+    celebrity_ids = get_celebrity_following_ids(user.id)
+    if celebrity_ids:
+        posts = Post.objects.filter(user_id__in=celebrity_ids).order_by('-created_at', '-id')
+        if after:
+            posts = posts.filter(keyset_filter(HOME_FEED_SORT_KEYS, after))
+        candidates += list(posts.values_list('created_at', 'id')[:limit + 1])
+        candidates = sorted(set(candidates), reverse=True)
+
+    has_more = len(candidates) > limit
+    candidates = candidates[:limit]
+    next_cursor = None
+    if has_more:
+        created_at, post_id = candidates[-1]
+        next_cursor = encode_cursor(
+            SimpleNamespace(created_at=created_at, id=post_id), HOME_FEED_SORT_KEYS
+        )
+    return [post_id for _, post_id in candidates], next_cursor
@@ -8,6 +8,7 @@ from . import views
 urlpatterns = [
     # Posts
     path('posts/', views.post_list_create, name='post-list-create'),
+    path('home-feed/', views.home_feed, name='home-feed'),
     path('posts/<int:pk>/', views.post_detail_update_delete, name='post-detail-update-delete'),
     path('posts/<int:pk>/upload-image/', views.upload_post_image, name='upload-post-image'),
     path('posts/<int:pk>/upload-file/', views.upload_post_file, name='upload-post-file'),
@@ -49,4 +50,5 @@ urlpatterns = [
     path('ratings/my-ratings/', views.get_user_ratings, name='get_user_ratings'),
         path('posts/<int:post_id>/download-media/', views.download_post_media, name='download_post_media'),
     path('posts/<int:post_id>/media-list/', views.get_post_media_list, name='get_post_media_list'),
+    path('posts/files/<int:file_id>/', views.serve_post_file, name='serve_post_file'),
 ]
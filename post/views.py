@@ -12,7 +12,7 @@ from feedback_post.models import Rating
 # django.contrib.auth 
 from django.contrib.auth.models import User
 from django.contrib.auth import get_user_model  
-from django.db.models import Avg, Count
+from django.db.models import Avg, Count, F
 
 # Importez vos serializers mis à jour
 from .serializers import PostSerializer,PostUpdateSerializer, PostCreateSerializer, PostDetailSerializer,PostListSerializer, RatingSerializer
@@ -25,6 +25,10 @@ from django.shortcuts import get_object_or_404
 from django.conf import settings
 from .serializers import  CategorySerializer,CategoryCreateUpdateSerializer,CategoryListSerializer, TagSerializer
 from django.core.files.storage import default_storage
+from . import feed_utils, rating_utils, score_utils, timeline_utils
+from .category_utils import get_category_tree
+from messaging.block_utils import BlockManager
+from searchs.index_utils import search_filter
 # Permission personnalisée
 def is_owner_or_read_only(request, post):
     """Vérifie si l'utilisateur est propriétaire du post"""
@@ -40,8 +44,9 @@ def post_list_create(request):
     Liste tous les posts ou crée un nouveau post
     """
     if request.method == 'GET':
-        # Récupération et filtrage des posts
-        queryset = Post.objects.filter(user__is_active=True)
+        # Récupération et filtrage des posts (sans les auteurs bloqués)
+        hidden_ids = sorted(BlockManager.get_hidden_user_ids(request.user))
+        queryset = Post.objects.filter(user__is_active=True).exclude(user_id__in=hidden_ids)
         from django.db.models import Count
         
         # Annoter avec le compte des commentaires
@@ -70,10 +75,8 @@ def post_list_create(request):
         search = request.query_params.get('search', None)
         if search and search != '':
             # IMPORTANT: Combiner avec les filtres existants (catégorie, tag, etc.)
-            queryset = queryset.filter(
-                Q(title__icontains=search) | 
-                Q(content__icontains=search)
-            )
+            # Sous-requête sur l'index plein texte (searchs.index_utils)
+            queryset = queryset.filter(search_filter('post', search))
             print(f"🔍 Filtering by search: {search}")
         
         # Filtrage par utilisateur
@@ -100,29 +103,74 @@ def post_list_create(request):
             elif sort_by == 'oldest':
                 queryset = queryset.order_by('created_at')
             elif sort_by == 'popular':
-                # Tri par popularité = nombre total de ratings
-                queryset = queryset.annotate(
-                    rating_count=Count('ratings', distinct=True)
-                ).filter(
-                    rating_count__gt=0
-                ).order_by('-rating_count', '-created_at')
+                # Tri par engagement récent précalculé (PostScore, index)
+                queryset = queryset.filter(
+                    score__engagement__isnull=False
+                ).annotate(
+                    popularity_score=F('score__engagement'),
+                    rating_count=F('score__rating_count')
+                ).order_by('-popularity_score', '-created_at')
             elif sort_by == 'rated':
-                # Tri par meilleure note = d'abord ceux avec plus de notes
-                queryset = queryset.annotate(
-                    rating_count=Count('ratings', distinct=True),
-                    avg_rating=Avg('ratings__stars')
-                ).filter(
-                    rating_count__gte=3,  # Minimum 3 notes
-                    avg_rating__isnull=False
-                ).order_by(
-                    '-rating_count',      # D'abord plus de notes
-                    '-avg_rating',        # Puis meilleure note
-                    '-created_at'         # Puis plus récent
-                )
+                # Tri par note bayésienne précalculée (PostScore, index)
+                queryset = queryset.filter(
+                    score__rating_count__gte=3  # Minimum 3 notes
+                ).annotate(
+                    bayesian_rating=F('score__bayesian_rating'),
+                    rating_count=F('score__rating_count'),
+                    avg_rating=F('average_rating')
+                ).order_by('-bayesian_rating', '-created_at')
             else:
                 # Par défaut : plus récents d'abord
                 queryset = queryset.order_by('-created_at')
         
+        filters = {
+            'sort': sort_by,
+            'category': category,
+            'search': search,
+            'tag': tag,
+            'user': user
+        }
+        
+        # Mode curseur (scroll infini): coût constant par page, total à la demande
+        if 'cursor' in request.query_params or request.query_params.get('pagination') == 'cursor':
+            if ordering:
+                return Response(
+                    {'error': 'ordering is not supported with cursor pagination, use sort'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                page_size = min(
+                    int(request.query_params.get('page_size', feed_utils.POST_PAGE_SIZE)),
+                    feed_utils.POST_PAGE_SIZE_MAX
+                )
+                posts, next_cursor = feed_utils.get_post_cursor_page(
+                    queryset.select_related('category', 'user', 'user__profile').prefetch_related(
+                        'tags', 'post_images', 'post_files'
+                    ),
+                    sort_by,
+                    cursor=request.query_params.get('cursor') or None,
+                    limit=max(page_size, 1)
+                )
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            
+            pagination = {
+                'page_size': page_size,
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None
+            }
+            if request.query_params.get('with_total') == 'true':
+                # Le total dépend des auteurs masqués pour ce lecteur
+                total_filters = {**filters, 'hidden_users': hidden_ids} if hidden_ids else filters
+                pagination['total_posts'] = feed_utils.get_cached_total(queryset, total_filters)
+            
+            serializer = PostListSerializer(posts, many=True, context={'request': request})
+            return Response({
+                'posts': serializer.data,
+                'pagination': pagination,
+                'filters': filters
+            })
+        
         # AJOUT : Pagination
         page = request.query_params.get('page', 1)
         page_size = request.query_params.get('page_size', 20)
@@ -143,11 +191,11 @@ def post_list_create(request):
         queryset = queryset[start:end]
         
         # Précharger les relations pour optimiser
-        queryset = queryset.select_related('category', 'user').prefetch_related(
-            'tags', 'mentions', 'post_images', 'post_files'
+        # (notes de l'utilisateur, commentaires et fichiers: PostListPageSerializer)
+        queryset = queryset.select_related('category', 'user', 'user__profile').prefetch_related(
+            'tags', 'post_images', 'post_files'
         )
         
-        from .serializers import PostListSerializer 
         serializer = PostListSerializer(queryset, many=True, context={'request': request})
         
         # Retourner avec des métadonnées de pagination et de tri
@@ -161,13 +209,7 @@ def post_list_create(request):
                 'has_next': end < total_posts,
                 'has_previous': page > 1
             },
-            'filters': {
-                'sort': sort_by,
-                'category': category,
-                'search': search,
-                'tag': tag,
-                'user': user
-            }
+            'filters': filters
         }
         
         return Response(response_data)
@@ -297,6 +339,52 @@ def post_list_create(request):
         else:
             print("❌ [POST CREATE] Serializer errors:", serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def home_feed(request):
+    """
+    Fil d'accueil: posts des profils suivis, du plus récent au plus ancien,
+    paginé par curseur (?cursor=, ?page_size=)
+    """
+    try:
+        page_size = min(
+            int(request.query_params.get('page_size', feed_utils.POST_PAGE_SIZE)),
+            feed_utils.POST_PAGE_SIZE_MAX
+        )
+        post_ids, next_cursor = timeline_utils.get_home_feed_page(
+            request.user,
+            cursor=request.query_params.get('cursor') or None,
+            limit=max(page_size, 1)
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Entretien du fil à la première page seulement
+    if not request.query_params.get('cursor'):
+        timeline_utils.trim_timeline(request.user.id)
+    
+    # Hydratation en un lot, dans l'ordre du fil, sans les auteurs bloqués
+    hidden_ids = BlockManager.get_hidden_user_ids(request.user)
+    posts_by_id = Post.objects.filter(
+        id__in=post_ids, user__is_active=True
+    ).exclude(user_id__in=hidden_ids).annotate(
+        comments_count_annotated=Count('post_comments', distinct=True)
+    ).select_related('category', 'user', 'user__profile').prefetch_related(
+        'tags', 'post_images', 'post_files'
+    ).in_bulk()
+    posts = [posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]
+    
+    serializer = PostListSerializer(posts, many=True, context={'request': request})
+    return Response({
+        'posts': serializer.data,
+        'pagination': {
+            'page_size': page_size,
+            'next_cursor': next_cursor,
+            'has_next': next_cursor is not None
+        }
+    })
+
+
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([permissions.IsAuthenticatedOrReadOnly])
 def post_detail_update_delete(request, pk):
@@ -692,13 +780,15 @@ def category_list_create(request):
         only_root = request.query_params.get('only_root', 'false').lower() == 'true'
         
         queryset = Category.objects.all()
+        tree = get_category_tree()
         
         if parent_id:
             try:
-                parent_category = Category.objects.get(id=parent_id)
-                queryset = queryset.filter(parent=parent_category)
-            except Category.DoesNotExist:
-                pass
+                parent_category = tree.get(int(parent_id))
+            except ValueError:
+                parent_category = None
+            if parent_category:
+                queryset = queryset.filter(parent_id=parent_category.id)
         elif only_root:
             queryset = queryset.filter(parent__isnull=True)
         
@@ -710,15 +800,12 @@ def category_list_create(request):
         # Trier par ordre et nom
         queryset = queryset.order_by('order', 'name')
         
-        # Compter le nombre de posts par catégorie
-        for category in queryset:
-            category.posts_count = category.post_categorie.count()
-        
         # Choisir le serializer selon le besoin
+        context = {'request': request, 'category_tree': tree}
         if request.query_params.get('simple', 'false').lower() == 'true':
-            serializer = CategoryListSerializer(queryset, many=True, context={'request': request})
+            serializer = CategoryListSerializer(queryset, many=True, context=context)
         else:
-            serializer = CategorySerializer(queryset, many=True, context={'request': request})
+            serializer = CategorySerializer(queryset, many=True, context=context)
         
         return Response(serializer.data)
     
@@ -969,26 +1056,8 @@ def get_user_post_detail(request, user_id=None, post_id=None):
             post = Post.objects.prefetch_related('ratings').get(id=post_id)
             print(f"✅ Post found: {post.title}")
             
-            # Calculer la distribution manuellement si nécessaire
-            from django.db.models import Count, Avg
-            
-            # Obtenir la distribution des ratings
-            distribution = {}
-            for i in range(1, 6):
-                count = post.ratings.filter(stars=i).count()
-                distribution[i] = count
-            
-            # Ajouter la distribution au post
-            post.rating_distribution_calculated = distribution
-            
-            # Calculer la moyenne et le total
-            ratings_agg = post.ratings.aggregate(
-                average=Avg('stars'),
-                count=Count('id')
-            )
-            
-            post.average_rating_calc = ratings_agg['average'] or 0.0
-            post.total_ratings_calc = ratings_agg['count']
+            # Distribution, moyenne et total: colonnes stockées sur le post
+            # (PostDetailSerializer.get_rating_distribution)
             
         except Post.DoesNotExist:
             print(f"❌ Post not found with ID: {post_id}")
@@ -1083,69 +1152,42 @@ def rate_post(request, post_id):
     
     if request.method == 'DELETE':
         # ✅ SUPPRESSION de la note
-        try:
-            rating = Rating.objects.get(post=post, user=request.user)
-            rating.delete()
-            
-            # Recalculer la moyenne
-            ratings_agg = Rating.objects.filter(post=post).aggregate(
-                average=Avg('stars'),
-                count=Count('id')
-            )
-            
-            post.average_rating = ratings_agg['average'] or 0
-            post.total_ratings = ratings_agg['count']
-            post.save()
-            
-            return Response({
-                "average_rating": post.average_rating,
-                "total_ratings": post.total_ratings,
-                "user_rating": None,
-                "message": "Note supprimée"
-            }, status=status.HTTP_200_OK)
-            
-        except Rating.DoesNotExist:
+        if rating_utils.remove_rating(post, request.user) is None:
             return Response({"error": "Aucune note à supprimer"}, status=status.HTTP_404_NOT_FOUND)
+        
+        # Agrégats mis à jour par delta, relus sans toucher au reste du post
+        post.refresh_from_db(fields=['average_rating', 'total_ratings'])
+        
+        return Response({
+            "average_rating": post.average_rating,
+            "total_ratings": post.total_ratings,
+            "user_rating": None,
+            "message": "Note supprimée"
+        }, status=status.HTTP_200_OK)
     
     elif request.method == 'POST':
         # ✅ NOTATION normale
         stars = request.data.get('stars')
         
-        if not stars or not (1 <= int(stars) <= 5):
+        try:
+            stars = int(stars)
+        except (TypeError, ValueError):
+            stars = None
+        if not stars or not (1 <= stars <= 5):
             return Response(
                 {"error": "La note doit être entre 1 et 5 étoiles"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        rating, created = Rating.objects.get_or_create(
-            post=post,
-            user=request.user,
-            defaults={'stars': stars}
-        )
+        # Un UPDATE par vote sur les agrégats (F-expressions), pas de post.save()
+        rating, created = rating_utils.set_rating(post, request.user, stars)
+        post.refresh_from_db(fields=['average_rating', 'total_ratings'])
         
-        if not created:
-            rating.stars = stars
-            rating.save()
-        
-        # Recalculer la moyenne
-        ratings_agg = Rating.objects.filter(post=post).aggregate(
-            average=Avg('stars'),
-            count=Count('id')
-        )
-        
-        post.average_rating = ratings_agg['average'] or 0
-        post.total_ratings = ratings_agg['count']
-        post.save()
-
-        try:
-            user_rating_obj = Rating.objects.get(post=post, user=request.user)
-            user_rating_data = {
-                'stars': user_rating_obj.stars,
-                'id': user_rating_obj.id,
-                'created_at': user_rating_obj.created_at
-            }
-        except Rating.DoesNotExist:
-            user_rating_data = None
+        user_rating_data = {
+            'stars': rating.stars,
+            'id': rating.id,
+            'created_at': rating.created_at
+        }
         
         return Response({
             "user_rating": user_rating_data,
@@ -1193,18 +1235,10 @@ def delete_rating(request, post_id):
     """
     try:
         post = Post.objects.get(id=post_id)
-        rating = Rating.objects.get(post=post, user=request.user)
-        rating.delete()
+        if rating_utils.remove_rating(post, request.user) is None:
+            raise Rating.DoesNotExist
         
-        # Recalculer la moyenne
-        ratings_agg = Rating.objects.filter(post=post).aggregate(
-            average=Avg('stars'),
-            count=Count('id')
-        )
-        
-        post.average_rating = ratings_agg['average'] or 0
-        post.total_ratings = ratings_agg['count']
-        post.save()
+        post.refresh_from_db(fields=['average_rating', 'total_ratings'])
         
         return Response({
             "message": "Note supprimée",
@@ -1449,7 +1483,7 @@ def get_best_rated_posts(request):
     """
     Posts les mieux notés - Version avec support de catégorie et recherche
     """
-    from django.db.models import Avg, Count, Q
+    from django.db.models import Q
     
     # Paramètres
     limit = int(request.query_params.get('limit', 20))
@@ -1475,17 +1509,19 @@ def get_best_rated_posts(request):
             Q(content__icontains=search)
         )
     
-    # Annoter avec les statistiques
-    queryset = queryset.annotate(
-        rating_count=Count('ratings'),
-        avg_rating=Avg('ratings__stars')
-    ).filter(
-        rating_count__gte=min_ratings,
-        avg_rating__isnull=False
-    )
+    # Scores précalculés (refresh_post_scores): un ORDER BY ... LIMIT sur index
+    queryset = queryset.filter(
+        score__rating_count__gte=min_ratings
+    ).annotate(
+        rating_count=F('score__rating_count'),
+        avg_rating=F('average_rating'),
+        bayesian_rating=F('score__bayesian_rating')
+    ).select_related(
+        'user', 'user__profile', 'category'
+    ).prefetch_related('tags', 'post_images')
     
-    # Trier d'abord par nombre de notes, puis par moyenne
-    queryset = queryset.order_by('-rating_count', '-avg_rating', '-created_at')
+    # Trier par note bayésienne
+    queryset = queryset.order_by('-bayesian_rating', '-created_at')
     
     # Limiter
     queryset = queryset[:limit]
@@ -1499,7 +1535,7 @@ def get_best_rated_posts(request):
             'min_ratings': min_ratings,
             'category': category,
             'search': search,
-            'algorithm': 'rating_count DESC, avg_rating DESC'
+            'algorithm': 'bayesian_rating DESC (prior: global mean x %s)' % score_utils.get_bayesian_prior()
         }
     })
 
@@ -1509,15 +1545,12 @@ def get_most_popular_posts(request):
     """
     Posts les plus populaires - Version avec support de catégorie et recherche
     """
-    from django.db.models import Count, Q
+    from django.db.models import Q
     
     # Paramètres
     limit = int(request.query_params.get('limit', 20))
     days = int(request.query_params.get('days', 30))
     
-    from datetime import datetime, timedelta
-    from django.utils import timezone
-    
     # Base queryset
     queryset = Post.objects.all()
     
@@ -1538,25 +1571,16 @@ def get_most_popular_posts(request):
             Q(content__icontains=search)
         )
     
-    # Date limite pour l'engagement récent
-    recent_date = timezone.now() - timedelta(days=days)
-    
-    # Annoter avec l'engagement
-    queryset = queryset.annotate(
-        total_rating_count=Count('ratings'),
-        recent_rating_count=Count('ratings', filter=Q(ratings__created_at__gte=recent_date))
-    ).filter(
-        total_rating_count__gt=0
-    )
-    
-    # Calculer le score de popularité
-    from django.db.models import F, ExpressionWrapper, FloatField
-    queryset = queryset.annotate(
-        popularity_score=ExpressionWrapper(
-            F('recent_rating_count') * 3.0 + F('total_rating_count') * 1.0,
-            output_field=FloatField()
-        )
-    )
+    # Engagement récent précalculé (refresh_post_scores), décroissance
+    # exponentielle au lieu d'une fenêtre de `days` jours
+    queryset = queryset.filter(
+        score__engagement__isnull=False
+    ).annotate(
+        popularity_score=F('score__engagement'),
+        rating_count=F('score__rating_count')
+    ).select_related(
+        'user', 'user__profile', 'category'
+    ).prefetch_related('tags', 'post_images')
     
     # Trier par score de popularité
     queryset = queryset.order_by('-popularity_score', '-created_at')
@@ -1573,7 +1597,7 @@ def get_most_popular_posts(request):
             'days': days,
             'category': category,
             'search': search,
-            'algorithm': 'recent_ratings*3 + total_ratings*1'
+            'algorithm': 'decayed ratings + comments (half-life: %sh)' % score_utils.get_half_life_hours()
         }
     })
 
@@ -1588,10 +1612,9 @@ def category_by_name(request, category_name):
     print(f"🔍 [CATEGORY BY NAME] Request for category: {category_name}")
     
     try:
-        # Get category by name (case-insensitive)
-        category = Category.objects.filter(
-            Q(name__iexact=category_name) | Q(name__iexact=category_name.lower())
-        ).first()
+        # Get category by name (noms en minuscules, arbre en mémoire)
+        tree = get_category_tree()
+        category = tree.get_by_name(category_name)
         
         if not category:
             print(f"❌ Category not found: {category_name}")
@@ -1656,20 +1679,21 @@ def category_by_name(request, category_name):
         )
         
         # Serialize the data
-        category_serializer = CategorySerializer(category, context={'request': request})
-        posts_serializer = PostListSerializer(posts, many=True, context={'request': request})
+        context = {'request': request, 'category_tree': tree}
+        category_serializer = CategorySerializer(category, context=context)
+        posts_serializer = PostListSerializer(posts, many=True, context=context)
         
         # Get subcategories
-        subcategories = category.subcategories.filter(is_active=True).order_by('order', 'name')
-        subcategories_serializer = CategorySerializer(subcategories, many=True, context={'request': request})
-        
-        # Get popular tags in this category
-        from django.db.models import Count
-        popular_tags = Tag.objects.filter(
-            posts__category=category
-        ).annotate(
-            post_count=Count('posts')
-        ).order_by('-post_count')[:10]
+        subcategories = tree.get_active_subcategories(category.id)
+        subcategories_serializer = CategorySerializer(subcategories, many=True, context=context)
+        
+        # Tags les plus utilisés dans cette catégorie: une requête groupée
+        # sur la table de liaison
+        popular_tags = list(Post.tags.through.objects.filter(
+            post__category_id=category.id
+        ).values('tag_id', 'tag__name').annotate(
+            count=Count('id')
+        ).order_by('-count', 'tag__name')[:10])
         
         response_data = {
             'category': category_serializer.data,
@@ -1677,8 +1701,8 @@ def category_by_name(request, category_name):
             'subcategories': subcategories_serializer.data,
             'popular_tags': [
                 {
-                    'name': tag.name,
-                    'count': tag.post_count
+                    'name': tag['tag__name'],
+                    'count': tag['count']
                 } for tag in popular_tags
             ],
             'pagination': {
@@ -1701,8 +1725,8 @@ def category_by_name(request, category_name):
             },
             'stats': {
                 'posts_count': total_posts,
-                'subcategories_count': subcategories.count(),
-                'tags_count': popular_tags.count()
+                'subcategories_count': len(subcategories),
+                'tags_count': len(popular_tags)
             }
         }
         
@@ -1763,13 +1787,11 @@ def category_posts(request, category_name):
     
 
 # Dans views.py - Ajouter ces imports
-import zipfile
 import io
-from django.http import HttpResponse
+from django.http import FileResponse, StreamingHttpResponse
 from django.core.files.storage import default_storage
-from wsgiref.util import FileWrapper
-import tempfile
 import os
+from . import media_utils
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -1803,8 +1825,7 @@ def download_post_media(request, post_id):
             'type': 'image',
             'name': f"main_image_{post.id}.{post.image.name.split('.')[-1]}",
             'file_path': post.image.path if post.image else None,
-            'file_url': post.image.url if post.image else None,
-            'size': post.image.size if post.image else 0
+            'file_url': post.image.url if post.image else None
         })
     
     # Images supplémentaires
@@ -1817,7 +1838,7 @@ def download_post_media(request, post_id):
                 'name': f"image_{i+1}_{post.id}.{image.image.name.split('.')[-1]}",
                 'file_path': image.image.path if image.image else None,
                 'file_url': image.image.url if image.image else None,
-                'size': image.image.size if image.image else 0
+                'size': image.file_size
             })
     
     # Fichiers divers
@@ -1830,7 +1851,7 @@ def download_post_media(request, post_id):
                 'name': file.name or file.file.name,
                 'file_path': file.file.path if file.file else None,
                 'file_url': file.file.url if file.file else None,
-                'size': file.file.size if file.file else 0
+                'size': file.file_size
             })
     
     # Si aucun média sélectionné, retourner tous
@@ -1851,10 +1872,13 @@ def download_post_media(request, post_id):
         # Pour un seul fichier ou format individuel, retourner le premier
         media = selected_media[0]
         if media.get('file_path') and os.path.exists(media['file_path']):
-            with open(media['file_path'], 'rb') as f:
-                response = HttpResponse(f.read(), content_type='application/octet-stream')
-                response['Content-Disposition'] = f'attachment; filename="{media["name"]}"'
-                return response
+            # Envoyé par morceaux (ou sendfile côté serveur WSGI)
+            return FileResponse(
+                open(media['file_path'], 'rb'),
+                as_attachment=True,
+                filename=media['name'],
+                content_type='application/octet-stream'
+            )
         else:
             # Fallback: rediriger vers l'URL
             return Response({
@@ -1864,34 +1888,38 @@ def download_post_media(request, post_id):
             })
 
 def create_zip_response(media_list, post_title):
-    """Crée une réponse HTTP avec un ZIP contenant les fichiers"""
-    # Créer un fichier temporaire
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.zip')
+    """Crée une réponse HTTP avec un ZIP contenant les fichiers, généré en flux"""
+    entries = [
+        (media['file_path'], media['name'])
+        for media in media_list
+        if media.get('file_path') and os.path.exists(media['file_path'])
+    ]
     
-    try:
-        with zipfile.ZipFile(temp_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for media in media_list:
-                if media.get('file_path') and os.path.exists(media['file_path']):
-                    # Ajouter le fichier au ZIP avec un chemin relatif
-                    zipf.write(media['file_path'], media['name'])
-        
-        temp_file.close()
-        
-        # Lire le fichier ZIP
-        with open(temp_file.name, 'rb') as f:
-            zip_data = f.read()
-        
-        # Créer la réponse
-        response = HttpResponse(zip_data, content_type='application/zip')
-        response['Content-Disposition'] = f'attachment; filename="{post_title}_media.zip"'
-        response['Content-Length'] = len(zip_data)
-        
-        return response
-        
-    finally:
-        # Nettoyer le fichier temporaire
-        if os.path.exists(temp_file.name):
-            os.remove(temp_file.name)
+    response = StreamingHttpResponse(
+        media_utils.stream_zip(entries),
+        content_type='application/zip'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{post_title}_media.zip"'
+    
+    return response
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def serve_post_file(request, file_id):
+    """
+    Lecture d'un fichier de post (vidéo, audio...) avec support Range / 304
+    GET /post/posts/files/{file_id}/
+    """
+    post_file = get_object_or_404(PostFile, id=file_id)
+    
+    return media_utils.serve_media_file(
+        request,
+        post_file.file,
+        filename=os.path.basename(post_file.name or post_file.file.name),
+        content_type=post_file.mime_type or None,
+        etag=media_utils.get_checksum_etag(post_file.checksum),
+        as_attachment=request.query_params.get('download', 'false').lower() == 'true'
+    )
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
@@ -1920,8 +1948,11 @@ def get_post_media_list(request, post_id):
             'type': 'image',
             'name': f"Image {i+1}",
             'url': request.build_absolute_uri(image.image.url) if image.image else None,
-            'size': format_file_size(image.image.size) if image.image else '0 KB',
-            'bytes': image.image.size if image.image else 0,
+            'size': format_file_size(image.file_size),
+            'bytes': image.file_size,
+            'mime_type': image.mime_type,
+            'width': image.width,
+            'height': image.height,
             'extension': image.image.name.split('.')[-1].lower() if image.image else '',
             'created_at': image.uploaded_at,
             'order': image.order + 1
@@ -1935,8 +1966,9 @@ def get_post_media_list(request, post_id):
             'type': file.file_type,
             'name': file.name or file.file.name,
             'url': request.build_absolute_uri(file.file.url) if file.file else None,
-            'size': format_file_size(file.file.size) if file.file else '0 KB',
-            'bytes': file.file.size if file.file else 0,
+            'size': format_file_size(file.file_size),
+            'bytes': file.file_size,
+            'mime_type': file.mime_type,
             'extension': file.file.name.split('.')[-1].lower() if file.file else '',
             'created_at': file.created_at,
             'order': 100 + i,  # Les fichiers viennent après les images
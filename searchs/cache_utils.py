@@ -0,0 +1,108 @@
+# searchs/cache_utils.py
+"""
+Cache des résultats de recherche.
+
+Une recherche répétée (tag populaire, nom en vogue) ne repasse plus par
+l'index, les filtres et le tri: la liste ordonnée des IDs trouvés est
+gardée en cache sous (type, requête normalisée, filtres, tri, classe de
+visibilité du lecteur, utilisateurs qu'il a bloqués ou qui l'ont bloqué
+s'il y en a). Les vues n'hydratent ensuite que ces IDs, en une
+requête par type.
+
+Invalidation par type: chaque écriture qui change les résultats d'un type
+(signals.py) change sa version après commit, après la réindexation; les
+entrées de l'ancienne version ne sont plus lues et expirent. Le TTL borne
+ce que les signaux ne voient pas (nombre de commentaires du tri 'popular').
+
+Settings:
+- SEARCH_RESULT_CACHE_TIMEOUT: durée de vie d'une entrée (secondes, 0 = désactivé)
+- SEARCH_RESULT_CACHE_MAX_IDS: taille maximale d'une liste mise en cache
+  (les résultats non tronqués de la recherche avancée peuvent être longs)
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .index_utils import normalize
+
+
+def get_search_result_cache_timeout():
+    return getattr(settings, 'SEARCH_RESULT_CACHE_TIMEOUT', 60)
+
+
+def get_search_result_cache_max_ids():
+    return getattr(settings, 'SEARCH_RESULT_CACHE_MAX_IDS', 5000)
+
+
+def visibility_class(user):
+    """Hors blocages (filtres), les résultats ne dépendent du lecteur que par cette classe"""
+    if user is None or not user.is_authenticated:
+        return 'anonymous'
+    return 'staff' if user.is_staff else 'member'
+
+
+def _version_key(doc_type):
+    return f"search_results_version_{doc_type}"
+
+
+def _get_version(doc_type):
+    key = _version_key(doc_type)
+    version = cache.get(key)
+    if version is None:
+        # Horodatage: une version perdue (éviction) ne retombe pas sur une
+        # ancienne entrée encore en cache
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _cache_key(doc_type, version, query, filters, sort, visibility):
+    # "  Élise DURAND" et "elise durand" donnent les mêmes résultats (index
+    # sans accents ni casse): même entrée
+    payload = json.dumps(
+        [normalize(query), filters or {}, sort, visibility], sort_keys=True, default=str
+    )
+    digest = hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+    return f"search_results_{doc_type}_{version}_{digest}"
+
+
+def get_cached_ids(doc_type, query, compute, filters=None, sort=None, user=None):
+    """
+    IDs ordonnés renvoyés par compute() pour cette recherche, depuis le
+    cache quand une entrée de la version courante existe
+    """
+    timeout = get_search_result_cache_timeout()
+    if not timeout:
+        return list(compute())
+
+    # Version lue avant le calcul: un résultat calculé pendant une écriture
+    # est rangé sous l'ancienne version, aussitôt abandonnée
+    cache_key = _cache_key(
+        doc_type, _get_version(doc_type), query, filters, sort, visibility_class(user)
+    )
+    ids = cache.get(cache_key)
+    if ids is None:
+        ids = list(compute())
+        if len(ids) <= get_search_result_cache_max_ids():
+            cache.set(cache_key, ids, timeout)
+    return ids
+
+
+def invalidate_search_results(*doc_types):
+    """
+    Abandonner les résultats en cache de ces types après commit (les
+    réindexations programmées avant passent d'abord)
+    """
+    def bump():
+        for doc_type in doc_types:
+            key = _version_key(doc_type)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, time.time_ns(), None)
+
+    transaction.on_commit(bump)
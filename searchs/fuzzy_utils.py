@@ -0,0 +1,283 @@
+# searchs/fuzzy_utils.py
+"""
+Recherche d'utilisateurs et de groupes tolérante aux fautes de frappe.
+
+1. Correction: chaque mot de la requête est cherché dans le vocabulaire du
+   type (mots distincts des utilisateurs / groupes, tenu par index_utils).
+   Le filtre des n-grammes ne lit que les mots de longueur proche qui
+   partagent assez de n-grammes; chacun est vérifié par une distance
+   d'édition bornée ("jonh" -> "john", "joan").
+2. Candidats: le mot saisi (en préfixe) OU ses corrections, dans l'index
+   plein texte du type; les mots de la requête restent combinés en ET. Le
+   queryset de l'appelant (actifs, groupes publics...) est appliqué dans la
+   même requête, avant la limite de candidats.
+3. Re-classement: distance entre la requête et chaque terme du candidat
+   (username, prénom, nom, nom complet, email). C'est une distance de
+   préfixe (la requête peut être le début du terme, pour l'autocomplétion);
+   une sous-chaîne exacte vaut 0, comme icontains.
+
+Les requêtes d'un caractère restent un simple icontains.
+
+Les distances utilisent l'algorithme bit-parallèle de Myers: toutes les
+positions de la requête avancent ensemble en quelques opérations sur un
+entier par caractère du texte.
+
+Settings:
+- FUZZY_SEARCH_CANDIDATES: candidats lus dans l'index avant re-classement
+  (au moins limit; tous si limit=None)
+- FUZZY_SEARCH_VOCABULARY_CANDIDATES: mots du vocabulaire vérifiés par mot saisi
+- FUZZY_SEARCH_MAX_DISTANCE: distance maximale acceptée (bornée par la longueur)
+- FUZZY_SEARCH_EXPANSIONS: corrections retenues par mot de la requête
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+from . import index_utils
+from .index_utils import WORD_PATTERN, normalize, rank_ordering
+
+User = get_user_model()
+
+
+def get_fuzzy_candidates_limit():
+    return getattr(settings, 'FUZZY_SEARCH_CANDIDATES', 200)
+
+
+def get_fuzzy_max_distance():
+    return getattr(settings, 'FUZZY_SEARCH_MAX_DISTANCE', 2)
+
+
+def get_fuzzy_vocabulary_candidates():
+    return getattr(settings, 'FUZZY_SEARCH_VOCABULARY_CANDIDATES', 1000)
+
+
+def get_fuzzy_expansions():
+    return getattr(settings, 'FUZZY_SEARCH_EXPANSIONS', 10)
+
+
+def allowed_distance(query):
+    """0 faute sous 4 caractères, 1 jusqu'à 6, puis FUZZY_SEARCH_MAX_DISTANCE"""
+    if len(query) < 4:
+        return 0
+    if len(query) <= 6:
+        return min(1, get_fuzzy_max_distance())
+    return get_fuzzy_max_distance()
+
+
+# ==================== DISTANCE ====================
+
+def _pattern_masks(pattern):
+    masks = {}
+    for position, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | (1 << position)
+    return masks
+
+
+def _myers(pattern, text, max_distance, masks, prefix):
+    """
+    Myers, avec l'extension de Hyyrö pour les transpositions ("jonh" /
+    "john" = 1): distance d'alignement optimal (Damerau restreinte).
+    prefix: min des distances aux préfixes de text, sinon distance à text
+    entier. None si elle dépasse max_distance.
+    """
+    length = len(pattern)
+    if not length:
+        distance = 0 if prefix else len(text)
+        return None if max_distance is not None and distance > max_distance else distance
+    if masks is None:
+        masks = _pattern_masks(pattern)
+    full = (1 << length) - 1
+    last = 1 << (length - 1)
+    positive, negative = full, 0
+    previous_diagonal = previous_equal = 0
+    score = best = length
+
+    for consumed, char in enumerate(text, 1):
+        equal = masks.get(char, 0)
+        transposition = (((~previous_diagonal & equal) << 1) & previous_equal)
+        diagonal = (((equal & positive) + positive) ^ positive) | equal | negative | transposition
+        horizontal_positive = negative | ~(diagonal | positive)
+        horizontal_negative = positive & diagonal
+        if horizontal_positive & last:
+            score += 1
+        elif horizontal_negative & last:
+            score -= 1
+        if score < best:
+            best = score
+        # Les préfixes plus longs sont à au moins consumed - length
+        if prefix and max_distance is not None and consumed - length >= max_distance:
+            break
+        horizontal_positive = (horizontal_positive << 1) | 1
+        horizontal_negative <<= 1
+        positive = (horizontal_negative | ~(diagonal | horizontal_positive)) & full
+        negative = horizontal_positive & diagonal & full
+        previous_diagonal, previous_equal = diagonal, equal
+
+    distance = best if prefix else score
+    if max_distance is not None and distance > max_distance:
+        return None
+    return distance
+
+
+def prefix_distance(pattern, text, max_distance=None, masks=None):
+    """min(distance(pattern, préfixe de text))"""
+    return _myers(pattern, text, max_distance, masks, prefix=True)
+
+
+def edit_distance(pattern, text, max_distance=None, masks=None):
+    """Distance (insertion, suppression, substitution, transposition) de pattern à text"""
+    if max_distance is not None and abs(len(pattern) - len(text)) > max_distance:
+        return None
+    return _myers(pattern, text, max_distance, masks, prefix=False)
+
+
+def best_distance(query, terms, max_distance):
+    """
+    (distance, longueur du terme) du terme le plus proche, None si hors borne.
+    À distance égale, le terme le plus court ("john" avant "johnson") l'emporte.
+    """
+    masks = _pattern_masks(query)
+    best = None
+    for term in terms:
+        if query in term:
+            distance = 0
+        else:
+            distance = prefix_distance(query, term, max_distance, masks)
+        if distance is not None and (best is None or (distance, len(term)) < best):
+            best = (distance, len(term))
+    return best
+
+
+def rank_candidates(query, candidates, limit=None):
+    """
+    candidates: [(object_id, [termes])] dans l'ordre de l'index.
+    IDs triés par distance, l'ordre de l'index départageant.
+    """
+    query = normalize(query)
+    max_distance = allowed_distance(query)
+    ranked = []
+    for position, (object_id, terms) in enumerate(candidates):
+        distance = best_distance(query, terms, max_distance)
+        if distance is not None:
+            ranked.append((distance, position, object_id))
+    ranked.sort()
+    ranked = [object_id for _, _, object_id in ranked]
+    return ranked[:limit] if limit else ranked
+
+
+# ==================== RECHERCHE ====================
+
+def expand_word(doc_type, word):
+    """
+    [word, corrections du vocabulaire, les plus proches d'abord]. Les
+    distances sont essayées dans l'ordre: le filtre à une faute est bien plus
+    sélectif, et la plupart des fautes de frappe n'en comptent qu'une.
+    """
+    backend = index_utils.get_search_backend()
+    masks = _pattern_masks(word)
+    corrections = []
+    for max_distance in range(1, allowed_distance(word) + 1):
+        for candidate in backend.similar_words(doc_type, word, max_distance, get_fuzzy_vocabulary_candidates()):
+            if candidate == word:
+                continue
+            distance = edit_distance(word, candidate, max_distance, masks)
+            if distance is not None:
+                corrections.append((distance, candidate))
+        if corrections:
+            break
+    corrections.sort()
+    return [word] + [candidate for _, candidate in corrections[:get_fuzzy_expansions()]]
+
+
+def _expanded_tokens(doc_type, query):
+    return [expand_word(doc_type, word) for word in WORD_PATTERN.findall(normalize(query))]
+
+
+def fuzzy_candidate_ids(doc_type, query, limit=None):
+    """IDs de l'index plein texte pour la requête et ses corrections (ordre de pertinence)"""
+    tokens = _expanded_tokens(doc_type, query)
+    if not tokens:
+        return []
+    results = index_utils.get_search_backend().search(
+        doc_type, tokens, limit or get_fuzzy_candidates_limit()
+    )
+    return [object_id for object_id, _ in results]
+
+
+def _candidates(doc_type, query, queryset, limit):
+    """
+    Objets de queryset qui correspondent à la requête et à ses corrections,
+    les mieux classés par l'index d'abord; au plus
+    max(limit, FUZZY_SEARCH_CANDIDATES), tous si limit est None
+    """
+    tokens = _expanded_tokens(doc_type, query)
+    if not tokens:
+        return queryset.none()
+    backend = index_utils.get_search_backend()
+    ranked_ids = [
+        object_id for object_id, _ in backend.search(doc_type, tokens, get_fuzzy_candidates_limit())
+    ]
+    candidates = queryset.filter(backend.match_q(doc_type, tokens, 'pk')).order_by(
+        rank_ordering(ranked_ids), '-pk'
+    )
+    if limit is not None:
+        candidates = candidates[:max(limit, get_fuzzy_candidates_limit())]
+    return candidates
+
+
+def _is_short(query):
+    """Trop court pour les n-grammes: icontains, comme avant l'index"""
+    return len(normalize(query)) < 2
+
+
+def _user_terms(username, first_name, last_name, email):
+    full_name = normalize(f"{first_name} {last_name}")
+    terms = [normalize(username), full_name, normalize(email)]
+    terms.extend(full_name.split())
+    if email:
+        terms.append(normalize(email.split('@')[0]))
+    return [term for term in terms if term]
+
+
+def search_user_ids(query, queryset=None, limit=20):
+    """
+    IDs d'utilisateurs classés; queryset restreint les candidats (actifs,
+    profil visible...) avant la limite. limit=None: toutes les correspondances
+    """
+    queryset = User.objects.all() if queryset is None else queryset
+    query = (query or '').strip()
+    if not query:
+        return []
+    if _is_short(query):
+        ids = queryset.filter(
+            Q(username__icontains=query) | Q(first_name__icontains=query)
+            | Q(last_name__icontains=query) | Q(email__icontains=query)
+        ).order_by('username').values_list('id', flat=True)
+        return list(ids if limit is None else ids[:limit])
+    rows = _candidates('user', query, queryset, limit).values_list(
+        'id', 'username', 'first_name', 'last_name', 'email'
+    )
+    return rank_candidates(
+        query,
+        [(user_id, _user_terms(*fields)) for user_id, *fields in rows],
+        limit
+    )
+
+
+def search_group_ids(query, queryset, limit=20):
+    """IDs de groupes de queryset classés (même principe que search_user_ids)"""
+    query = (query or '').strip()
+    if not query:
+        return []
+    if _is_short(query):
+        ids = queryset.filter(name__icontains=query).order_by('name').values_list('id', flat=True)
+        return list(ids if limit is None else ids[:limit])
+    rows = _candidates('group', query, queryset, limit).values_list('id', 'name')
+    return rank_candidates(
+        query,
+        [
+            (group_id, [term for term in (normalize(name), *normalize(name).split()) if term])
+            for group_id, name in rows
+        ],
+        limit
+    )
@@ -0,0 +1,792 @@
+# searchs/index_utils.py
+"""
+Index plein texte des posts, profils, groupes, catégories et tags.
+
+Les recherches ne passent plus par des chaînes de `icontains` (LIKE '%q%'
+sur plusieurs jointures + DISTINCT): chaque type de document est indexé
+une fois (signals.py à chaque save/delete, commande rebuild_search_index
+pour tout reconstruire). Deux usages:
+- search_filter: Q des objets qui correspondent, sans limite (sous-requête
+  sur l'index); la base applique filtres, tris, comptes et pagination du
+  queryset appelant avec la correspondance
+- search_ids: les SEARCH_INDEX_MAX_RESULTS IDs les plus pertinents, pour
+  le tri par pertinence (rank_ordering)
+
+Backends (même interface):
+- SQLiteFTS5Backend: une table virtuelle FTS5 par type, classement BM25
+  pondéré par champ
+- PostgresSearchBackend: une table de tsvector pondérés (A-D) + index GIN,
+  classement ts_rank_cd (équivalent Postgres le plus proche de BM25)
+- QueryPlannerBackend: sans index, union de sous-requêtes d'IDs par champ
+  (planner_utils); défaut des autres bases
+
+Ils portent aussi le vocabulaire de fuzzy_utils (recherche tolérante aux
+fautes): les mots distincts des utilisateurs et des groupes, retrouvés par
+n-grammes (tokens FTS5 sous SQLite, pg_trgm sous Postgres).
+
+Chaque mot de la requête doit apparaître dans le document, en début de mot
+(préfixe): "pho" trouve "photo", mais plus "sypho" comme le faisait icontains.
+
+Settings:
+- SEARCH_INDEX_BACKEND: chemin de la classe backend (défaut: selon la base)
+- SEARCH_INDEX_MAX_RESULTS: nombre maximal d'IDs classés par search_ids
+- SEARCH_INDEX_PG_CONFIG: configuration text search Postgres ('simple')
+"""
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from itertools import combinations
+from math import comb
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+# Mots du vocabulaire, découpés comme le tokenizer unicode61 (le _ sépare)
+WORD_PATTERN = re.compile(r'[^\W_]+', re.UNICODE)
+
+
+def get_search_max_results():
+    return getattr(settings, 'SEARCH_INDEX_MAX_RESULTS', 500)
+
+
+def tokenize_query(query):
+    """Mots de la requête (les opérateurs / guillemets saisis sont ignorés)"""
+    return TOKEN_PATTERN.findall((query or '').lower())
+
+
+def normalize(text):
+    """Minuscules, sans accents, espaces réduits"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.lower().split())
+
+
+def vocabulary_words(*values):
+    return set(WORD_PATTERN.findall(normalize(' '.join(value for value in values if value))))
+
+
+def _join(*values):
+    return ' '.join(value for value in values if value)
+
+
+# ==================== DOCUMENTS ====================
+
+# Champs indexés par type de document, avec leur poids dans le classement
+DOCUMENT_FIELDS = {
+    'post': (
+        ('title', 10.0), ('content', 3.0), ('tags', 5.0),
+        ('category', 4.0), ('author', 4.0), ('mentions', 2.0),
+    ),
+    'profile': (
+        ('username', 10.0), ('name', 8.0), ('email', 3.0),
+        ('bio', 2.0), ('place', 3.0),
+    ),
+    'user': (('username', 10.0), ('name', 8.0), ('email', 3.0)),
+    'group': (('name', 10.0), ('description', 3.0), ('keywords', 4.0)),
+    'category': (('name', 10.0), ('description', 3.0)),
+    'tag': (('name', 10.0),),
+}
+
+# Types dont les mots alimentent le vocabulaire (fuzzy_utils)
+VOCABULARY_DOC_TYPES = ('user', 'group')
+
+# Nombre maximal de combinaisons de n-grammes dans une requête de vocabulaire
+MAX_GRAM_COMBINATIONS = 200
+
+
+def gram_tokens(word, size):
+    """
+    N-grammes de word bornés par un marqueur de début / fin, encodés en
+    hexadécimal: des tokens alphanumériques pour FTS5 quel que soit le texte
+    """
+    padded = f"\x02{word}\x03"
+    return list(dict.fromkeys(
+        padded[i:i + size].encode().hex() for i in range(len(padded) - size + 1)
+    ))
+
+
+def vocabulary_gram_document(word):
+    return ' '.join(gram_tokens(word, 2) + gram_tokens(word, 3) + [f"len{len(word)}"])
+
+
+def vocabulary_filter_query(word, max_distance):
+    """
+    Requête FTS5 des mots à au plus max_distance éditions de word: longueur
+    à au plus max_distance près, et n-grammes communs (une édition,
+    transposition comprise, détruit au plus q + 1 n-grammes consécutifs).
+    None si aucun filtre ne serait sélectif.
+
+    - Mots longs, filtre des blocs: les n-grammes sont coupés en
+      2 * max_distance + 1 blocs consécutifs; chaque édition en touche au
+      plus deux, donc un mot assez proche contient tous les n-grammes d'un
+      bloc. Chaque liste de n-grammes n'est lue qu'une fois.
+    - Mots courts, filtre de comptage: un mot assez proche partage au moins
+      len(n-grammes) - 3 * max_distance bigrammes avec word (OU des
+      combinaisons possibles).
+    """
+    lengths = ' OR '.join(
+        f"len{length}"
+        for length in range(max(1, len(word) - max_distance), len(word) + max_distance + 1)
+    )
+    blocks = 2 * max_distance + 1
+    for size in (3, 2):
+        grams = gram_tokens(word, size)
+        if len(grams) >= 2 * blocks:
+            step = len(grams) / blocks
+            groups = ' OR '.join(
+                f"({' AND '.join(grams[round(i * step):round((i + 1) * step)])})"
+                for i in range(blocks)
+            )
+            return f"({lengths}) AND ({groups})"
+
+    grams = gram_tokens(word, 2)
+    need = len(grams) - 3 * max_distance
+    # Un sous-ensemble des n-grammes suffit (moins de combinaisons)
+    while need > 1 and comb(len(grams), need) > MAX_GRAM_COMBINATIONS:
+        grams = grams[:-1]
+        need -= 1
+    if need < 1:
+        return None
+    groups = ' OR '.join(f"({' AND '.join(group)})" for group in combinations(grams, need))
+    return f"({lengths}) AND ({groups})"
+
+
+def _word_key(word):
+    """rowid stable d'un mot du vocabulaire (FTS5)"""
+    return int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), 'big') >> 1
+
+
+def _user_names(user):
+    return _join(user.username, user.first_name, user.last_name)
+
+
+def build_post_documents(ids):
+    from post.models import Post
+
+    posts = Post.objects.filter(id__in=ids).select_related(
+        'user', 'category'
+    ).prefetch_related('tags', 'mentions')
+    for post in posts:
+        yield post.id, {
+            'title': post.title,
+            'content': post.content,
+            'tags': _join(*(tag.name for tag in post.tags.all())),
+            'category': post.category.name if post.category_id else '',
+            'author': _user_names(post.user),
+            'mentions': _join(*(_user_names(user) for user in post.mentions.all())),
+        }
+
+
+def build_profile_documents(ids):
+    from app.models import Profile
+
+    for profile in Profile.objects.filter(id__in=ids).select_related('user'):
+        yield profile.id, {
+            'username': profile.user.username,
+            'name': _join(profile.user.first_name, profile.user.last_name),
+            'email': profile.user.email,
+            'bio': profile.bio,
+            'place': _join(
+                profile.location, profile.address, profile.city, profile.state,
+                profile.zip_code, profile.country, profile.website,
+            ),
+        }
+
+
+def build_user_documents(ids):
+    from django.contrib.auth import get_user_model
+
+    users = get_user_model().objects.filter(id__in=ids).values_list(
+        'id', 'username', 'first_name', 'last_name', 'email'
+    )
+    for user_id, username, first_name, last_name, email in users:
+        yield user_id, {
+            'username': username,
+            'name': _join(first_name, last_name),
+            'email': email,
+        }
+
+
+def build_group_documents(ids):
+    from messaging.models import Conversation
+
+    # Tous les groupes: la visibilité est filtrée à l'hydratation
+    groups = Conversation.objects.filter(id__in=ids, is_group=True)
+    for group in groups:
+        keywords = group.tags if isinstance(group.tags, list) else []
+        yield group.id, {
+            'name': group.name,
+            'description': group.description,
+            'keywords': _join(*(str(keyword) for keyword in keywords)),
+        }
+
+
+def build_category_documents(ids):
+    from post.models import Category
+
+    for category in Category.objects.filter(id__in=ids):
+        yield category.id, {'name': category.name, 'description': category.description}
+
+
+def build_tag_documents(ids):
+    from post.models import Tag
+
+    for tag_id, name in Tag.objects.filter(id__in=ids).values_list('id', 'name'):
+        yield tag_id, {'name': name}
+
+
+DOCUMENT_BUILDERS = {
+    'post': build_post_documents,
+    'profile': build_profile_documents,
+    'user': build_user_documents,
+    'group': build_group_documents,
+    'category': build_category_documents,
+    'tag': build_tag_documents,
+}
+
+
+def get_document_ids(doc_type):
+    """Tous les IDs candidats d'un type (reconstruction)"""
+    from django.contrib.auth import get_user_model
+
+    from app.models import Profile
+    from messaging.models import Conversation
+    from post.models import Category, Post, Tag
+
+    querysets = {
+        'post': Post.objects.all(),
+        'profile': Profile.objects.all(),
+        'user': get_user_model().objects.all(),
+        'group': Conversation.objects.filter(is_group=True),
+        'category': Category.objects.all(),
+        'tag': Tag.objects.all(),
+    }
+    return querysets[doc_type].order_by('id').values_list('id', flat=True)
+
+
+# ==================== BACKENDS ====================
+
+class BaseSearchBackend:
+    """
+    Interface commune. documents: itérable de (object_id, {champ: texte}).
+    """
+
+    def ensure_schema(self):
+        """Créer les tables d'index si besoin"""
+        raise NotImplementedError
+
+    def upsert(self, doc_type, documents):
+        raise NotImplementedError
+
+    def delete(self, doc_type, object_ids):
+        raise NotImplementedError
+
+    def clear(self, doc_type):
+        raise NotImplementedError
+
+    def is_empty(self, doc_type):
+        """Aucun document indexé pour ce type"""
+        raise NotImplementedError
+
+    def search(self, doc_type, tokens, limit):
+        """
+        [(object_id, score)] du plus pertinent au moins pertinent.
+        tokens: mots (préfixes, combinés en ET); un élément peut être une liste
+        [mot saisi, variantes exactes...] dont un seul doit apparaître
+        """
+        raise NotImplementedError
+
+    def match_q(self, doc_type, tokens, field):
+        """
+        Q sur le modèle du type: field parmi les IDs des documents qui
+        correspondent à tokens (comme search), sans limite ni classement
+        """
+        raise NotImplementedError
+
+    def upsert_vocabulary(self, doc_type, words):
+        """Ajouter des mots (normalisés) au vocabulaire d'un type"""
+        raise NotImplementedError
+
+    def clear_vocabulary(self, doc_type):
+        raise NotImplementedError
+
+    def similar_words(self, doc_type, word, max_distance, limit):
+        """Mots du vocabulaire candidats à au plus max_distance éditions (à vérifier)"""
+        raise NotImplementedError
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """
+    Une table FTS5 par type; le rowid est l'ID de l'objet indexé.
+    unicode61 + remove_diacritics: "cafe" trouve "café".
+    """
+    TABLE_PREFIX = 'search_fts_'
+
+    def __init__(self, **kwargs):
+        self._ready = set()
+        self._lock = threading.Lock()
+
+    VOCABULARY_TABLE_PREFIX = 'search_vocab_'
+
+    def _table(self, doc_type):
+        return f"{self.TABLE_PREFIX}{doc_type}"
+
+    def _vocabulary_table(self, doc_type):
+        return f"{self.VOCABULARY_TABLE_PREFIX}{doc_type}"
+
+    def ensure_schema(self):
+        database = connection.settings_dict['NAME']
+        if database in self._ready:
+            return
+        with self._lock, connection.cursor() as cursor:
+            for doc_type, fields in DOCUMENT_FIELDS.items():
+                columns = ', '.join(name for name, _ in fields)
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {self._table(doc_type)} "
+                    f"USING fts5({columns}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+                )
+            for doc_type in VOCABULARY_DOC_TYPES:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {self._vocabulary_table(doc_type)} "
+                    f"USING fts5(word UNINDEXED, grams, tokenize='unicode61', detail='none')"
+                )
+            self._ready.add(database)
+
+    def upsert(self, doc_type, documents):
+        self.ensure_schema()
+        fields = [name for name, _ in DOCUMENT_FIELDS[doc_type]]
+        rows = [
+            [object_id] + [values.get(name) or '' for name in fields]
+            for object_id, values in documents
+        ]
+        if not rows:
+            return
+        table = self._table(doc_type)
+        placeholders = ', '.join(['%s'] * (len(fields) + 1))
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {table} WHERE rowid = %s", [[row[0]] for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {table} (rowid, {', '.join(fields)}) VALUES ({placeholders})",
+                rows
+            )
+
+    def delete(self, doc_type, object_ids):
+        self.ensure_schema()
+        object_ids = list(object_ids)
+        if object_ids:
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"DELETE FROM {self._table(doc_type)} WHERE rowid = %s",
+                    [[object_id] for object_id in object_ids]
+                )
+
+    def clear(self, doc_type):
+        self.ensure_schema()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self._table(doc_type)}")
+
+    def is_empty(self, doc_type):
+        self.ensure_schema()
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT 1 FROM {self._table(doc_type)} LIMIT 1")
+            return cursor.fetchone() is None
+
+    @staticmethod
+    def _quote(word):
+        return '"{}"'.format(word.replace('"', '""'))
+
+    def _match_term(self, token):
+        if isinstance(token, str):
+            return f"{self._quote(token)}*"
+        typed, *variants = token
+        return '({})'.format(' OR '.join(
+            [f"{self._quote(typed)}*"] + [self._quote(variant) for variant in variants]
+        ))
+
+    def search(self, doc_type, tokens, limit):
+        self.ensure_schema()
+        table = self._table(doc_type)
+        weights = ', '.join(str(weight) for _, weight in DOCUMENT_FIELDS[doc_type])
+        # "mot"* : préfixe; les termes sont combinés en ET
+        match = ' AND '.join(self._match_term(token) for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, bm25({table}, {weights}) AS score FROM {table} "
+                f"WHERE {table} MATCH %s ORDER BY score LIMIT %s",
+                [match, limit]
+            )
+            # bm25() est négatif: plus petit = plus pertinent
+            return [(object_id, -score) for object_id, score in cursor.fetchall()]
+
+    def match_q(self, doc_type, tokens, field):
+        self.ensure_schema()
+        table = self._table(doc_type)
+        match = ' AND '.join(self._match_term(token) for token in tokens)
+        return Q(**{f'{field}__in': RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [match])})
+
+    def upsert_vocabulary(self, doc_type, words):
+        self.ensure_schema()
+        rows = [[_word_key(word), word, vocabulary_gram_document(word)] for word in words]
+        if rows:
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT OR REPLACE INTO {self._vocabulary_table(doc_type)} (rowid, word, grams) "
+                    "VALUES (%s, %s, %s)",
+                    rows
+                )
+
+    def clear_vocabulary(self, doc_type):
+        self.ensure_schema()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self._vocabulary_table(doc_type)}")
+
+    def similar_words(self, doc_type, word, max_distance, limit):
+        self.ensure_schema()
+        match = vocabulary_filter_query(word, max_distance)
+        if match is None:
+            return []
+        table = self._vocabulary_table(doc_type)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT word FROM {table} WHERE {table} MATCH %s LIMIT %s", [match, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Une table commune (doc_type, object_id, document tsvector) + index GIN.
+    Les poids des champs sont ramenés aux quatre classes A-D de Postgres.
+    """
+    TABLE = 'search_document'
+    VOCABULARY_TABLE = 'search_vocabulary'
+
+    def __init__(self, config=None, **kwargs):
+        self.config = config or getattr(settings, 'SEARCH_INDEX_PG_CONFIG', 'simple')
+        self._ready = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _weight_class(weight):
+        if weight >= 8:
+            return 'A'
+        if weight >= 4:
+            return 'B'
+        if weight >= 2.5:
+            return 'C'
+        return 'D'
+
+    def ensure_schema(self):
+        database = connection.settings_dict['NAME']
+        if database in self._ready:
+            return
+        with self._lock, connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+                "doc_type varchar(20) NOT NULL, object_id bigint NOT NULL, "
+                "document tsvector NOT NULL, PRIMARY KEY (doc_type, object_id))"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.TABLE}_document_gin "
+                f"ON {self.TABLE} USING GIN (document)"
+            )
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.VOCABULARY_TABLE} ("
+                "doc_type varchar(20) NOT NULL, word text NOT NULL, PRIMARY KEY (doc_type, word))"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.VOCABULARY_TABLE}_word_trgm "
+                f"ON {self.VOCABULARY_TABLE} USING GIN (word gin_trgm_ops)"
+            )
+            self._ready.add(database)
+
+    def upsert(self, doc_type, documents):
+        self.ensure_schema()
+        fields = DOCUMENT_FIELDS[doc_type]
+        vector = ' || '.join(
+            f"setweight(to_tsvector(%s::regconfig, %s), '{self._weight_class(weight)}')"
+            for _, weight in fields
+        )
+        rows = []
+        for object_id, values in documents:
+            params = [doc_type, object_id]
+            for name, _ in fields:
+                params += [self.config, values.get(name) or '']
+            rows.append(params)
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.TABLE} (doc_type, object_id, document) "
+                f"VALUES (%s, %s, {vector}) "
+                "ON CONFLICT (doc_type, object_id) DO UPDATE SET document = EXCLUDED.document",
+                rows
+            )
+
+    def delete(self, doc_type, object_ids):
+        self.ensure_schema()
+        object_ids = list(object_ids)
+        if object_ids:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {self.TABLE} WHERE doc_type = %s AND object_id = ANY(%s)",
+                    [doc_type, object_ids]
+                )
+
+    def clear(self, doc_type):
+        self.ensure_schema()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.TABLE} WHERE doc_type = %s", [doc_type])
+
+    def is_empty(self, doc_type):
+        self.ensure_schema()
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT 1 FROM {self.TABLE} WHERE doc_type = %s LIMIT 1", [doc_type])
+            return cursor.fetchone() is None
+
+    @staticmethod
+    def _tsquery(tokens):
+        # Les tokens ne contiennent que des caractères de mot: pas d'injection tsquery
+        return ' & '.join(
+            f"{token}:*" if isinstance(token, str)
+            else '({})'.format(' | '.join([f"{token[0]}:*"] + list(token[1:])))
+            for token in tokens
+        )
+
+    def search(self, doc_type, tokens, limit):
+        self.ensure_schema()
+        tsquery = self._tsquery(tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT object_id, ts_rank_cd(document, query) AS score "
+                f"FROM {self.TABLE}, to_tsquery(%s::regconfig, %s) query "
+                "WHERE doc_type = %s AND document @@ query "
+                "ORDER BY score DESC, object_id DESC LIMIT %s",
+                [self.config, tsquery, doc_type, limit]
+            )
+            return cursor.fetchall()
+
+    def match_q(self, doc_type, tokens, field):
+        self.ensure_schema()
+        return Q(**{f'{field}__in': RawSQL(
+            f"SELECT object_id FROM {self.TABLE} "
+            "WHERE doc_type = %s AND document @@ to_tsquery(%s::regconfig, %s)",
+            [doc_type, self.config, self._tsquery(tokens)]
+        )})
+
+    def upsert_vocabulary(self, doc_type, words):
+        self.ensure_schema()
+        rows = [[doc_type, word] for word in words]
+        if rows:
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {self.VOCABULARY_TABLE} (doc_type, word) VALUES (%s, %s) "
+                    "ON CONFLICT DO NOTHING",
+                    rows
+                )
+
+    def clear_vocabulary(self, doc_type):
+        self.ensure_schema()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.VOCABULARY_TABLE} WHERE doc_type = %s", [doc_type])
+
+    def similar_words(self, doc_type, word, max_distance, limit):
+        self.ensure_schema()
+        # % : similarité trigramme (pg_trgm), servie par l'index GIN. Le seuil
+        # par défaut (0.3) est abaissé pour les mots courts ("jonh" / "john")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('pg_trgm.similarity_threshold', %s, false)",
+                [str(getattr(settings, 'SEARCH_TRIGRAM_THRESHOLD', 0.2))]
+            )
+            cursor.execute(
+                f"SELECT word FROM {self.VOCABULARY_TABLE} "
+                "WHERE doc_type = %s AND length(word) BETWEEN %s AND %s AND word %% %s "
+                "ORDER BY similarity(word, %s) DESC LIMIT %s",
+                [doc_type, len(word) - max_distance, len(word) + max_distance, word, word, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class QueryPlannerBackend(BaseSearchBackend):
+    """
+    Sans index: chaque recherche évalue un prédicat par champ comme une
+    sous-requête d'IDs indépendante (planner_utils), unies puis notées avec
+    les poids de DOCUMENT_FIELDS. Pour les bases sans FTS5 ni tsvector;
+    correspondance par sous-chaîne plutôt que par préfixe, pas de
+    vocabulaire (la recherche tolérante aux fautes s'y réduit aux mots saisis).
+    """
+
+    def ensure_schema(self):
+        pass
+
+    def upsert(self, doc_type, documents):
+        pass
+
+    def delete(self, doc_type, object_ids):
+        pass
+
+    def clear(self, doc_type):
+        pass
+
+    def is_empty(self, doc_type):
+        # Rien à construire: les recherches lisent les tables métier
+        return False
+
+    def search(self, doc_type, tokens, limit):
+        from .planner_utils import union_search
+
+        return union_search(doc_type, tokens, limit, DOCUMENT_FIELDS[doc_type])
+
+    def match_q(self, doc_type, tokens, field):
+        from .planner_utils import union_filter
+
+        return union_filter(doc_type, tokens, field)
+
+    def upsert_vocabulary(self, doc_type, words):
+        pass
+
+    def clear_vocabulary(self, doc_type):
+        pass
+
+    def similar_words(self, doc_type, word, max_distance, limit):
+        return []
+
+
+DEFAULT_BACKENDS = {
+    'postgresql': 'searchs.index_utils.PostgresSearchBackend',
+    'sqlite': 'searchs.index_utils.SQLiteFTS5Backend',
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                default = DEFAULT_BACKENDS.get(
+                    connection.vendor, 'searchs.index_utils.QueryPlannerBackend'
+                )
+                _backend = import_string(getattr(settings, 'SEARCH_INDEX_BACKEND', default))()
+    return _backend
+
+
+# ==================== SERVICE ====================
+
+def index_documents(doc_type, ids):
+    """(Ré)indexer des objets; ceux qui n'existent plus (ou plus indexables) sont retirés"""
+    ids = set(ids)
+    if not ids:
+        return
+    documents = list(DOCUMENT_BUILDERS[doc_type](ids))
+    backend = get_search_backend()
+    backend.upsert(doc_type, documents)
+    backend.delete(doc_type, ids - {object_id for object_id, _ in documents})
+    if doc_type in VOCABULARY_DOC_TYPES:
+        backend.upsert_vocabulary(doc_type, _document_words(documents))
+
+
+def _document_words(documents):
+    words = set()
+    for _, values in documents:
+        words |= vocabulary_words(*values.values())
+    return words
+
+
+def remove_documents(doc_type, ids):
+    get_search_backend().delete(doc_type, ids)
+
+
+def schedule_index(doc_type, ids):
+    """Indexer après commit; une erreur d'index ne fait pas échouer l'écriture"""
+    ids = [object_id for object_id in ids if object_id]
+    if not ids:
+        return
+
+    def run():
+        try:
+            index_documents(doc_type, ids)
+        except Exception as e:
+            logger.error(f"Erreur indexation {doc_type} {ids[:10]} : {e}")
+
+    transaction.on_commit(run)
+
+
+def rebuild_index(doc_types=None, batch_size=500):
+    """Reconstruire l'index. Retourne {doc_type: nombre de documents}"""
+    backend = get_search_backend()
+    backend.ensure_schema()
+    totals = {}
+    for doc_type in doc_types or DOCUMENT_FIELDS:
+        backend.clear(doc_type)
+        with_vocabulary = doc_type in VOCABULARY_DOC_TYPES
+        if with_vocabulary:
+            backend.clear_vocabulary(doc_type)
+        ids = list(get_document_ids(doc_type))
+        for start in range(0, len(ids), batch_size):
+            documents = list(DOCUMENT_BUILDERS[doc_type](ids[start:start + batch_size]))
+            backend.upsert(doc_type, documents)
+            if with_vocabulary:
+                backend.upsert_vocabulary(doc_type, _document_words(documents))
+        totals[doc_type] = len(ids)
+    return totals
+
+
+def build_missing_index(batch_size=500):
+    """
+    Créer le schéma et construire les types encore vides alors que des objets
+    existent (premier déploiement, nouvelle base). Appelé après migrate;
+    sans effet une fois l'index peuplé. Retourne {doc_type: nombre de documents}
+    """
+    backend = get_search_backend()
+    backend.ensure_schema()
+    missing = [
+        doc_type for doc_type in DOCUMENT_FIELDS
+        if backend.is_empty(doc_type) and get_document_ids(doc_type).exists()
+    ]
+    return rebuild_index(missing, batch_size=batch_size) if missing else {}
+
+
+def search_ranked(doc_type, query, limit=None):
+    """[(object_id, score)] classés par pertinence ([] si la requête est vide)"""
+    tokens = tokenize_query(query)
+    if not tokens:
+        return []
+    return get_search_backend().search(doc_type, tokens, limit or get_search_max_results())
+
+
+def search_ids(doc_type, query, limit=None):
+    return [object_id for object_id, _ in search_ranked(doc_type, query, limit)]
+
+
+def search_filter(doc_type, query, field='pk'):
+    """
+    Q des objets qui correspondent à la requête, sans limite: à combiner
+    avec les autres filtres du queryset plutôt que de filtrer search_ids
+    (tronqué aux plus pertinents). Aucun objet si la requête est vide.
+    """
+    tokens = tokenize_query(query)
+    if not tokens:
+        return Q(**{f'{field}__in': []})
+    return get_search_backend().match_q(doc_type, tokens, field)
+
+
+def rank_ordering(ids, field='pk'):
+    """Expression d'ORDER BY qui respecte l'ordre de pertinence de ids"""
+    if not ids:
+        return Value(0, output_field=IntegerField())
+    return Case(
+        *[When(**{field: object_id}, then=Value(position)) for position, object_id in enumerate(ids)],
+        default=Value(len(ids)),
+        output_field=IntegerField()
+    )
@@ -0,0 +1,135 @@
+# searchs/management/commands/benchmark_fuzzy_search.py
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from searchs import fuzzy_utils
+from searchs.index_utils import get_search_backend, vocabulary_words
+
+SYLLABLES = [
+    'al', 'an', 'ar', 'ber', 'bri', 'ca', 'cha', 'cla', 'da', 'del', 'dre', 'el', 'en', 'fa',
+    'fer', 'gan', 'gi', 'gui', 'ja', 'jo', 'ka', 'kel', 'la', 'lau', 'li', 'lou', 'ma', 'mar',
+    'mi', 'mo', 'na', 'nel', 'no', 'ol', 'pa', 'pier', 're', 'ri', 'ro', 'sa', 'se', 'son',
+    'ta', 'ter', 'th', 'to', 'tre', 'va', 'vin', 'yo', 'zu',
+]
+
+
+# Noms à apostrophe (o'brien, d'angelo): un mot saisi, deux mots pour l'index
+APOSTROPHE_PREFIXES = ["o'", "d'", "l'"]
+
+QUERY_KINDS = ('mot', 'prénom nom', 'apostrophe')
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la recherche tolérante aux fautes (vocabulaire + index plein texte + "
+        "distance d'édition) sur N utilisateurs synthétiques: un mot, prénom + nom, "
+        "nom à apostrophe. Tout est annulé à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def _name(self, rng, parts):
+        return ''.join(rng.choice(SYLLABLES) for _ in range(parts))
+
+    def _typo(self, rng, word):
+        position = rng.randrange(1, len(word) - 1)
+        kind = rng.choice(('swap', 'delete', 'substitute', 'insert'))
+        if kind == 'swap':
+            return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+        if kind == 'delete':
+            return word[:position] + word[position + 1:]
+        if kind == 'substitute':
+            return word[:position] + rng.choice('aeiou') + word[position + 1:]
+        return word[:position] + rng.choice('aeiou') + word[position:]
+
+    def _query(self, rng, kind, first, last):
+        """(requête avec faute, terme attendu dans les résultats)"""
+        if kind == 'prénom nom':
+            return f"{first} {self._typo(rng, last) if len(last) >= 4 else last}", f"{first} {last}"
+        if kind == 'apostrophe':
+            prefix, rest = last.split("'", 1)
+            return f"{prefix}'{self._typo(rng, rest) if len(rest) >= 4 else rest}", last
+        word = rng.choice((first, last))
+        return (self._typo(rng, word) if len(word) >= 4 else word), word
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        backend = get_search_backend()
+        backend.ensure_schema()
+        # Identifiants hors de la plage des vrais utilisateurs
+        offset = 10 ** 12
+        first_names = [self._name(rng, rng.randint(2, 3)) for _ in range(5000)]
+        last_names = [self._name(rng, rng.randint(3, 4)) for _ in range(50000)]
+        last_names += [rng.choice(APOSTROPHE_PREFIXES) + name for name in last_names[:5000]]
+        terms, names, apostrophe_ids = {}, {}, []
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            documents, words = [], set()
+            for i in range(options['users']):
+                first, last = rng.choice(first_names), rng.choice(last_names)
+                username = first + last.replace("'", '') + str(rng.randint(0, 999))
+                email = f"{username}@example.com"
+                terms[offset + i] = fuzzy_utils._user_terms(username, first, last, email)
+                names[offset + i] = (first, last)
+                if "'" in last:
+                    apostrophe_ids.append(offset + i)
+                documents.append((offset + i, {'username': username, 'name': f"{first} {last}", 'email': email}))
+                words |= vocabulary_words(username, first, last, email)
+                if len(documents) >= options['batch_size']:
+                    backend.upsert('user', documents)
+                    backend.upsert_vocabulary('user', words)
+                    documents, words = [], set()
+            backend.upsert('user', documents)
+            backend.upsert_vocabulary('user', words)
+            self.stdout.write(f"Indexation de {options['users']} utilisateurs: {time.perf_counter() - started:.1f}s")
+
+            lookup_times, rank_times = [], []
+            hits, counts = dict.fromkeys(QUERY_KINDS, 0), dict.fromkeys(QUERY_KINDS, 0)
+            for _ in range(options['queries']):
+                kind = rng.choice(QUERY_KINDS if apostrophe_ids else QUERY_KINDS[:2])
+                if kind == 'apostrophe':
+                    target = rng.choice(apostrophe_ids)
+                else:
+                    target = offset + rng.randrange(options['users'])
+                query, expected = self._query(rng, kind, *names[target])
+
+                started = time.perf_counter()
+                candidate_ids = fuzzy_utils.fuzzy_candidate_ids('user', query)
+                lookup_times.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                ranked = fuzzy_utils.rank_candidates(
+                    query, [(object_id, terms[object_id]) for object_id in candidate_ids], 20
+                )
+                rank_times.append(time.perf_counter() - started)
+                counts[kind] += 1
+                hits[kind] += any(expected in terms[object_id] for object_id in ranked)
+
+            transaction.set_rollback(True)
+
+        def summary(label, values):
+            values = sorted(values)
+            p95 = values[int(len(values) * 0.95) - 1]
+            self.stdout.write(
+                f"{label}: p50 {statistics.median(values) * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms"
+            )
+
+        summary("Candidats (vocabulaire + index plein texte)", lookup_times)
+        summary("Re-classement (distance d'édition)", rank_times)
+        summary("Total", [a + b for a, b in zip(lookup_times, rank_times)])
+        for kind in QUERY_KINDS:
+            if counts[kind]:
+                self.stdout.write(f"  {kind}: {hits[kind]}/{counts[kind]}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Le terme visé figure dans le top 20 pour {sum(hits.values())}/{options['queries']} "
+            "requêtes avec faute"
+        ))
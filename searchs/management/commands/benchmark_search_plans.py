@@ -0,0 +1,163 @@
+# searchs/management/commands/benchmark_search_plans.py
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+
+from comment_post.models import Comment
+from post.models import Category, Post, Tag
+from searchs.index_utils import DOCUMENT_FIELDS
+from searchs.planner_utils import union_search
+
+User = get_user_model()
+
+SYLLABLES = [
+    'al', 'an', 'ar', 'ber', 'bri', 'ca', 'cha', 'da', 'del', 'el', 'fa', 'gan', 'gi', 'jo',
+    'ka', 'la', 'li', 'ma', 'mar', 'mi', 'na', 'no', 'pa', 'ri', 'ro', 'sa', 'ta', 'to', 'va',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare, sur des posts synthétiques, la recherche multi-champs par OR "
+        "de jointures (.distinct() + Count) et par union de sous-requêtes d'IDs "
+        "(planner_utils). Tout est annulé à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--tags-per-post', type=int, default=6)
+        parser.add_argument('--mentions-per-post', type=int, default=3)
+        parser.add_argument('--comments-per-post', type=int, default=5)
+        parser.add_argument('--queries', type=int, default=30)
+        parser.add_argument('--limit', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def _word(self, rng, parts):
+        return ''.join(rng.choice(SYLLABLES) for _ in range(parts))
+
+    def _populate(self, rng, options):
+        users = User.objects.bulk_create([
+            User(
+                username=f"bench_{i}_{self._word(rng, 2)}",
+                first_name=self._word(rng, 2).title(),
+                last_name=self._word(rng, 3).title(),
+            )
+            for i in range(max(50, options['posts'] // 20))
+        ])
+        categories = Category.objects.bulk_create([
+            Category(name=f"bench_{i}_{self._word(rng, 2)}") for i in range(20)
+        ])
+        tags = Tag.objects.bulk_create([
+            Tag(name=f"{self._word(rng, 3)}{i}") for i in range(max(100, options['posts'] // 4))
+        ])
+        posts = Post.objects.bulk_create([
+            Post(
+                title=' '.join(self._word(rng, rng.randint(2, 3)) for _ in range(4)),
+                content=' '.join(self._word(rng, rng.randint(1, 3)) for _ in range(30)),
+                user=rng.choice(users),
+                category=rng.choice(categories),
+            )
+            for _ in range(options['posts'])
+        ], batch_size=1000)
+        Post.tags.through.objects.bulk_create([
+            Post.tags.through(post_id=post.id, tag_id=tag.id)
+            for post in posts
+            for tag in rng.sample(tags, options['tags_per_post'])
+        ], batch_size=5000)
+        Post.mentions.through.objects.bulk_create([
+            Post.mentions.through(post_id=post.id, user_id=user.id)
+            for post in posts
+            for user in rng.sample(users, options['mentions_per_post'])
+        ], batch_size=5000)
+        Comment.objects.bulk_create([
+            Comment(post=post, user=rng.choice(users), content=self._word(rng, 4))
+            for post in posts
+            for _ in range(options['comments_per_post'])
+        ], batch_size=5000)
+        return users, tags, posts
+
+    def _join_filters(self, query):
+        """L'ancien prédicat de search_general"""
+        return (
+            Q(title__icontains=query) | Q(content__icontains=query)
+            | Q(category__name__icontains=query) | Q(tags__name__icontains=query)
+            | Q(mentions__username__icontains=query) | Q(mentions__first_name__icontains=query)
+            | Q(mentions__last_name__icontains=query) | Q(user__username__icontains=query)
+            | Q(user__first_name__icontains=query) | Q(user__last_name__icontains=query)
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        limit = options['limit']
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            users, tags, posts = self._populate(rng, options)
+            self.stdout.write(f"Données: {len(posts)} posts ({time.perf_counter() - started:.1f}s)")
+
+            queries = []
+            for _ in range(options['queries']):
+                kind = rng.choice(('tag', 'user', 'title'))
+                if kind == 'tag':
+                    queries.append(rng.choice(tags).name[:5])
+                elif kind == 'user':
+                    queries.append(rng.choice(users).last_name.lower()[:5])
+                else:
+                    queries.append(rng.choice(posts).title.split()[0][:5])
+
+            join_times, union_times, join_rows, different, wrong_counts = [], [], [], 0, 0
+            for query in queries:
+                started = time.perf_counter()
+                joined = list(
+                    Post.objects.filter(self._join_filters(query)).distinct()
+                    .annotate(comments_count=Count('post_comments'))
+                    .order_by('-created_at', '-id')
+                    .values_list('id', 'comments_count')[:limit]
+                )
+                join_times.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                ids = [
+                    object_id for object_id, _ in
+                    union_search('post', [query], None, DOCUMENT_FIELDS['post'])
+                ]
+                unioned = list(
+                    Post.objects.filter(id__in=ids)
+                    .annotate(comments_count=Count('post_comments'))
+                    .order_by('-created_at', '-id')
+                    .values_list('id', 'comments_count')[:limit]
+                )
+                union_times.append(time.perf_counter() - started)
+
+                # Lignes produites par la jointure avant DISTINCT
+                join_rows.append(Post.objects.filter(self._join_filters(query)).count())
+                different += [row[0] for row in joined] != [row[0] for row in unioned]
+                wrong_counts += any(
+                    count != options['comments_per_post'] for _, count in joined
+                )
+
+            transaction.set_rollback(True)
+
+        def summary(label, values):
+            values = sorted(values)
+            p95 = values[max(0, int(len(values) * 0.95) - 1)]
+            self.stdout.write(
+                f"{label}: p50 {statistics.median(values) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms"
+            )
+
+        summary("OR de jointures + distinct", join_times)
+        summary("Union de sous-requêtes d'IDs", union_times)
+        self.stdout.write(
+            f"Lignes de jointure par requête (avant DISTINCT): médiane {statistics.median(join_rows):.0f}"
+        )
+        self.stdout.write(
+            f"Requêtes où le Count('post_comments') de la jointure est faux: {wrong_counts}/{len(queries)}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Mêmes posts dans le même ordre pour {len(queries) - different}/{len(queries)} requêtes"
+        ))
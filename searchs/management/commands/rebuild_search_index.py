@@ -0,0 +1,27 @@
+# searchs/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand, CommandError
+
+from searchs.index_utils import DOCUMENT_FIELDS, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte (tous les types ou ceux indiqués)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'doc_types', nargs='*',
+            help=f"Types de documents à reconstruire parmi {', '.join(DOCUMENT_FIELDS)} (défaut: tous)"
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        unknown = set(options['doc_types']) - set(DOCUMENT_FIELDS)
+        if unknown:
+            raise CommandError(f"Type(s) inconnu(s): {', '.join(sorted(unknown))}")
+
+        totals = rebuild_index(options['doc_types'] or None, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f"{doc_type}: {count}" for doc_type, count in totals.items())
+            + " document(s) indexé(s)"
+        ))
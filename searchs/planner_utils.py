@@ -0,0 +1,178 @@
+# searchs/planner_utils.py
+"""
+Recherche multi-champs par union de sous-requêtes d'IDs, sans index.
+
+Un OR de prédicats sur plusieurs relations (tags__name | mentions__username
+| user__first_name...) fait une jointure de toutes ces tables: chaque post
+ressort une fois par combinaison tag x mention x commentaire, d'où le
+.distinct() et des Count() faux. Ici chaque prédicat est évalué seul, sur
+la table qui porte le champ (la table de liaison des tags, pas Post x tags),
+et ne renvoie que des IDs:
+
+    SELECT post_id, 2 FROM post_post_tags JOIN post_tag ... WHERE name LIKE %q%
+    UNION ALL SELECT id, 0 FROM post_post WHERE title LIKE %q%
+    UNION ALL ...
+
+Une requête par mot de la recherche; les IDs sont notés en Python avec les
+poids de index_utils.DOCUMENT_FIELDS (chaque champ compte une fois par
+objet), les mots combinés en ET. La vue ne joint ensuite à Post que les
+IDs retenus. Sans classement (union_filter), les mêmes sous-requêtes
+deviennent des `id IN (...)` combinés au queryset appelant.
+
+Sert de backend de recherche (index_utils.QueryPlannerBackend) pour les
+bases sans FTS5 ni tsvector, et de plan de référence pour la commande
+benchmark_search_plans.
+"""
+from django.db.models import IntegerField, Q, Value
+
+
+def _post_sources():
+    from post.models import Post
+
+    return {
+        'title': [(Post.objects.all(), 'id', 'title')],
+        'content': [(Post.objects.all(), 'id', 'content')],
+        'tags': [(Post.tags.through.objects.all(), 'post_id', 'tag__name')],
+        'category': [(Post.objects.all(), 'id', 'category__name')],
+        'author': [
+            (Post.objects.all(), 'id', f'user__{field}')
+            for field in ('username', 'first_name', 'last_name')
+        ],
+        'mentions': [
+            (Post.mentions.through.objects.all(), 'post_id', f'user__{field}')
+            for field in ('username', 'first_name', 'last_name')
+        ],
+    }
+
+
+def _profile_sources():
+    from app.models import Profile
+
+    profiles = Profile.objects.all()
+    return {
+        'username': [(profiles, 'id', 'user__username')],
+        'name': [(profiles, 'id', 'user__first_name'), (profiles, 'id', 'user__last_name')],
+        'email': [(profiles, 'id', 'user__email')],
+        'bio': [(profiles, 'id', 'bio')],
+        'place': [
+            (profiles, 'id', field)
+            for field in ('location', 'address', 'city', 'state', 'zip_code', 'country', 'website')
+        ],
+    }
+
+
+def _user_sources():
+    from django.contrib.auth import get_user_model
+
+    users = get_user_model().objects.all()
+    return {
+        'username': [(users, 'id', 'username')],
+        'name': [(users, 'id', 'first_name'), (users, 'id', 'last_name')],
+        'email': [(users, 'id', 'email')],
+    }
+
+
+def _group_sources():
+    from messaging.models import Conversation
+
+    groups = Conversation.objects.filter(is_group=True)
+    return {
+        'name': [(groups, 'id', 'name')],
+        'description': [(groups, 'id', 'description')],
+        'keywords': [(groups, 'id', 'tags')],
+    }
+
+
+def _category_sources():
+    from post.models import Category
+
+    categories = Category.objects.all()
+    return {
+        'name': [(categories, 'id', 'name')],
+        'description': [(categories, 'id', 'description')],
+    }
+
+
+def _tag_sources():
+    from post.models import Tag
+
+    return {'name': [(Tag.objects.all(), 'id', 'name')]}
+
+
+# Par type: {champ de DOCUMENT_FIELDS: [(queryset, colonne ID, lookup)]}
+FIELD_SOURCES = {
+    'post': _post_sources,
+    'profile': _profile_sources,
+    'user': _user_sources,
+    'group': _group_sources,
+    'category': _category_sources,
+    'tag': _tag_sources,
+}
+
+
+def _token_query(sources, alternatives):
+    """Union des sous-requêtes (ID, indice du champ) qui contiennent une des alternatives"""
+    parts = [
+        queryset.filter(**{f'{lookup}__icontains': alternative})
+        .order_by()
+        .annotate(search_field=Value(position, output_field=IntegerField()))
+        .values_list(id_field, 'search_field')
+        for position, field_sources in enumerate(sources)
+        for queryset, id_field, lookup in field_sources
+        for alternative in alternatives
+    ]
+    return parts[0].union(*parts[1:], all=True)
+
+
+def union_search(doc_type, tokens, limit, weights):
+    """
+    [(object_id, score)] des objets qui contiennent chaque mot dans au
+    moins un champ. tokens: comme BaseSearchBackend.search (un élément peut
+    être une liste de variantes); weights: [(champ, poids)].
+    """
+    field_sources = FIELD_SOURCES[doc_type]()
+    sources = [field_sources[field] for field, _ in weights]
+    scores = None
+    for token in tokens:
+        alternatives = [token] if isinstance(token, str) else list(token)
+        token_scores = {}
+        for object_id, position in set(_token_query(sources, alternatives)):
+            token_scores[object_id] = token_scores.get(object_id, 0.0) + weights[position][1]
+        if scores is None:
+            scores = token_scores
+        else:
+            scores = {
+                object_id: score + token_scores[object_id]
+                for object_id, score in scores.items()
+                if object_id in token_scores
+            }
+        if not scores:
+            return []
+    ranked = sorted((scores or {}).items(), key=lambda item: (-item[1], -item[0]))
+    return ranked[:limit]
+
+
+def union_filter(doc_type, tokens, field):
+    """
+    Q: field parmi les IDs de chaque mot (ET), chaque champ étant une
+    sous-requête d'IDs indépendante (OU), sans jointure du queryset appelant
+    """
+    from .index_utils import DOCUMENT_FIELDS
+
+    field_sources = FIELD_SOURCES[doc_type]()
+    sources = [
+        source
+        for name, _ in DOCUMENT_FIELDS[doc_type]
+        for source in field_sources[name]
+    ]
+    condition = Q()
+    for token in tokens:
+        alternatives = [token] if isinstance(token, str) else list(token)
+        token_condition = Q()
+        for queryset, id_field, lookup in sources:
+            for alternative in alternatives:
+                token_condition |= Q(**{f'{field}__in': queryset.filter(
+                    **{f'{lookup}__icontains': alternative}
+                ).values(id_field)})
+        condition &= token_condition
+    return condition
@@ -0,0 +1,196 @@
+# searchs/signals.py
+"""
+Maintien de l'index de recherche (index_utils, avec le vocabulaire de
+fuzzy_utils), de l'index d'autocomplétion (suggest_utils) et du cache de
+résultats (cache_utils) à chaque écriture.
+Les réindexations partent après commit, les invalidations du cache juste
+après; un save(update_fields=...) qui ne touche aucun champ indexé, filtré
+ou trié (compteurs, last_login, updated_at...) est ignoré.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from app.models import Profile
+from messaging.models import Conversation
+from post.models import Category, Post, PostImage, Tag
+from . import index_utils, suggest_utils
+from .cache_utils import invalidate_search_results
+
+User = get_user_model()
+
+POST_FIELDS = {'title', 'content', 'category', 'category_id', 'user', 'user_id'}
+# Champs des tris / filtres de recherche (résultats en cache)
+POST_RESULT_FIELDS = POST_FIELDS | {'average_rating', 'total_ratings'}
+PROFILE_FIELDS = {'bio', 'location', 'address', 'city', 'state', 'zip_code', 'country', 'website'}
+USER_FIELDS = {'username', 'first_name', 'last_name', 'email'}
+# is_active: les comptes désactivés ne sont plus suggérés
+USER_SUGGESTION_FIELDS = USER_FIELDS | {'is_active'}
+GROUP_FIELDS = {'name', 'description', 'is_group', 'is_visible', 'tags'}
+CATEGORY_FIELDS = {'name', 'description'}
+
+
+def _touches(update_fields, indexed_fields):
+    return update_fields is None or bool(set(update_fields) & indexed_fields)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    if _touches(update_fields, POST_FIELDS):
+        index_utils.schedule_index('post', [instance.pk])
+    if _touches(update_fields, POST_RESULT_FIELDS):
+        invalidate_search_results('post')
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+@receiver(m2m_changed, sender=Post.mentions.through)
+def index_post_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Tags / mentions changés. Les tags créés par bulk_create (mention_utils)
+    n'émettent pas post_save: ils sont indexés ici.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        if isinstance(instance, Tag):
+            post_ids = list(pk_set or instance.posts.values_list('id', flat=True))
+            index_utils.schedule_index('tag', [instance.pk])
+            suggest_utils.schedule_update('tag', [instance.pk])
+        else:
+            post_ids = list(pk_set or instance.mentions_in_posts.values_list('id', flat=True))
+        index_utils.schedule_index('post', post_ids)
+        invalidate_search_results('post')
+        return
+    index_utils.schedule_index('post', [instance.pk])
+    if action == 'post_add' and sender is Post.tags.through and pk_set:
+        index_utils.schedule_index('tag', pk_set)
+        suggest_utils.schedule_update('tag', pk_set)
+        invalidate_search_results('post', 'tag')
+    else:
+        invalidate_search_results('post')
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    index_utils.schedule_index('post', [instance.pk])
+    invalidate_search_results('post')
+
+
+@receiver(post_save, sender=PostImage)
+@receiver(post_delete, sender=PostImage)
+def invalidate_post_images(sender, instance, **kwargs):
+    """Filtre has_images de la recherche avancée"""
+    invalidate_search_results('post')
+
+
+@receiver(post_save, sender=Category)
+def index_category(sender, instance, update_fields=None, **kwargs):
+    suggest_utils.schedule_update('category', [instance.pk])
+    if _touches(update_fields, CATEGORY_FIELDS):
+        index_utils.schedule_index('category', [instance.pk])
+        # Le nom de la catégorie fait partie du document des posts
+        index_utils.schedule_index(
+            'post', list(Post.objects.filter(category_id=instance.pk).values_list('id', flat=True))
+        )
+        invalidate_search_results('category', 'post')
+    elif _touches(update_fields, {'is_active'}):
+        invalidate_search_results('category')
+
+
+@receiver(post_delete, sender=Category)
+def unindex_category(sender, instance, **kwargs):
+    index_utils.schedule_index('category', [instance.pk])
+    suggest_utils.schedule_update('category', [instance.pk])
+    invalidate_search_results('category', 'post')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def index_tag(sender, instance, **kwargs):
+    index_utils.schedule_index('tag', [instance.pk])
+    suggest_utils.schedule_update('tag', [instance.pk])
+    invalidate_search_results('tag')
+
+
+@receiver(post_save, sender=Profile)
+def index_profile(sender, instance, update_fields=None, **kwargs):
+    if _touches(update_fields, PROFILE_FIELDS | {'user', 'user_id', 'image', 'category', 'category_id'}):
+        index_utils.schedule_index('profile', [instance.pk])
+        suggest_utils.schedule_update('profile', [instance.pk])
+        invalidate_search_results('profile')
+
+
+@receiver(post_delete, sender=Profile)
+def unindex_profile(sender, instance, **kwargs):
+    index_utils.schedule_index('profile', [instance.pk])
+    suggest_utils.schedule_update('profile', [instance.pk])
+    invalidate_search_results('profile')
+
+
+@receiver(post_save, sender=User)
+def index_user_documents(sender, instance, created, update_fields=None, **kwargs):
+    """Nom / username / email: document utilisateur, profil et posts de l'auteur"""
+    if created or _touches(update_fields, USER_FIELDS):
+        index_utils.schedule_index('user', [instance.pk])
+    if created or not _touches(update_fields, USER_SUGGESTION_FIELDS):
+        return
+    profile_ids = list(Profile.objects.filter(user_id=instance.pk).values_list('id', flat=True))
+    suggest_utils.schedule_update('profile', profile_ids)
+    if not _touches(update_fields, USER_FIELDS):
+        # is_active: les profils des comptes désactivés sont filtrés
+        invalidate_search_results('profile')
+        return
+    index_utils.schedule_index('profile', profile_ids)
+    index_utils.schedule_index(
+        'post', list(Post.objects.filter(user_id=instance.pk).values_list('id', flat=True))
+    )
+    invalidate_search_results('profile', 'post')
+
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    index_utils.schedule_index('user', [instance.pk])
+
+
+@receiver(post_save, sender=Conversation)
+@receiver(post_delete, sender=Conversation)
+def index_group(sender, instance, update_fields=None, **kwargs):
+    """index_documents retire les conversations qui ne sont pas des groupes"""
+    if kwargs.get('signal') is post_delete or _touches(update_fields, GROUP_FIELDS):
+        index_utils.schedule_index('group', [instance.pk])
+        invalidate_search_results('group')
+    if kwargs.get('signal') is post_delete or _touches(update_fields, GROUP_FIELDS | {'group_photo', 'group_type', 'category'}):
+        suggest_utils.schedule_update('group', [instance.pk])
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def update_group_member_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """Nombre de membres: suggestions de groupes et tri 'members' de la recherche"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        group_ids = list(pk_set or [])
+    elif instance.is_group:
+        group_ids = [instance.pk]
+    else:
+        return
+    suggest_utils.schedule_update('group', group_ids)
+    invalidate_search_results('group')
+
+
+@receiver(post_migrate)
+def build_search_index_after_migrate(sender, verbosity=1, stdout=None, **kwargs):
+    """
+    Créer les tables d'index et indexer les objets existants au premier
+    migrate: sans cela la recherche ne renvoie rien tant que
+    rebuild_search_index n'a pas été lancé. Sans effet ensuite.
+    """
+    if sender.name != 'searchs':
+        return
+    totals = index_utils.build_missing_index()
+    if totals and verbosity and stdout:
+        stdout.write(
+            "Index de recherche construit: "
+            + ', '.join(f"{doc_type}: {count}" for doc_type, count in totals.items())
+            + "\n"
+        )
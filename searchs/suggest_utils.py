@@ -0,0 +1,468 @@
+# searchs/suggest_utils.py
+"""
+Index d'autocomplétion en mémoire (search_suggestions).
+
+Profils (username, prénom, nom), groupes visibles, catégories actives et
+tags sont chargés une fois par process dans un index:
+- liste triée des termes normalisés (sans accents, minuscules) -> préfixes
+  par recherche dichotomique
+- trigrammes -> sous-chaînes ("pont" trouve "Dupont"), vérifiées ensuite
+Chaque entrée porte déjà sa suggestion compacte: une frappe ne fait aucune
+requête SQL pour ces types (les posts viennent de l'index plein texte).
+
+Mise à jour incrémentale: les signaux publient les objets modifiés dans un
+journal numéroté du cache (partagé entre workers avec Redis); chaque
+process rejoue les changements qu'il n'a pas vus et ne reconstruit tout
+qu'en cas de trou dans le journal ou après SUGGESTION_INDEX_MAX_AGE. Le
+numéro est pris avant l'écriture de l'entrée: une dernière entrée absente
+est en cours d'écriture (rejouée au prochain appel), seule une entrée
+absente suivie d'une entrée présente est un trou.
+Les compteurs affichés (posts, membres) peuvent avoir ce retard.
+
+Settings:
+- SUGGESTION_INDEX_MAX_AGE: reconstruction complète au-delà (secondes)
+- SUGGESTION_INDEX_MAX_LAG: nombre maximal de changements rejoués
+- SUGGESTION_MAX_CANDIDATES: candidats évalués au plus par type
+"""
+import bisect
+import heapq
+import threading
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .index_utils import normalize, rank_ordering, search_ids
+
+SEQUENCE_KEY = 'suggestion_index_seq'
+CHANGE_KEY = 'suggestion_index_change:{}'
+
+SUGGESTION_TYPES = ('profile', 'group', 'category', 'tag')
+
+# Score de base par type (repris de l'ancien calculate_relevance_score)
+TYPE_SCORES = {
+    'profile': 100,
+    'group': 90,
+    'post': 80,
+    'category': 70,
+    'tag': 60,
+}
+
+
+def get_suggestion_max_age():
+    return getattr(settings, 'SUGGESTION_INDEX_MAX_AGE', 3600)
+
+
+def get_suggestion_max_lag():
+    return getattr(settings, 'SUGGESTION_INDEX_MAX_LAG', 1000)
+
+
+def get_suggestion_max_candidates():
+    return getattr(settings, 'SUGGESTION_MAX_CANDIDATES', 2000)
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _preview(text, length):
+    text = text or ''
+    return text[:length] + '...' if len(text) > length else text
+
+
+def _file_url(field_file):
+    return field_file.url if field_file else None
+
+
+class SuggestionEntry:
+    __slots__ = ('kind', 'object_id', 'label', 'full_name', 'terms', 'haystack', 'popularity', 'payload')
+
+    def __init__(self, kind, object_id, label, payload, full_name='', popularity=0):
+        self.kind = kind
+        self.object_id = object_id
+        self.label = normalize(label)
+        self.full_name = normalize(full_name)
+        self.popularity = popularity
+        self.payload = payload
+
+        terms = {self.label, self.full_name}
+        for value in (self.label, self.full_name):
+            terms.update(value.split())
+        terms.discard('')
+        self.terms = terms
+        self.haystack = '\n'.join(sorted(terms))
+
+    @property
+    def key(self):
+        return (self.kind, self.object_id)
+
+
+# ==================== CHARGEMENT ====================
+
+def load_profile_entries(ids=None):
+    from app.models import Profile
+
+    profiles = Profile.objects.filter(user__is_active=True).select_related('user', 'category')
+    if ids is not None:
+        profiles = profiles.filter(id__in=ids)
+    for profile in profiles.iterator(chunk_size=2000):
+        user = profile.user
+        full_name = f"{user.first_name} {user.last_name}".strip()
+        image_url = _file_url(profile.image)
+        yield SuggestionEntry('profile', profile.id, user.username, {
+            'type': 'profile',
+            'id': profile.id,
+            'user_id': user.id,
+            'username': user.username,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'bio_preview': _preview(profile.bio, 80),
+            'image_url': image_url,
+            'category_name': profile.category.name if profile.category else None,
+            'avatar': image_url,
+            'profile_picture': image_url,
+            'name': full_name or user.username,
+        }, full_name=full_name)
+
+
+def load_group_entries(ids=None):
+    from messaging.models import Conversation
+
+    groups = Conversation.objects.filter(is_group=True, is_visible=True).select_related(
+        'category'
+    ).annotate(member_count=Count('participants'))
+    if ids is not None:
+        groups = groups.filter(id__in=ids)
+    for group in groups.iterator(chunk_size=2000):
+        image_url = _file_url(group.group_photo)
+        is_private = group.group_type == 'group_private'
+        yield SuggestionEntry('group', group.id, group.name or '', {
+            'type': 'group',
+            'id': group.id,
+            'name': group.name,
+            'title': group.name,  # Pour compatibilité avec l'existant
+            'description': _preview(group.description, 120),
+            'group_photo_url': image_url,
+            'image': image_url,  # Alias pour compatibilité
+            'cover_image': image_url,  # Alias pour compatibilité
+            'member_count': group.member_count,
+            'members_count': group.member_count,  # Alias pour compatibilité
+            'privacy': 'private' if is_private else 'public',
+            'category_name': group.category.name if group.category else None,
+            'created_at': group.created_at.isoformat() if group.created_at else None,
+            'is_private': is_private,
+        }, popularity=group.member_count)
+
+
+def load_category_entries(ids=None):
+    from post.category_utils import get_category_tree
+    from post.models import Category
+
+    tree = get_category_tree()
+    categories = Category.objects.filter(is_active=True)
+    if ids is not None:
+        categories = categories.filter(id__in=ids)
+    for category in categories:
+        parent = tree.get_parent(category.id)
+        yield SuggestionEntry('category', category.id, category.name, {
+            'type': 'category',
+            'id': category.id,
+            'name': category.name,
+            'title': category.name,  # Pour compatibilité
+            'description': category.description[:100] if category.description else '',
+            'post_count': category.post_count,
+            'image_url': _file_url(category.image),
+            'parent_name': parent.name if parent else None,
+        }, popularity=category.post_count)
+
+
+def load_tag_entries(ids=None):
+    from post.models import Tag
+
+    tags = Tag.objects.all()
+    if ids is not None:
+        tags = tags.filter(id__in=ids)
+    for tag_id, name, post_count in tags.values_list('id', 'name', 'post_count').iterator(chunk_size=5000):
+        yield SuggestionEntry('tag', tag_id, name, {
+            'type': 'tag',
+            'id': tag_id,
+            'name': name,
+            'title': name,  # Pour compatibilité
+            'post_count': post_count,
+            'description': f'Tag "{name}" utilisé dans {post_count} posts',
+        }, popularity=post_count)
+
+
+ENTRY_LOADERS = {
+    'profile': load_profile_entries,
+    'group': load_group_entries,
+    'category': load_category_entries,
+    'tag': load_tag_entries,
+}
+
+
+# ==================== INDEX ====================
+
+class SuggestionIndex:
+    """Index d'un process. Les écritures passent par get_suggestion_index (verrou)"""
+
+    def __init__(self):
+        self.entries = {}
+        self.postings = {}        # terme -> {clé}
+        self.sorted_terms = []
+        self.trigram_postings = {}  # trigramme -> {clé}
+
+    def _insert(self, entry, sort_terms=True):
+        self.entries[entry.key] = entry
+        for term in entry.terms:
+            keys = self.postings.get(term)
+            if keys is None:
+                keys = self.postings[term] = set()
+                if sort_terms:
+                    bisect.insort(self.sorted_terms, term)
+            keys.add(entry.key)
+        for trigram in trigrams(entry.haystack):
+            self.trigram_postings.setdefault(trigram, set()).add(entry.key)
+
+    def add(self, entry):
+        self.remove(entry.key)
+        self._insert(entry)
+
+    def load(self, entries):
+        """Chargement initial d'un index vide: les termes ne sont triés qu'une fois"""
+        for entry in entries:
+            self._insert(entry, sort_terms=False)
+        self.sorted_terms = sorted(self.postings)
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for term in entry.terms:
+            keys = self.postings[term]
+            keys.discard(key)
+            if not keys:
+                del self.postings[term]
+                del self.sorted_terms[bisect.bisect_left(self.sorted_terms, term)]
+        for trigram in trigrams(entry.haystack):
+            keys = self.trigram_postings[trigram]
+            keys.discard(key)
+            if not keys:
+                del self.trigram_postings[trigram]
+
+    def reload(self, kind, ids):
+        """Relire des objets en base; ceux qui ne sont plus suggérables sont retirés"""
+        ids = set(ids)
+        found = set()
+        for entry in ENTRY_LOADERS[kind](ids):
+            self.add(entry)
+            found.add(entry.object_id)
+        for object_id in ids - found:
+            self.remove((kind, object_id))
+
+    def _prefix_matches(self, query, max_candidates):
+        terms = self.sorted_terms
+        position = bisect.bisect_left(terms, query)
+        matches = set()
+        while position < len(terms) and terms[position].startswith(query):
+            if len(matches) >= max_candidates:
+                break
+            matches.update(self.postings[terms[position]])
+            position += 1
+        return matches
+
+    def _substring_matches(self, query, max_candidates):
+        postings = [self.trigram_postings.get(trigram) for trigram in trigrams(query)]
+        if not postings or not all(postings):
+            return set()
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        return set(islice(
+            (key for key in candidates if query in self.entries[key].haystack),
+            max_candidates
+        ))
+
+    def candidates(self, query, max_candidates=None):
+        max_candidates = max_candidates or get_suggestion_max_candidates()
+        matches = self._prefix_matches(query, max_candidates)
+        if len(query) >= 3:
+            matches |= self._substring_matches(query, max_candidates)
+        return [self.entries[key] for key in matches]
+
+
+def score_label(kind, label, query):
+    score = TYPE_SCORES[kind]
+    if query == label:
+        score += 50
+    elif query in label:
+        score += 30
+    if label.startswith(query):
+        score += 20
+    return score
+
+
+def score_entry(entry, query):
+    """Pertinence d'une entrée pour une requête déjà normalisée"""
+    score = score_label(entry.kind, entry.label, query)
+    if entry.kind == 'profile' and entry.full_name and query in entry.full_name:
+        score += 40
+    if entry.kind == 'group':
+        if entry.popularity > 100:
+            score += 10
+        elif entry.popularity > 50:
+            score += 5
+    return score
+
+
+_state = {'index': None, 'seq': 0, 'built_at': 0.0}
+_state_lock = threading.Lock()
+
+
+def _current_sequence():
+    return cache.get(SEQUENCE_KEY) or 0
+
+
+def build_suggestion_index():
+    index = SuggestionIndex()
+    for loader in ENTRY_LOADERS.values():
+        index.load(loader())
+    return index
+
+
+def get_suggestion_index():
+    """Index du process, rattrapé sur le journal des changements"""
+    with _state_lock:
+        seq = _current_sequence()
+        index = _state['index']
+        lag = seq - _state['seq']
+        expired = time.monotonic() - _state['built_at'] > get_suggestion_max_age()
+
+        if index is not None and not expired and 0 <= lag <= get_suggestion_max_lag():
+            if lag == 0:
+                return index
+            keys = [CHANGE_KEY.format(n) for n in range(_state['seq'] + 1, seq + 1)]
+            changes = cache.get_many(keys)
+            # Entrées consécutives disponibles; les suivantes, toutes absentes,
+            # sont encore en cours d'écriture
+            available = 0
+            while available < len(keys) and keys[available] in changes:
+                available += 1
+            if not any(key in changes for key in keys[available:]):
+                pending = {}
+                for key in keys[:available]:
+                    kind, ids = changes[key]
+                    pending.setdefault(kind, set()).update(ids)
+                for kind, ids in pending.items():
+                    index.reload(kind, ids)
+                _state['seq'] += available
+                return index
+
+        # Premier appel, index trop ancien ou trou dans le journal
+        _state['index'] = build_suggestion_index()
+        _state['seq'] = seq
+        _state['built_at'] = time.monotonic()
+        return _state['index']
+
+
+def publish_changes(kind, ids):
+    """Ajouter des objets modifiés au journal (à appeler après commit)"""
+    ids = [object_id for object_id in ids if object_id]
+    if not ids:
+        return
+    try:
+        seq = cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        cache.add(SEQUENCE_KEY, 0, timeout=None)
+        seq = cache.incr(SEQUENCE_KEY)
+    cache.set(CHANGE_KEY.format(seq), (kind, ids), timeout=get_suggestion_max_age() * 2)
+
+
+def schedule_update(kind, ids):
+    ids = list(ids)
+    transaction.on_commit(lambda: publish_changes(kind, ids))
+
+
+def reset_suggestion_index():
+    """Oublier l'index du process (reconstruit au prochain appel)"""
+    with _state_lock:
+        _state['index'] = None
+
+
+# ==================== SUGGESTIONS ====================
+
+def _post_suggestions(search_query, query, limit):
+    from datetime import timedelta
+
+    from django.db.models import Prefetch
+    from django.utils import timezone
+
+    from post.models import Post, PostImage
+
+    post_ids = search_ids('post', search_query)
+    if not post_ids:
+        return []
+    # Les plus pertinents parmi les auteurs actifs (filtrés avant la limite)
+    posts = Post.objects.filter(id__in=post_ids, user__is_active=True).order_by(
+        rank_ordering(post_ids)
+    ).select_related(
+        'user__profile', 'category'
+    ).prefetch_related(
+        'tags',
+        Prefetch('post_images', queryset=PostImage.objects.order_by('order'), to_attr='ordered_images')
+    ).annotate(comment_count=Count('post_comments'))[:limit]
+
+    rank = {post_id: position for position, post_id in enumerate(post_ids)}
+    now = timezone.now()
+    suggestions = []
+    for post in sorted(posts, key=lambda post: rank[post.id]):
+        user = post.user
+        profile = getattr(user, 'profile', None)
+        score = score_label('post', normalize(post.title), query)
+        # Bonus pour les posts récents
+        if post.created_at and now - post.created_at < timedelta(days=7):
+            score += 15
+        elif post.created_at and now - post.created_at < timedelta(days=30):
+            score += 5
+        suggestions.append((score, {
+            'type': 'post',
+            'id': post.id,
+            'title': post.title,
+            'user_id': user.id,
+            'content_preview': _preview(post.content, 100),
+            'author': user.username,
+            'author_name': f"{user.first_name} {user.last_name}".strip() or user.username,
+            'image_url': _file_url(post.ordered_images[0].image) if post.ordered_images else None,
+            'user_profile_image': _file_url(profile.image) if profile else None,
+            'created_at': post.created_at.isoformat() if post.created_at else None,
+            'like_count': post.total_ratings,
+            'comment_count': post.comment_count,
+            'tags': [tag.name for tag in post.tags.all()][:3],
+            'category': post.category.name if post.category else None,
+        }))
+    return suggestions
+
+
+def get_suggestions(search_query, per_type=5, limit=15):
+    """Suggestions compactes classées (au plus per_type par type, limit au total)"""
+    query = normalize(search_query)
+    if len(query) < 2:
+        return []
+
+    by_kind = {}
+    for entry in get_suggestion_index().candidates(query):
+        by_kind.setdefault(entry.kind, []).append(
+            (score_entry(entry, query), entry.popularity, entry)
+        )
+
+    scored = []
+    for kind_entries in by_kind.values():
+        for score, popularity, entry in heapq.nlargest(per_type, kind_entries, key=lambda item: item[:2]):
+            scored.append((score, entry.payload))
+    scored.extend(_post_suggestions(search_query, query, per_type))
+
+    # Tri stable: à score égal, les posts restent dans l'ordre de l'index plein texte
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [payload for _, payload in scored[:limit]]
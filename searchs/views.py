@@ -14,15 +14,53 @@ from messaging.serializers import ConversationSerializer
 from app.models import Profile
 from post.models import Post, Category, Tag
 from messaging.models import Conversation
-from django.contrib.auth.models import User
+from django.contrib.auth import get_user_model
+from post.category_utils import get_category_tree
+from messaging.block_utils import BlockManager
+from . import fuzzy_utils
+from .cache_utils import get_cached_ids
+from .index_utils import get_search_max_results, rank_ordering, search_filter, search_ids
+from .suggest_utils import get_suggestions
 
 logger = logging.getLogger(__name__)
+User = get_user_model()
+
+
+def _hidden_users(request):
+    """
+    Utilisateurs bloqués par le lecteur ou qui l'ont bloqué, exclus avant le
+    tri et la limite, et filtre de cache correspondant (vide sans blocage:
+    l'entrée reste partagée par la classe de visibilité)
+    """
+    hidden_ids = sorted(BlockManager.get_hidden_user_ids(request.user))
+    return hidden_ids, ({'hidden_users': hidden_ids} if hidden_ids else {})
+
+
+def _relevance(doc_type, search_query):
+    """
+    Tri par pertinence d'un queryset filtré par search_filter: les objets
+    classés par l'index (search_ids) d'abord, dans cet ordre
+    """
+    return rank_ordering(search_ids(doc_type, search_query))
+
+
+def _hydrate_posts(post_ids):
+    """Posts de post_ids, dans cet ordre, chargés en un lot pour PostSerializer"""
+    return list(
+        Post.objects.filter(id__in=post_ids)
+        .select_related('user__profile', 'category')
+        .prefetch_related('post_images', 'post_files')
+        .order_by(rank_ordering(post_ids))
+    )
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def search_general(request):
     """
-    Recherche générale optimisée avec vos serializers spécifiques
+    Recherche générale optimisée avec vos serializers spécifiques.
+    Les IDs trouvés par type sont mis en cache (cache_utils), puis hydratés
+    en une requête par type.
     """
     try:
         search_query = request.GET.get('q', '').strip()
@@ -52,40 +90,27 @@ def search_general(request):
             'count': 0,
             'query': search_query
         }
+        hidden_ids, block_filters = _hidden_users(request)
         
         # 1. RECHERCHE DANS PROFILES (avec vos champs spécifiques)
         try:
-            profile_filters = Q()
-            
-            # Recherche via la relation User (comme dans votre serializer)
-            profile_filters |= Q(user__username__icontains=search_query)
-            profile_filters |= Q(user__first_name__icontains=search_query)
-            profile_filters |= Q(user__last_name__icontains=search_query)
-            profile_filters |= Q(user__email__icontains=search_query)
-            
-            # Recherche dans les champs directs de Profile
-            if hasattr(Profile, 'bio'):
-                profile_filters |= Q(bio__icontains=search_query)
-            
-            if hasattr(Profile, 'location'):
-                profile_filters |= Q(location__icontains=search_query)
-            
-            if hasattr(Profile, 'city'):
-                profile_filters |= Q(city__icontains=search_query)
-            
-            if hasattr(Profile, 'country'):
-                profile_filters |= Q(country__icontains=search_query)
-            
-            if hasattr(Profile, 'website'):
-                profile_filters |= Q(website__icontains=search_query)
-            
-            if hasattr(Profile, 'address'):
-                profile_filters |= Q(address__icontains=search_query)
-            
-            # Filtrer les profils actifs
-            profile_filters &= Q(user__is_active=True)
-            
-            profile_results = Profile.objects.filter(profile_filters).distinct()
+            # Index plein texte: username, nom, email, bio, localisation...
+            def find_profiles():
+                return Profile.objects.filter(
+                    search_filter('profile', search_query),
+                    user__is_active=True
+                ).exclude(
+                    user_id__in=hidden_ids
+                ).order_by(
+                    _relevance('profile', search_query), '-id'
+                ).values_list('id', flat=True)[:get_search_max_results()]
+            
+            profile_ids = get_cached_ids(
+                'profile', search_query, find_profiles, filters=block_filters, user=request.user
+            )
+            profile_results = Profile.objects.filter(
+                id__in=profile_ids
+            ).select_related('user').order_by(rank_ordering(profile_ids))
             
             # Utiliser votre ProfileSerializer qui inclut user.username, etc.
             results['profiles'] = ProfileSerializer(
@@ -102,56 +127,48 @@ def search_general(request):
         
         # 2. RECHERCHE DANS POSTS - VERSION OPTIMISÉE POUR POSTCARD
         try:
-            post_filters = Q()
-            
-            # Champs principaux
-            post_filters |= Q(title__icontains=search_query)
-            post_filters |= Q(content__icontains=search_query)
-            
-            # Catégorie
-            post_filters |= Q(category__name__icontains=search_query)
-            
-            # Tags (ManyToMany)
-            post_filters |= Q(tags__name__icontains=search_query)
+            sort_by = request.GET.get('sort', 'recent')
+            # Limiter pour performance
+            limit = int(request.GET.get('limit', 50))
             
-            # Mentions (ManyToMany vers User)
-            post_filters |= Q(
-                Q(mentions__username__icontains=search_query) |
-                Q(mentions__first_name__icontains=search_query) |
-                Q(mentions__last_name__icontains=search_query)
+            def find_posts():
+                # Index plein texte: titre, contenu, catégorie, tags, mentions, auteur
+                posts = Post.objects.filter(
+                    search_filter('post', search_query)
+                ).exclude(user_id__in=hidden_ids)
+                
+                # Options de tri
+                if sort_by == 'relevance':
+                    posts = posts.order_by(_relevance('post', search_query), '-created_at')
+                elif sort_by == 'recent':
+                    posts = posts.order_by('-created_at')
+                elif sort_by == 'popular':
+                    posts = posts.annotate(
+                        comments_count=Count('post_comments')
+                    ).order_by('-comments_count', '-created_at')
+                elif sort_by == 'rating':
+                    posts = posts.order_by('-average_rating', '-created_at')
+                elif sort_by == 'title':
+                    posts = posts.order_by('title')
+                return posts.values_list('id', flat=True)[:limit]
+            
+            post_ids = get_cached_ids(
+                'post', search_query, find_posts,
+                filters={'limit': limit, **block_filters}, sort=sort_by, user=request.user
             )
             
-            # Auteur
-            post_filters |= Q(user__username__icontains=search_query)
-            post_filters |= Q(user__first_name__icontains=search_query)
-            post_filters |= Q(user__last_name__icontains=search_query)
-            
-            # Appliquer les filtres
-            posts_results = Post.objects.filter(post_filters).distinct()
-            
             # Annoter avec le nombre de commentaires
-            posts_results = posts_results.annotate(
+            posts_results = Post.objects.filter(id__in=post_ids).annotate(
                 comments_count=Count('post_comments')
-            )
-            
-            # Options de tri
-            sort_by = request.GET.get('sort', 'recent')
-            if sort_by == 'recent':
-                posts_results = posts_results.order_by('-created_at')
-            elif sort_by == 'popular':
-                posts_results = posts_results.order_by('-comments_count', '-created_at')
-            elif sort_by == 'rating':
-                posts_results = posts_results.order_by('-average_rating', '-created_at')
-            elif sort_by == 'title':
-                posts_results = posts_results.order_by('title')
+            ).order_by(rank_ordering(post_ids))
             
             # IMPORTANT: OPTIMISATION POUR POSTCARD - Précharger tous les médias nécessaires
             from django.db.models import Prefetch
             
             # Préchargement optimisé
             posts_results = posts_results.select_related(
-                'user',        # Pour user_name
-                'category'     # Pour category details
+                'user__profile',  # Pour user_name, user_profile_image
+                'category'        # Pour category details
             )
             
             # Préchargement des images
@@ -179,9 +196,9 @@ def search_general(request):
                         to_attr='prefetched_post_files')
             )
             
-            # Limiter pour performance
-            limit = int(request.GET.get('limit', 50))
-            posts_results = posts_results[:limit]
+            # Hydratation en un lot: le serializer et le formatage ci-dessous
+            # relisent la même liste (posts_results[i] ne refait pas de requête)
+            posts_results = list(posts_results)
             
             # Créer le contexte pour le serializer
             post_context = {'request': request}
@@ -293,26 +310,35 @@ def search_general(request):
         
         # 3. RECHERCHE DANS GROUPS (CONVERSATIONS)
         try:
-            groups_filters = Q(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query),
-                is_group=True,
-                is_visible=True
-            )
-            
-            groups_results = Conversation.objects.filter(groups_filters).distinct()
-            
-            # Tri
             group_sort = request.GET.get('group_sort', 'recent')
-            if group_sort == 'recent':
-                groups_results = groups_results.order_by('-created_at')
-            elif group_sort == 'name':
-                groups_results = groups_results.order_by('name')
-            elif group_sort == 'members':
-                # Ordonner par nombre de participants
-                groups_results = groups_results.annotate(
-                    members_count=Count('participants')
-                ).order_by('-members_count')
+            
+            def find_groups():
+                groups = Conversation.objects.filter(
+                    search_filter('group', search_query),
+                    is_group=True,
+                    is_visible=True
+                )
+                
+                # Tri
+                if group_sort == 'relevance':
+                    groups = groups.order_by(_relevance('group', search_query), '-created_at')
+                elif group_sort == 'recent':
+                    groups = groups.order_by('-created_at')
+                elif group_sort == 'name':
+                    groups = groups.order_by('name')
+                elif group_sort == 'members':
+                    # Ordonner par nombre de participants
+                    groups = groups.annotate(
+                        members_count=Count('participants')
+                    ).order_by('-members_count')
+                return groups.values_list('id', flat=True)[:get_search_max_results()]
+            
+            group_ids = get_cached_ids(
+                'group', search_query, find_groups, sort=group_sort, user=request.user
+            )
+            groups_results = Conversation.objects.filter(
+                id__in=group_ids
+            ).order_by(rank_ordering(group_ids))
             
             results['groups'] = ConversationSerializer(
                 groups_results, 
@@ -328,17 +354,24 @@ def search_general(request):
         
         # 4. RECHERCHE DANS CATÉGORIES
         try:
+            def find_categories():
+                return Category.objects.filter(
+                    search_filter('category', search_query),
+                    is_active=True
+                ).order_by(
+                    _relevance('category', search_query), 'name'
+                ).values_list('id', flat=True)[:get_search_max_results()]
+            
+            category_ids = get_cached_ids('category', search_query, find_categories, user=request.user)
             categories_results = Category.objects.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query),
-                is_active=True
-            ).distinct()
+                id__in=category_ids
+            ).order_by(rank_ordering(category_ids))
             
             # Utiliser votre CategorySerializer qui inclut image_url, etc.
             results['categories'] = CategorySerializer(
                 categories_results,
                 many=True,
-                context=context
+                context={**context, 'category_tree': get_category_tree()}
             ).data
             
             logger.info(f"Catégories trouvées : {len(categories_results)}")
@@ -349,9 +382,10 @@ def search_general(request):
         
         # 5. RECHERCHE DANS TAGS
         try:
-            tags_results = Tag.objects.filter(
-                name__icontains=search_query
-            ).distinct()
+            tag_ids = get_cached_ids(
+                'tag', search_query, lambda: search_ids('tag', search_query), user=request.user
+            )
+            tags_results = Tag.objects.filter(id__in=tag_ids).order_by(rank_ordering(tag_ids))
             
             # Utiliser votre TagSerializer
             results['tags'] = TagSerializer(
@@ -359,9 +393,9 @@ def search_general(request):
                 many=True
             ).data
             
-            # Ajouter le post_count si nécessaire
+            # Ajouter le post_count (compteur dénormalisé)
             for i, tag_data in enumerate(results['tags']):
-                tag_data['post_count'] = tags_results[i].posts.count()
+                tag_data['post_count'] = tags_results[i].post_count
             
             logger.info(f"Tags trouvés : {len(tags_results)}")
             
@@ -400,42 +434,46 @@ def search_users_detailed(request):
         if not search_query:
             return Response([])
         
-        # Construire les filtres
-        user_filters = Q()
-        
-        # Recherche dans User
-        user_filters |= Q(user__username__icontains=search_query)
-        user_filters |= Q(user__first_name__icontains=search_query)
-        user_filters |= Q(user__last_name__icontains=search_query)
-        user_filters |= Q(user__email__icontains=search_query)
-        
-        # Recherche dans Profile
-        profile_fields = ['bio', 'location', 'city', 'country', 
-                         'website', 'address', 'state', 'zip_code']
-        
-        for field in profile_fields:
-            if hasattr(Profile, field):
-                kwargs = {f'{field}__icontains': search_query}
-                user_filters |= Q(**kwargs)
-        
-        # Filtrer les utilisateurs actifs
-        user_filters &= Q(user__is_active=True)
-        
-        # Appliquer les filtres
-        profiles = Profile.objects.filter(user_filters).distinct()
-        
-        # Options de tri
         sort_by = request.GET.get('sort', 'username')
-        if sort_by == 'username':
-            profiles = profiles.order_by('user__username')
-        elif sort_by == 'recent':
-            profiles = profiles.order_by('-user__date_joined')
-        elif sort_by == 'name':
-            profiles = profiles.order_by('user__first_name', 'user__last_name')
-        
-        # Pagination
         limit = int(request.GET.get('limit', 50))
-        profiles = profiles[:limit]
+        hidden_ids, block_filters = _hidden_users(request)
+        
+        def find_profiles():
+            # Noms / username / email: tolérant aux fautes (fuzzy_utils);
+            # bio, localisation...: index plein texte
+            user_ids = fuzzy_utils.search_user_ids(
+                search_query, User.objects.filter(is_active=True).exclude(id__in=hidden_ids), limit=None
+            )
+            
+            # Appliquer les filtres
+            profiles = Profile.objects.filter(
+                Q(user_id__in=user_ids) | search_filter('profile', search_query),
+                user__is_active=True
+            ).exclude(user_id__in=hidden_ids)
+            
+            # Options de tri
+            if sort_by == 'relevance':
+                profiles = profiles.order_by(
+                    rank_ordering(user_ids, field='user_id'), _relevance('profile', search_query)
+                )
+            elif sort_by == 'username':
+                profiles = profiles.order_by('user__username')
+            elif sort_by == 'recent':
+                profiles = profiles.order_by('-user__date_joined')
+            elif sort_by == 'name':
+                profiles = profiles.order_by('user__first_name', 'user__last_name')
+            
+            # Pagination
+            return profiles.values_list('id', flat=True)[:limit]
+        
+        # Résultats en cache sous 'profile': les écritures d'utilisateurs
+        # invalident aussi ce type (signals.py)
+        ids = get_cached_ids(
+            'profile', search_query, find_profiles,
+            filters={'view': 'users_detailed', 'limit': limit, **block_filters},
+            sort=sort_by, user=request.user
+        )
+        profiles = Profile.objects.filter(id__in=ids).select_related('user').order_by(rank_ordering(ids))
         
         # Utiliser votre ProfileSerializer
         serializer = ProfileSerializer(
@@ -469,54 +507,87 @@ def search_by_type(request, model_type):
         model_type = model_type.lower()
         context = {'request': request}
         
+        hidden_ids, block_filters = _hidden_users(request)
+        
+        def cached_ids(doc_type, compute=None, filters=None, **kwargs):
+            return get_cached_ids(
+                doc_type, search_query,
+                compute or (lambda: search_ids(doc_type, search_query)),
+                user=request.user, filters={**(filters or {}), **block_filters}, **kwargs
+            )
+        
         if model_type == 'profiles':
             # Recherche dans Profile
+            # Comptes désactivés compris, contrairement à search_general
+            def find_profiles():
+                return Profile.objects.filter(
+                    search_filter('profile', search_query)
+                ).exclude(
+                    user_id__in=hidden_ids
+                ).order_by(
+                    _relevance('profile', search_query), '-id'
+                ).values_list('id', flat=True)[:get_search_max_results()]
+            
+            profile_ids = cached_ids('profile', find_profiles, filters={'inactive_users': True})
             results = Profile.objects.filter(
-                Q(user__username__icontains=search_query) |
-                Q(user__first_name__icontains=search_query) |
-                Q(user__last_name__icontains=search_query) |
-                Q(user__email__icontains=search_query) |
-                Q(bio__icontains=search_query) |
-                Q(location__icontains=search_query) |
-                Q(city__icontains=search_query) |
-                Q(country__icontains=search_query)
-            ).distinct()
+                id__in=profile_ids
+            ).select_related('user').order_by(rank_ordering(profile_ids))
             
             serializer = ProfileSerializer(results, many=True, context=context)
             
         elif model_type == 'posts':
             # Recherche dans Posts
-            results = Post.objects.filter(
-                Q(title__icontains=search_query) |
-                Q(content__icontains=search_query) |
-                Q(tags__name__icontains=search_query) |
-                Q(category__name__icontains=search_query)
-            ).distinct().order_by('-created_at')
-            
+            sort_by = 'relevance' if request.GET.get('sort') == 'relevance' else 'recent'
             # Limiter les résultats
             limit = int(request.GET.get('limit', 50))
-            results = results[:limit]
+            
+            def find_posts():
+                posts = Post.objects.filter(
+                    search_filter('post', search_query)
+                ).exclude(user_id__in=hidden_ids)
+                if sort_by == 'relevance':
+                    posts = posts.order_by(_relevance('post', search_query), '-created_at')
+                else:
+                    posts = posts.order_by('-created_at')
+                return posts.values_list('id', flat=True)[:limit]
+            
+            post_ids = cached_ids('post', find_posts, filters={'limit': limit}, sort=sort_by)
+            results = _hydrate_posts(post_ids)
             
             serializer = PostSerializer(results, many=True, context=context)
             
         elif model_type == 'groups':
             # Recherche dans Groups
+            def find_groups():
+                return Conversation.objects.filter(
+                    search_filter('group', search_query),
+                    is_group=True,
+                    is_visible=True
+                ).order_by(
+                    _relevance('group', search_query), '-created_at'
+                ).values_list('id', flat=True)[:get_search_max_results()]
+            
+            group_ids = cached_ids('group', find_groups, sort='relevance')
             results = Conversation.objects.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query),
-                is_group=True,
-                is_visible=True
-            ).distinct()
+                id__in=group_ids
+            ).order_by(rank_ordering(group_ids))
             
             serializer = ConversationSerializer(results, many=True, context=context)
             
         elif model_type == 'categories':
             # Recherche dans Catégories
+            def find_categories():
+                return Category.objects.filter(
+                    search_filter('category', search_query),
+                    is_active=True
+                ).order_by(
+                    _relevance('category', search_query), 'name'
+                ).values_list('id', flat=True)[:get_search_max_results()]
+            
+            category_ids = cached_ids('category', find_categories)
             results = Category.objects.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query),
-                is_active=True
-            ).distinct()
+                id__in=category_ids
+            ).select_related('parent').order_by(rank_ordering(category_ids))
             
             # Format simple pour les résultats
             data = []
@@ -525,7 +596,7 @@ def search_by_type(request, model_type):
                     'id': category.id,
                     'name': category.name,
                     'description': category.description,
-                    'post_count': category.post_categorie.count(),
+                    'post_count': category.post_count,
                 }
                 
                 if category.image:
@@ -543,9 +614,8 @@ def search_by_type(request, model_type):
             
         elif model_type == 'tags':
             # Recherche dans Tags
-            results = Tag.objects.filter(
-                name__icontains=search_query
-            ).distinct()
+            tag_ids = cached_ids('tag')
+            results = Tag.objects.filter(id__in=tag_ids).order_by(rank_ordering(tag_ids))
             
             # Format simple pour les résultats
             data = []
@@ -553,7 +623,7 @@ def search_by_type(request, model_type):
                 data.append({
                     'id': tag.id,
                     'name': tag.name,
-                    'post_count': tag.posts.count()
+                    'post_count': tag.post_count
                 })
             
             return Response(data)
@@ -575,7 +645,9 @@ def search_by_type(request, model_type):
 @permission_classes([IsAuthenticated])
 def search_suggestions(request):
     """
-    Suggestions de recherche optimisées avec groupes et sérialiseurs
+    Suggestions de recherche (autocomplétion) servies par l'index en mémoire
+    de suggest_utils: profils, groupes, catégories, tags, plus les posts
+    issus de l'index plein texte
     """
     try:
         search_query = request.GET.get('q', '').strip()
@@ -583,197 +655,7 @@ def search_suggestions(request):
         if len(search_query) < 2:
             return Response({'suggestions': []})
         
-        suggestions = []
-        context = {'request': request}
-        
-        # ============ 1. SUGGESTIONS DE PROFILS ============
-        try:
-            profiles = Profile.objects.filter(
-                Q(user__username__icontains=search_query) |
-                Q(user__first_name__icontains=search_query) |
-                Q(user__last_name__icontains=search_query),
-                user__is_active=True
-            ).select_related('user').distinct()[:5]
-            
-            for profile in profiles:
-                # Utiliser ProfileSerializer pour plus de cohérence
-                profile_data = ProfileSerializer(profile, context=context).data
-                
-                suggestions.append({
-                    'type': 'profile',
-                    'id': profile.id,
-                    'user_id': profile.user.id,
-                    'username': profile.user.username,
-                    'first_name': profile.user.first_name,
-                    'last_name': profile.user.last_name,
-      
-                    'bio_preview': (profile.bio[:80] + '...') if profile.bio and len(profile.bio) > 80 else (profile.bio or ''),
-                    'image_url': profile.image.url if profile.image else None,
-                    'category_name': profile.category.name if profile.category else None,
-                    'avatar': profile.image.url if profile.image else None,
-                    'profile_picture': profile.image.url if profile.image else None,
-                    'name': f"{profile.user.first_name} {profile.user.last_name}".strip() or profile.user.username,
-                })
-        except Exception as e:
-            logger.error(f"Erreur suggestions profils : {str(e)}")
-        
-        # ============ 2. SUGGESTIONS DE POSTS ============
-        try:
-            posts = Post.objects.filter(
-                Q(title__icontains=search_query) |
-                Q(content__icontains=search_query),
-                user__is_active=True
-            ).select_related('user', 'category').prefetch_related('tags')[:5]
-            
-            for post in posts:
-                # Chercher la première image du post
-                post_image_url = None
-                if post.post_images.exists():
-                    post_image_url = post.post_images.first().image.url
-                elif post.media_files.exists():
-                    media_file = post.media_files.filter(file_type__in=['image', 'cover']).first()
-                    if media_file:
-                        post_image_url = media_file.file.url
-                post_data = PostSerializer(post, context=context).data
-               
-                # Chercher l'image de profil de l'auteur
-                author_profile_image = None
-                try:
-                    author_profile = Profile.objects.get(user=post.user)
-                    if author_profile.image:
-                        author_profile_image = author_profile.image.url
-                except Profile.DoesNotExist:
-                    pass
-                
-                suggestions.append({
-                    'type': 'post',
-                    'id': post.id,
-                    'title': post.title,
-                    'user_id':post.user.id,
-                    'content_preview': (post.content[:100] + '...') if post.content and len(post.content) > 100 else (post.content or ''),
-                    'author': post.user.username,
-                    'author_name': f"{post.user.first_name} {post.user.last_name}".strip() or post.user.username,
-                    'image_url': post_image_url,
-                    'user_profile_image': author_profile_image,
-                    'created_at': post.created_at.isoformat() if post.created_at else None,
-                    'like_count': post.total_ratings or post.average_rating.count(),
-                    'comment_count': post.comments_count_annotated if hasattr(post, 'comments_count_annotated') else post.post_comments.count(),
-                    'tags': [tag.name for tag in post.tags.all()][:3],
-                    'category': post.category.name if post.category else None,
-                })
-        except Exception as e:
-            logger.error(f"Erreur suggestions posts : {str(e)}")
-        
-        # ============ 3. SUGGESTIONS DE GROUPES ============
-        try:
-            groups = Conversation.objects.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query),
-                is_group=True,
-                is_visible=True
-            ).distinct()[:5]
-            
-            for group in groups:
-                # Utiliser ConversationSerializer pour plus de cohérence
-                group_data = ConversationSerializer(group, context=context).data
-                
-                # Compter les membres
-                member_count = group.participants.count() if hasattr(group, 'participants') else 0
-                
-                # Chercher l'image du groupe
-                group_image_url = None
-                if group.group_photo:
-                    group_image_url = group.group_photo.url
-                elif hasattr(group, 'image') and group.image:
-                    group_image_url = group.image.url
-                elif hasattr(group, 'cover_image') and group.cover_image:
-                    group_image_url = group.cover_image.url
-                
-                suggestions.append({
-                    'type': 'group',
-                    'id': group.id,
-                    'name': group.name,
-                    'title': group.name,  # Pour compatibilité avec l'existant
-                    'description': group.description[:120] + '...' if group.description and len(group.description) > 120 else (group.description or ''),
-                    'group_photo_url': group_image_url,
-                    'image': group_image_url,  # Alias pour compatibilité
-                    'cover_image': group_image_url,  # Alias pour compatibilité
-                    'member_count': member_count,
-                    'members_count': member_count,  # Alias pour compatibilité
-                    'privacy': group.privacy if hasattr(group, 'privacy') else 'public',
-                    'category_name': group.category.name if hasattr(group, 'category') and group.category else None,
-                    'created_at': group.created_at.isoformat() if group.created_at else None,
-                    'is_private': group.privacy == 'private' if hasattr(group, 'privacy') else False,
-                })
-        except Exception as e:
-            logger.error(f"Erreur suggestions groupes : {str(e)}")
-            # Fallback: créer une suggestion de test pour déboguer
-            if settings.DEBUG:
-                suggestions.append({
-                    'type': 'group',
-                    'id': 'test-1',
-                    'name': f'Groupe "{search_query}"',
-                    'description': f'Description du groupe contenant "{search_query}"',
-                    'member_count': 42,
-                    'privacy': 'public',
-                    'category_name': 'Test'
-                })
-        
-        # ============ 4. SUGGESTIONS DE CATÉGORIES ============
-        try:
-            categories = Category.objects.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query),
-                is_active=True
-            ).distinct()[:5]
-            
-            for category in categories:
-                suggestions.append({
-                    'type': 'category',
-                    'id': category.id,
-                    'name': category.name,
-                    'title': category.name,  # Pour compatibilité
-                    'description': category.description[:100] if category.description else '',
-                    'post_count': category.post_categorie.count(),
-                    'image_url': category.image.url if category.image else None,
-                    'parent_name': category.parent.name if category.parent else None,
-                })
-        except Exception as e:
-            logger.error(f"Erreur suggestions catégories : {str(e)}")
-        
-        # ============ 5. SUGGESTIONS DE TAGS ============
-        try:
-            tags = Tag.objects.filter(
-                name__icontains=search_query
-            ).distinct()[:5]
-            
-            for tag in tags:
-                suggestions.append({
-                    'type': 'tag',
-                    'id': tag.id,
-                    'name': tag.name,
-                    'title': tag.name,  # Pour compatibilité
-                    'post_count': tag.posts.count(),
-                    'description': f'Tag "{tag.name}" utilisé dans {tag.posts.count()} posts',
-                })
-        except Exception as e:
-            logger.error(f"Erreur suggestions tags : {str(e)}")
-        
-        # ============ TRI ET LIMITE FINALE ============
-        # Limiter le nombre total de suggestions
-        suggestions = suggestions[:15]
-        
-        # Ajouter un score de pertinence pour le tri
-        for suggestion in suggestions:
-            suggestion['relevance_score'] = calculate_relevance_score(suggestion, search_query)
-        
-        # Trier par score de pertinence
-        suggestions.sort(key=lambda x: x.get('relevance_score', 0), reverse=True)
-        
-        # Nettoyer le score avant de retourner
-        for suggestion in suggestions:
-            if 'relevance_score' in suggestion:
-                del suggestion['relevance_score']
+        suggestions = get_suggestions(search_query)
         
         logger.info(f"🔍 Suggestions trouvées : {len(suggestions)} pour '{search_query}'")
         
@@ -784,65 +666,6 @@ def search_suggestions(request):
         return Response({'suggestions': []})
 
 
-def calculate_relevance_score(suggestion, search_query):
-    """
-    Calcule un score de pertinence pour une suggestion
-    """
-    score = 0
-    search_lower = search_query.lower()
-    
-    # Score selon le type
-    type_scores = {
-        'profile': 100,
-        'group': 90,
-        'post': 80,
-        'category': 70,
-        'tag': 60
-    }
-    
-    score += type_scores.get(suggestion['type'], 50)
-    
-    # Bonus pour correspondance exacte dans le nom/titre
-    name = suggestion.get('name') or suggestion.get('title') or suggestion.get('username') or ''
-    if search_lower == name.lower():
-        score += 50
-    elif search_lower in name.lower():
-        score += 30
-    
-    # Bonus pour correspondance au début
-    if name.lower().startswith(search_lower):
-        score += 20
-    
-    # Bonus pour les profils complets
-    if suggestion['type'] == 'profile':
-        if suggestion.get('first_name') and suggestion.get('last_name'):
-            full_name = f"{suggestion['first_name']} {suggestion['last_name']}".lower()
-            if search_lower in full_name:
-                score += 40
-    
-    # Bonus pour les groupes populaires
-    if suggestion['type'] == 'group':
-        member_count = suggestion.get('member_count', 0) or suggestion.get('members_count', 0)
-        if member_count > 100:
-            score += 10
-        elif member_count > 50:
-            score += 5
-    
-    # Bonus pour les posts récents
-    if suggestion['type'] == 'post':
-        if suggestion.get('created_at'):
-            from datetime import datetime, timedelta
-            try:
-                created_at = datetime.fromisoformat(suggestion['created_at'].replace('Z', '+00:00'))
-                if datetime.now() - created_at < timedelta(days=7):
-                    score += 15
-                elif datetime.now() - created_at < timedelta(days=30):
-                    score += 5
-            except:
-                pass
-    
-    return score
-
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def search_filters(request):
@@ -850,15 +673,13 @@ def search_filters(request):
     Retourne les filtres disponibles pour la recherche
     """
     try:
-        # Catégories disponibles avec count
-        categories = Category.objects.filter(is_active=True).annotate(
-            post_count=Count('post_categorie')
-        ).order_by('name').values('id', 'name', 'post_count')
+        # Catégories disponibles avec count (compteur dénormalisé)
+        categories = Category.objects.filter(is_active=True).order_by('name').values(
+            'id', 'name', 'post_count'
+        )
         
-        # Tags populaires
-        popular_tags = Tag.objects.annotate(
-            post_count=Count('posts')
-        ).order_by('-post_count')[:20].values('id', 'name', 'post_count')
+        # Tags populaires (index sur post_count)
+        popular_tags = Tag.objects.order_by('-post_count')[:20].values('id', 'name', 'post_count')
         
         # Options de tri pour profiles
         profile_sort_options = [
@@ -866,10 +687,12 @@ def search_filters(request):
             {'value': '-username', 'label': 'Nom d\'utilisateur (Z-A)'},
             {'value': 'recent', 'label': 'Inscription récente'},
             {'value': 'name', 'label': 'Nom complet (A-Z)'},
+            {'value': 'relevance', 'label': 'Pertinence'},
         ]
         
         # Options de tri pour posts
         post_sort_options = [
+            {'value': 'relevance', 'label': 'Pertinence'},
             {'value': '-created_at', 'label': 'Plus récents'},
             {'value': 'created_at', 'label': 'Plus anciens'},
             {'value': '-average_rating', 'label': 'Meilleures notes'},
@@ -909,61 +732,9 @@ def search_posts_advanced(request):
     """
     try:
         search_query = request.GET.get('q', '').strip()
-        
-        # Construire les filtres
-        filters = Q()
-        
-        if search_query:
-            filters &= (
-                Q(title__icontains=search_query) |
-                Q(content__icontains=search_query) |
-                Q(tags__name__icontains=search_query) |
-                Q(category__name__icontains=search_query)
-            )
-        
-        # Filtres additionnels
-        category_id = request.GET.get('category_id')
-        if category_id:
-            filters &= Q(category_id=category_id)
-        
-        user_id = request.GET.get('user_id')
-        if user_id:
-            filters &= Q(user_id=user_id)
-        
-        has_images = request.GET.get('has_images')
-        if has_images == 'true':
-            filters &= Q(post_images__isnull=False)
-        elif has_images == 'false':
-            filters &= Q(post_images__isnull=True)
-        
-        min_rating = request.GET.get('min_rating')
-        if min_rating:
-            try:
-                filters &= Q(average_rating__gte=float(min_rating))
-            except ValueError:
-                pass
-        
-        # Date range
-        date_from = request.GET.get('date_from')
-        date_to = request.GET.get('date_to')
-        
-        if date_from:
-            filters &= Q(created_at__date__gte=date_from)
-        if date_to:
-            filters &= Q(created_at__date__lte=date_to)
-        
-        # Appliquer les filtres
-        posts = Post.objects.filter(filters).distinct()
-        
-        # Tri
         sort_by = request.GET.get('sort_by', '-created_at')
-        valid_sorts = ['-created_at', 'created_at', '-average_rating', 
-                      '-total_ratings', '-title', 'title']
-        
-        if sort_by in valid_sorts:
-            posts = posts.order_by(sort_by)
-        else:
-            posts = posts.order_by('-created_at')
+        filter_params = ('category_id', 'user_id', 'has_images', 'min_rating', 'date_from', 'date_to')
+        hidden_ids, block_filters = _hidden_users(request)
         
         # Pagination
         from rest_framework.pagination import PageNumberPagination
@@ -974,15 +745,84 @@ def search_posts_advanced(request):
             max_page_size = 100
         
         paginator = SearchPagination()
-        page = paginator.paginate_queryset(posts, request)
-        
-        if page is not None:
-            serializer = PostSerializer(page, many=True, context={'request': request})
-            return paginator.get_paginated_response(serializer.data)
+        if search_query:
+            # Tous les IDs filtrés (la correspondance est une sous-requête de
+            # l'index): liste mise en cache, seule la page demandée est hydratée
+            post_ids = get_cached_ids(
+                'post', search_query,
+                lambda: _filter_posts_advanced(
+                    request, search_query, sort_by, hidden_ids
+                ).values_list('id', flat=True),
+                filters={
+                    **{param: request.GET.get(param) for param in filter_params}, **block_filters
+                },
+                sort=sort_by, user=request.user
+            )
+            page = _hydrate_posts(paginator.paginate_queryset(post_ids, request))
+        else:
+            page = paginator.paginate_queryset(
+                _filter_posts_advanced(request, search_query, sort_by, hidden_ids), request
+            )
         
-        serializer = PostSerializer(posts, many=True, context={'request': request})
-        return Response(serializer.data)
+        serializer = PostSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
         
     except Exception as e:
         logger.error(f"Advanced posts search error: {str(e)}")
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _filter_posts_advanced(request, search_query, sort_by, hidden_ids=()):
+    """Posts filtrés et triés de search_posts_advanced, sans les auteurs de hidden_ids"""
+    # Construire les filtres
+    filters = Q()
+    
+    if search_query:
+        filters &= search_filter('post', search_query)
+    
+    # Filtres additionnels
+    category_id = request.GET.get('category_id')
+    if category_id:
+        filters &= Q(category_id=category_id)
+    
+    user_id = request.GET.get('user_id')
+    if user_id:
+        filters &= Q(user_id=user_id)
+    
+    has_images = request.GET.get('has_images')
+    if has_images == 'true':
+        filters &= Q(post_images__isnull=False)
+    elif has_images == 'false':
+        filters &= Q(post_images__isnull=True)
+    
+    min_rating = request.GET.get('min_rating')
+    if min_rating:
+        try:
+            filters &= Q(average_rating__gte=float(min_rating))
+        except ValueError:
+            pass
+    
+    # Date range
+    date_from = request.GET.get('date_from')
+    date_to = request.GET.get('date_to')
+    
+    if date_from:
+        filters &= Q(created_at__date__gte=date_from)
+    if date_to:
+        filters &= Q(created_at__date__lte=date_to)
+    
+    # Appliquer les filtres
+    posts = Post.objects.filter(filters).exclude(user_id__in=hidden_ids).distinct()
+    
+    # Tri
+    valid_sorts = ['-created_at', 'created_at', '-average_rating', 
+                  '-total_ratings', '-title', 'title']
+    
+    if sort_by == 'relevance' and search_query:
+        posts = posts.order_by(_relevance('post', search_query), '-created_at')
+    elif sort_by in valid_sorts:
+        posts = posts.order_by(sort_by)
+    else:
+        posts = posts.order_by('-created_at')
+    
+    return posts
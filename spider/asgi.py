@@ -13,4 +13,20 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'spider.settings')
 
-application = get_asgi_application()
+# Initialiser Django avant d'importer les consumers (ils importent des modèles)
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.security.websocket import AllowedHostsOriginValidator
+
+from messaging.routing import websocket_urlpatterns
+from messaging.ws_auth import TokenAuthMiddlewareStack
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': AllowedHostsOriginValidator(
+        TokenAuthMiddlewareStack(
+            URLRouter(websocket_urlpatterns)
+        )
+    ),
+})
@@ -63,6 +63,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'messaging.block_utils.BlockGraphMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -86,6 +87,80 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'spider.wsgi.application'
+ASGI_APPLICATION = 'spider.asgi.application'
+
+# Channels et présence: Redis en production (REDIS_URL), mémoire locale en dev / tests
+if os.environ.get('REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [os.environ['REDIS_URL']],
+            },
+        },
+    }
+    PRESENCE_BACKEND = 'messaging.presence_utils.RedisPresenceBackend'
+    PRESENCE_REDIS_URL = os.environ['REDIS_URL']
+    # Cache partagé: les invalidations (stats, graphe de blocage) valent pour tous les workers
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+    PRESENCE_BACKEND = 'messaging.presence_utils.LocMemPresenceBackend'
+
+# Présence: fenêtre "en ligne" et intervalle de report en base (secondes)
+PRESENCE_TTL = 120
+PRESENCE_FLUSH_INTERVAL = 60
+
+# Cache court de msg/messaging/stats/ (secondes, 0 = désactivé)
+MESSAGING_STATS_CACHE_TIMEOUT = 30
+
+# Graphe de blocage en cache (secondes, 0 = désactivé), invalidé à chaque blocage / déblocage
+BLOCK_GRAPH_CACHE_TIMEOUT = 300
+
+# Totaux de post/posts/ en pagination par curseur (secondes, 0 = désactivé)
+POST_LIST_TOTAL_CACHE_TIMEOUT = 60
+
+# Fil d'accueil: longueur conservée par utilisateur, seuil d'abonnés au-delà
+# duquel un auteur est lu à la demande, posts copiés lors d'un abonnement
+TIMELINE_MAX_LENGTH = 800
+TIMELINE_FANOUT_MAX_FOLLOWERS = 5000
+TIMELINE_BACKFILL = 50
+
+# Scores de classement (commande refresh_post_scores): demi-vie de
+# l'engagement en heures et poids de la moyenne globale dans la note bayésienne
+POST_SCORE_HALF_LIFE_HOURS = 72
+POST_SCORE_BAYESIAN_PRIOR = 5
+
+# Index de recherche plein texte (searchs.index_utils, commande rebuild_search_index).
+# Backend par défaut selon la base: FTS5 (SQLite) ou tsvector (PostgreSQL)
+SEARCH_INDEX_MAX_RESULTS = 500
+SEARCH_INDEX_PG_CONFIG = 'simple'
+
+# Cache des IDs de résultats de recherche (searchs.cache_utils), invalidé
+# par type à chaque écriture (secondes, 0 = désactivé); les listes plus
+# longues que SEARCH_RESULT_CACHE_MAX_IDS sont recalculées à chaque fois
+SEARCH_RESULT_CACHE_TIMEOUT = 60
+SEARCH_RESULT_CACHE_MAX_IDS = 5000
+
+# Index d'autocomplétion en mémoire (searchs.suggest_utils): reconstruction
+# complète au-delà de cet âge (secondes) ou de ce nombre de changements en retard
+SUGGESTION_INDEX_MAX_AGE = 3600
+SUGGESTION_INDEX_MAX_LAG = 1000
+
+# Recherche d'utilisateurs / groupes tolérante aux fautes (searchs.fuzzy_utils)
+FUZZY_SEARCH_CANDIDATES = 200
+FUZZY_SEARCH_VOCABULARY_CANDIDATES = 1000
+FUZZY_SEARCH_MAX_DISTANCE = 2
+FUZZY_SEARCH_EXPANSIONS = 10
 
 
 # Database
@@ -234,6 +309,11 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Envoi des médias protégés (post.media_utils.serve_media_file): None = Django,
+# 'x-accel-redirect' (nginx, location internal sur MEDIA_ROOT) ou 'x-sendfile'
+MEDIA_SENDFILE_BACKEND = os.environ.get('MEDIA_SENDFILE_BACKEND') or None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 